@@ -0,0 +1,504 @@
+import math
+import re
+import time
+import hashlib
+import threading
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import urljoin, unquote
+
+from extractors import (HLS_MIME_TYPE, HTTP_TIMEOUT, manifest_type, hls_attributes, parse_hls_sources,
+                        parse_iso_duration, _local, _child, _base_url)
+from download_journal import SegmentJournal
+from media_probe import resource_key
+from retry_policy import RetryPolicy
+from segmented_download import (ChunkReader, DownloadCancelled, IncompleteRangeError, MAX_CHUNK_SIZE,
+                                PROBE_TIMEOUT, READ_TIMEOUT, PROGRESS_INTERVAL)
+from tracing import get_tracer
+
+SEGMENT_WORKERS = 4          # Segmentos que se descargan a la vez
+SEGMENT_WINDOW = 8           # Segmentos pedidos por delante del último escrito (acota la memoria)
+SEGMENT_ATTEMPTS = 4         # Intentos por segmento antes de abandonar la pista
+STOP_POLL_INTERVAL = 0.25    # Segundos entre comprobaciones de parada durante una espera
+
+# Campos de las plantillas de SegmentTemplate ($Number$, $Time%05d$...)
+TEMPLATE_FIELD = re.compile(r'\$(RepresentationID|Number|Bandwidth|Time)(?:%0(\d+)d)?\$')
+
+
+class UnsupportedStreamError(ValueError):
+    """El manifiesto describe algo que no se puede descargar (directo, cifrado...)."""
+
+
+def parse_mpd_segments(mpd_text, mpd_url, representation_id):
+    """
+    Obtiene la lista de segmentos de una representación de un manifiesto DASH.
+    Admite SegmentTemplate (con $Number$ o $Time$ y SegmentTimeline), SegmentList
+    y representaciones de un solo archivo. Solo se lee el primer periodo que
+    contiene la representación.
+
+    Args:
+        mpd_text (str): Contenido XML del manifiesto
+        mpd_url (str): URL del manifiesto (para resolver rutas relativas)
+        representation_id (str): Atributo id de la representación
+
+    Returns:
+        list: Segmentos (url, rango) en orden, con el de inicialización primero;
+        el rango es (inicio, fin) con el fin inclusivo, o None para el recurso entero
+
+    Raises:
+        UnsupportedStreamError: Si el manifiesto es de un directo o está cifrado
+        ValueError: Si la representación no está en el manifiesto
+    """
+    root = ET.fromstring(mpd_text)
+    if root.get('type') == 'dynamic':
+        raise UnsupportedStreamError("Las emisiones en directo no se pueden descargar.")
+    total_duration = parse_iso_duration(root.get('mediaPresentationDuration'))
+    base = _base_url(root, mpd_url)
+
+    for period in _children(root, 'Period'):
+        period_base = _base_url(period, base)
+        duration = parse_iso_duration(period.get('duration'))
+        if duration is None and total_duration:
+            duration = total_duration - (parse_iso_duration(period.get('start')) or 0)
+        for adaptation in _children(period, 'AdaptationSet'):
+            adaptation_base = _base_url(adaptation, period_base)
+            for representation in _children(adaptation, 'Representation'):
+                if representation.get('id') != representation_id:
+                    continue
+                if _child(adaptation, 'ContentProtection') is not None \
+                        or _child(representation, 'ContentProtection') is not None:
+                    raise UnsupportedStreamError("La pista está cifrada (DRM).")
+                url = _base_url(representation, adaptation_base)
+                chain = (period, adaptation, representation)
+                template = _segment_info(chain, 'SegmentTemplate')
+                if template:
+                    return _template_segments(*template, url, representation, duration)
+                segment_list = _segment_info(chain, 'SegmentList')
+                if segment_list:
+                    return _list_segments(*segment_list, url)
+                return [(url, None)]
+    raise ValueError(f"La representación {representation_id} no está en el manifiesto.")
+
+
+def parse_hls_segments(playlist_text, playlist_url):
+    """
+    Obtiene la lista de segmentos de una lista de reproducción HLS de segmentos.
+    Admite #EXT-X-MAP (segmento de inicialización de fMP4) y #EXT-X-BYTERANGE.
+
+    Args:
+        playlist_text (str): Contenido de la lista
+        playlist_url (str): URL de la lista (para resolver rutas relativas)
+
+    Returns:
+        list: Segmentos (url, rango) en orden, como parse_mpd_segments
+
+    Raises:
+        UnsupportedStreamError: Si la lista es de un directo o los segmentos están cifrados
+        ValueError: Si el texto no es una lista HLS
+    """
+    lines = [line.strip() for line in playlist_text.splitlines() if line.strip()]
+    if not lines or lines[0] != '#EXTM3U':
+        raise ValueError("El manifiesto no es una lista de reproducción HLS.")
+
+    segments = []
+    offsets = {}       # Byte siguiente al último rango pedido de cada recurso
+    byte_range = None
+    init = None
+    ended = False
+    for line in lines:
+        if line.startswith('#EXT-X-KEY:'):
+            if hls_attributes(line).get('METHOD', 'NONE') != 'NONE':
+                raise UnsupportedStreamError("Los segmentos de la lista están cifrados.")
+        elif line.startswith('#EXT-X-MAP:'):
+            attributes = hls_attributes(line)
+            url = urljoin(playlist_url, attributes.get('URI', ''))
+            segment = (url, _hls_range(attributes.get('BYTERANGE'), url, offsets))
+            # Tras una discontinuidad puede cambiar la inicialización; si no, no se repite
+            if segment != init:
+                segments.append(segment)
+                init = segment
+        elif line.startswith('#EXT-X-BYTERANGE:'):
+            byte_range = line.split(':', 1)[1]
+        elif line == '#EXT-X-ENDLIST' or line == '#EXT-X-PLAYLIST-TYPE:VOD':
+            ended = True
+        elif not line.startswith('#'):
+            url = urljoin(playlist_url, line)
+            segments.append((url, _hls_range(byte_range, url, offsets)))
+            byte_range = None
+    if not ended:
+        raise UnsupportedStreamError("Las emisiones en directo no se pueden descargar.")
+    return segments
+
+
+def segments_fingerprint(segments):
+    """
+    Huella de una lista de segmentos que no cambia al renovar los enlaces
+    firmados (solo cuentan las rutas y los rangos).
+
+    Args:
+        segments (list): Segmentos (url, rango)
+
+    Returns:
+        str: Huella hexadecimal
+    """
+    digest = hashlib.sha1()
+    for url, byte_range in segments:
+        digest.update(f"{resource_key(url)} {byte_range}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class AdaptiveDownloader:
+    """
+    Motor de descarga de fuentes DASH y HLS servidas por segmentos.
+    Lee el manifiesto, descarga varios segmentos a la vez dentro de una
+    ventana acotada por delante del último escrito y los escribe en orden en
+    un único archivo (el segmento de inicialización y los fragmentos forman
+    un MP4 fragmentado, o un TS en HLS, que FFmpeg lee directamente). Cada
+    segmento se reintenta por separado; lo escrito se anota en un diario para
+    reanudar la descarga después de un fallo o una pausa.
+    """
+    def __init__(self, session, headers=None, workers=SEGMENT_WORKERS, window=SEGMENT_WINDOW,
+                 bandwidth=None, retry_policy=None):
+        """
+        Inicializa el motor.
+
+        Args:
+            session (requests.Session): Sesión HTTP (con pool de conexiones suficiente)
+            headers (dict, opcional): Cabeceras HTTP
+            workers (int, opcional): Segmentos que se descargan a la vez
+            window (int, opcional): Segmentos pedidos por delante del último escrito
+            bandwidth (JobBandwidth, opcional): Limitador de velocidad del trabajo
+            retry_policy (RetryPolicy, opcional): Política de reintentos de cada segmento
+        """
+        self.session = session
+        self.headers = headers or {}
+        self.workers = workers
+        self.window = max(window, workers)
+        self.bandwidth = bandwidth
+        self.retry_policy = retry_policy or RetryPolicy(attempts=SEGMENT_ATTEMPTS)
+        self._buffers = threading.local()
+
+    def segments(self, url):
+        """
+        Descarga el manifiesto de una fuente y obtiene sus segmentos.
+        De una lista HLS maestra se toma la variante de mayor tasa de bits.
+
+        Args:
+            url (str): URL de la fuente (manifiesto DASH con el id de la representación
+                como fragmento, o lista HLS)
+
+        Returns:
+            list: Segmentos (url, rango) en orden
+        """
+        manifest_url, _, representation_id = url.partition('#')
+        response = self.session.get(manifest_url, headers=self.headers, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        final_url = response.url or manifest_url
+        if manifest_type(url) != HLS_MIME_TYPE:
+            return parse_mpd_segments(response.text, final_url, unquote(representation_id))
+
+        if '#EXT-X-STREAM-INF' in response.text:
+            variants, _ = parse_hls_sources(response.text, final_url)
+            best = max(variants, key=lambda source: source.get('bitrate') or 0)
+            return self.segments(best['url'])
+        return parse_hls_segments(response.text, final_url)
+
+    def download(self, url, output_path, progress_callback=None, cancel_event=None):
+        """
+        Descarga una fuente segmentada completa, reanudando una descarga anterior si es posible.
+
+        Args:
+            url (str): URL de la fuente
+            output_path (str): Ruta donde guardar el archivo
+            progress_callback (callable, opcional): Función (descargado, total) para el progreso;
+                mientras no se conocen todos los tamaños, el total es una estimación
+            cancel_event (threading.Event, opcional): Evento que detiene la descarga al activarse;
+                los segmentos ya escritos se conservan en el diario para reanudar
+
+        Returns:
+            bool: True si la descarga fue exitosa
+
+        Raises:
+            DownloadCancelled: Si cancel_event se activó antes de terminar
+            Exception: Si falla el manifiesto o un segmento agota sus reintentos
+        """
+        segments = self.segments(url)
+        if not segments:
+            raise ValueError(f"El manifiesto no tiene segmentos: {url}")
+        fingerprint = segments_fingerprint(segments)
+        journal = SegmentJournal.load(output_path)
+        if journal and (journal.fingerprint != fingerprint or journal.segments != len(segments)):
+            print(f"Los segmentos cambiaron desde la última descarga, se empieza de cero: {url}")
+            journal = None
+        resume = journal is not None
+        if not resume:
+            journal = SegmentJournal(output_path, fingerprint, len(segments))
+        get_tracer().event("segments", resource=url, segments=len(segments), resumed=journal.written)
+
+        progress = _SegmentProgress(segments, progress_callback, journal)
+        if journal.is_complete:
+            progress.report(final=True)
+            return True
+        if resume:
+            print(f"Reanudando descarga: {journal.written} de {len(segments)} segmentos ya en disco")
+
+        stop = _StopSignal(cancel_event)
+        fetch = get_tracer().bind(self._fetch_segment)
+        pending = deque()
+        indices = iter(range(journal.written, len(segments)))
+        with open(output_path, 'r+b' if resume else 'wb') as output:
+            # Lo escrito después del último segmento anotado se descarta
+            output.seek(journal.size)
+            output.truncate()
+            journal.save()
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(segments) - journal.written)) as executor:
+                try:
+                    for index in islice(indices, self.window):
+                        pending.append(executor.submit(fetch, index, segments[index], stop))
+                    while pending:
+                        data = pending.popleft().result()
+                        # Pedir el siguiente antes de escribir para que la ventana siga llena
+                        for index in islice(indices, 1):
+                            pending.append(executor.submit(fetch, index, segments[index], stop))
+                        output.write(data)
+                        output.flush()
+                        journal.advance(len(data))
+                        journal.save()
+                        progress.report()
+                except BaseException:
+                    # Detener el resto de segmentos si uno falla o se cancela
+                    stop.set()
+                    for future in pending:
+                        future.cancel()
+                    raise
+        progress.report(final=True)
+        return True
+
+    def _fetch_segment(self, index, segment, stop):
+        """Descarga un segmento con su propia política de reintentos."""
+        url, byte_range = segment
+        return self.retry_policy.run(lambda current_url: self._get_segment(current_url, byte_range, stop),
+                                     url, cancel_event=stop, description=f"segmento {index + 1}")
+
+    def _get_segment(self, url, byte_range, stop):
+        """Descarga un segmento (o su rango) a memoria."""
+        if stop.is_set():
+            raise DownloadCancelled(url)
+        headers = self.headers
+        length = None
+        if byte_range:
+            start, end = byte_range
+            headers = dict(self.headers, Range=f"bytes={start}-{end}")
+            length = end + 1 - start
+
+        data = bytearray()
+        with self.session.get(url, headers=headers, stream=True,
+                              timeout=(PROBE_TIMEOUT, READ_TIMEOUT)) as response:
+            response.raise_for_status()
+            if byte_range and response.status_code != 206:
+                raise IOError(f"El servidor ignoró el rango {start}-{end} (HTTP {response.status_code})")
+            if length is None and not response.headers.get('Content-Encoding'):
+                declared = response.headers.get('Content-Length', '')
+                length = int(declared) if declared.isdigit() else None
+            for chunk in ChunkReader(response, limit=length, buffer=self._buffer(),
+                                     throttle=self._throttle(url, stop)):
+                if stop.is_set():
+                    raise DownloadCancelled(url)
+                data += chunk
+        if length is not None and len(data) != length:
+            raise IncompleteRangeError(f"Segmento incompleto: recibidos {len(data)} de {length} bytes")
+        return bytes(data)
+
+    def _buffer(self):
+        """Búfer de lectura del hilo actual (se reutiliza entre segmentos)."""
+        buffer = getattr(self._buffers, 'buffer', None)
+        if buffer is None:
+            buffer = self._buffers.buffer = bytearray(MAX_CHUNK_SIZE)
+        return buffer
+
+    def _throttle(self, url, stop):
+        """Limitador de velocidad de una conexión, o None si no hay límites."""
+        return self.bandwidth.throttle(url, stop) if self.bandwidth is not None else None
+
+
+class _StopSignal:
+    """
+    Indicador de parada de una descarga por segmentos.
+    Se activa internamente si falla un segmento, o desde fuera con el evento
+    de cancelación del trabajo. Admite wait() para que las esperas entre
+    reintentos de un segmento terminen en cuanto se pide parar.
+    """
+    def __init__(self, external=None):
+        self._internal = threading.Event()
+        self._external = external
+
+    def set(self):
+        self._internal.set()
+
+    def is_set(self):
+        return self._internal.is_set() or (self._external is not None and self._external.is_set())
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while not self.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._internal.wait(min(remaining, STOP_POLL_INTERVAL))
+        return True
+
+
+class _SegmentProgress:
+    """
+    Informa el progreso de una descarga por segmentos. Si todos los segmentos
+    tienen rango el total es exacto; si no, se estima con el tamaño medio de
+    los ya escritos.
+    """
+    def __init__(self, segments, callback, journal):
+        self.callback = callback
+        self.journal = journal
+        self.count = len(segments)
+        ranges = [byte_range for _, byte_range in segments]
+        self.exact_total = sum(end + 1 - start for start, end in ranges) if all(ranges) else None
+        self._last_report = 0.0
+
+    def report(self, final=False):
+        now = time.monotonic()
+        if not self.callback or (not final and now - self._last_report < PROGRESS_INTERVAL):
+            return
+        self._last_report = now
+        written = self.journal.size
+        if final:
+            total = written
+        elif self.exact_total:
+            total = self.exact_total
+        elif self.journal.written:
+            total = max(written, math.ceil(written / self.journal.written * self.count))
+        else:
+            return
+        if total > 0:
+            self.callback(written, total)
+
+
+def _children(element, name):
+    """Hijos directos con el nombre indicado (sin espacio de nombres)."""
+    return [child for child in element if _local(child.tag) == name]
+
+
+def _segment_info(chain, name):
+    """
+    Combina un elemento de segmentos (SegmentTemplate o SegmentList) heredado por
+    niveles: los atributos y los hijos del nivel más concreto prevalecen.
+
+    Returns:
+        tuple: (atributos, {nombre: [hijos]}), o None si ningún nivel lo define
+    """
+    attributes = {}
+    children = {}
+    found = False
+    for element in chain:
+        info = _child(element, name)
+        if info is None:
+            continue
+        found = True
+        attributes.update(info.attrib)
+        own = {}
+        for child in info:
+            own.setdefault(_local(child.tag), []).append(child)
+        children.update(own)
+    return (attributes, children) if found else None
+
+
+def _fill_template(template, representation, number=None, start_time=None):
+    """Sustituye los campos de una plantilla de SegmentTemplate."""
+    values = {
+        'RepresentationID': representation.get('id'),
+        'Bandwidth': int(representation.get('bandwidth') or 0),
+        'Number': number,
+        'Time': start_time,
+    }
+
+    def replace(match):
+        value = values[match.group(1)]
+        return str(value).zfill(int(match.group(2))) if match.group(2) else str(value)
+    return TEMPLATE_FIELD.sub(replace, template).replace('$$', '$')
+
+
+def _template_segments(attributes, children, base, representation, duration):
+    """Segmentos de un SegmentTemplate (con SegmentTimeline o con duración fija)."""
+    media = attributes.get('media')
+    if not media:
+        raise UnsupportedStreamError("El SegmentTemplate no indica la plantilla de los segmentos.")
+    timescale = int(attributes.get('timescale') or 1)
+    number = int(attributes.get('startNumber') or 1)
+
+    segments = []
+    if attributes.get('initialization'):
+        segments.append((urljoin(base, _fill_template(attributes['initialization'], representation)), None))
+    elif children.get('Initialization'):
+        initialization = children['Initialization'][0]
+        segments.append((urljoin(base, initialization.get('sourceURL') or ''),
+                         _byte_range(initialization.get('range'))))
+
+    if children.get('SegmentTimeline'):
+        entries = _children(children['SegmentTimeline'][0], 'S')
+        period_end = duration * timescale if duration else None
+        start_time = 0
+        for position, entry in enumerate(entries):
+            start_time = int(entry.get('t') or start_time)
+            segment_duration = int(entry.get('d'))
+            repeat = int(entry.get('r') or 0)
+            if repeat < 0:
+                # r = -1: repetir hasta el siguiente S (con t) o hasta el final del periodo
+                following = entries[position + 1] if position + 1 < len(entries) else None
+                limit = int(following.get('t')) if following is not None and following.get('t') else period_end
+                repeat = math.ceil((limit - start_time) / segment_duration) - 1 if limit else 0
+            for _ in range(repeat + 1):
+                segments.append((urljoin(base, _fill_template(media, representation, number, start_time)), None))
+                start_time += segment_duration
+                number += 1
+        return segments
+
+    segment_duration = int(attributes.get('duration') or 0)
+    if not segment_duration or not duration:
+        raise UnsupportedStreamError("No se puede calcular el número de segmentos de la pista.")
+    count = math.ceil(round(duration * timescale / segment_duration, 6))
+    for index in range(count):
+        segments.append((urljoin(base, _fill_template(media, representation, number + index,
+                                                       index * segment_duration)), None))
+    return segments
+
+
+def _list_segments(attributes, children, base):
+    """Segmentos de un SegmentList (con su inicialización, si la tiene)."""
+    segments = []
+    for initialization in children.get('Initialization', [])[:1]:
+        segments.append((urljoin(base, initialization.get('sourceURL') or ''),
+                         _byte_range(initialization.get('range'))))
+    for segment in children.get('SegmentURL', []):
+        segments.append((urljoin(base, segment.get('media') or ''), _byte_range(segment.get('mediaRange'))))
+    return segments
+
+
+def _byte_range(text):
+    """Convierte un rango DASH ("inicio-fin") en una tupla, o None si no hay."""
+    if not text:
+        return None
+    start, end = text.split('-', 1)
+    return int(start), int(end)
+
+
+def _hls_range(text, url, offsets):
+    """
+    Convierte un #EXT-X-BYTERANGE ("longitud[@inicio]") en una tupla (inicio, fin).
+    Sin inicio, el rango sigue al anterior del mismo recurso.
+    """
+    if not text:
+        return None
+    length, _, start = text.partition('@')
+    start = int(start) if start else offsets.get(url, 0)
+    end = start + int(length) - 1
+    offsets[url] = end + 1
+    return start, end
@@ -0,0 +1,362 @@
+import os
+import re
+import time
+import datetime
+import threading
+import weakref
+from urllib.parse import urlparse
+
+BURST_SECONDS = 0.5          # Ráfaga máxima permitida, en segundos de la velocidad límite
+MIN_BURST = 64 * 1024        # Ráfaga mínima en bytes (al menos una lectura pequeña)
+CHUNK_TIME = 0.1             # Segundos de datos por lectura cuando hay límite (progreso y cancelación ágiles)
+MIN_THROTTLED_CHUNK = 16 * 1024
+WAIT_SLICE = 0.1             # Segundos máximos de cada espera antes de volver a mirar la cancelación
+SCHEDULE_CHECK = 30.0        # Segundos entre revisiones del horario
+RATE_ENV = 'PICTA_LIMIT_RATE'          # Variable de entorno con el límite general (por ejemplo "2M")
+SCHEDULE_ENV = 'PICTA_LIMIT_SCHEDULE'  # Variable de entorno con el horario de límites
+
+_UNITS = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2, 'G': 1024 ** 3, 'GB': 1024 ** 3}
+
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+
+def parse_rate(text):
+    """
+    Convierte una velocidad escrita por el usuario en bytes por segundo.
+
+    Args:
+        text (str): Velocidad como "500K", "2M", "1.5MB" o "0" (sin límite)
+
+    Returns:
+        int: Bytes por segundo, o None si no hay límite
+
+    Raises:
+        ValueError: Si el texto no es una velocidad válida
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?B?)(?:/S)?\s*', str(text).upper())
+    if not match:
+        raise ValueError(f"Velocidad no válida: {text}")
+    rate = int(float(match.group(1)) * _UNITS[match.group(2)])
+    return rate or None
+
+
+def parse_schedule(text):
+    """
+    Lee un horario de límites con el formato "HH:MM-HH:MM=velocidad,...".
+    Por ejemplo "08:00-23:00=1M" limita a 1 MB/s durante el día; un tramo que
+    pasa de medianoche (como "23:00-07:00=0") también es válido.
+
+    Args:
+        text (str): Horario
+
+    Returns:
+        Schedule: Horario leído
+
+    Raises:
+        ValueError: Si el horario no es válido
+    """
+    rules = []
+    for part in filter(None, (part.strip() for part in text.split(','))):
+        match = re.fullmatch(r'(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)', part)
+        if not match:
+            raise ValueError(f"Tramo de horario no válido: {part}")
+        start_h, start_m, end_h, end_m = (int(value) for value in match.groups()[:4])
+        if start_h > 23 or end_h > 24 or start_m > 59 or end_m > 59:
+            raise ValueError(f"Hora no válida en el tramo: {part}")
+        rules.append((start_h * 60 + start_m, end_h * 60 + end_m, parse_rate(match.group(5))))
+    return Schedule(rules)
+
+
+class Schedule:
+    """
+    Límites de velocidad según la hora del día.
+    Cada tramo es (minuto de inicio, minuto de fin, bytes/s o None); gana el
+    primero que contiene la hora actual. Fuera de los tramos se usa el límite
+    general del limitador.
+    """
+    def __init__(self, rules):
+        """
+        Inicializa el horario.
+
+        Args:
+            rules (list): Tramos (inicio, fin, velocidad), en minutos desde medianoche
+        """
+        self.rules = list(rules)
+
+    def rate_at(self, moment, default=None):
+        """
+        Devuelve el límite vigente en un instante.
+
+        Args:
+            moment (datetime.datetime): Instante (hora local)
+            default (int, opcional): Límite fuera de los tramos
+
+        Returns:
+            int: Bytes por segundo, o None si no hay límite
+        """
+        minute = moment.hour * 60 + moment.minute
+        for start, end, rate in self.rules:
+            inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+            if inside:
+                return rate
+        return default
+
+
+class TokenBucket:
+    """
+    Cubo de fichas: se rellena a `rate` bytes por segundo hasta `burst`.
+    reserve() siempre concede los bytes pedidos (el cubo puede quedar en
+    deuda) y devuelve cuánto hay que esperar para pagarla; así cada lectura
+    cuesta un candado y una resta, y varias conexiones que comparten el cubo
+    se reparten la velocidad sin coordinarse entre ellas.
+    """
+    def __init__(self, rate=None, burst=None):
+        """
+        Inicializa el cubo.
+
+        Args:
+            rate (int, opcional): Bytes por segundo (None o 0: sin límite)
+            burst (int, opcional): Tamaño del cubo (por defecto BURST_SECONDS de velocidad)
+        """
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._time = time.monotonic()
+        self.rate = None
+        self.burst = 0
+        self.set_rate(rate, burst)
+
+    def set_rate(self, rate, burst=None):
+        """
+        Cambia la velocidad límite.
+
+        Args:
+            rate (int): Bytes por segundo (None o 0: sin límite)
+            burst (int, opcional): Tamaño del cubo
+        """
+        rate = rate or None
+        with self._lock:
+            if rate == self.rate and burst is None:
+                return
+            self.rate = rate
+            self.burst = burst or max(int((rate or 0) * BURST_SECONDS), MIN_BURST)
+            # Un cambio de límite no debe permitir una ráfaga acumulada ni arrastrar deuda vieja
+            self._tokens = min(max(self._tokens, 0.0), self.burst)
+            self._time = time.monotonic()
+
+    def reserve(self, count, now=None):
+        """
+        Toma fichas del cubo.
+
+        Args:
+            count (int): Bytes leídos
+            now (float, opcional): Instante actual (time.monotonic())
+
+        Returns:
+            float: Segundos que hay que esperar para no superar el límite
+        """
+        if self.rate is None:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.rate is None:
+                return 0.0
+            self._tokens = min(self.burst, self._tokens + (now - self._time) * self.rate)
+            self._time = now
+            self._tokens -= count
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class Throttle:
+    """
+    Limitador de una conexión: cada lectura paga en todos los cubos que le
+    afectan (general, del servidor y del trabajo) y espera lo que pida el
+    más restrictivo.
+    """
+    def __init__(self, limiter, buckets, cancel=None):
+        """
+        Inicializa el limitador de la conexión.
+
+        Args:
+            limiter (BandwidthLimiter): Limitador que actualiza el horario
+            buckets (list): Cubos que se aplican a la conexión
+            cancel (threading.Event, opcional): Objeto con is_set() que interrumpe las esperas
+        """
+        self.limiter = limiter
+        self.buckets = buckets
+        self.cancel = cancel
+
+    def chunk_limit(self):
+        """
+        Tamaño máximo de lectura con el límite actual, para no recibir ráfagas
+        grandes seguidas de esperas largas.
+
+        Returns:
+            int: Bytes por lectura, o None si no hay límite
+        """
+        rates = [bucket.rate for bucket in self.buckets if bucket.rate]
+        if not rates:
+            return None
+        return max(int(min(rates) * CHUNK_TIME), MIN_THROTTLED_CHUNK)
+
+    def consume(self, count):
+        """
+        Descuenta una lectura y espera si se superó algún límite.
+
+        Args:
+            count (int): Bytes leídos
+        """
+        self.limiter.refresh()
+        now = time.monotonic()
+        wait = max(bucket.reserve(count, now) for bucket in self.buckets)
+        deadline = now + wait
+        while wait > 0:
+            if self.cancel is not None and self.cancel.is_set():
+                return
+            time.sleep(min(wait, WAIT_SLICE))
+            wait = deadline - time.monotonic()
+
+
+class BandwidthLimiter:
+    """
+    Limitador de ancho de banda compartido por todas las descargas del proceso.
+    Admite un límite general (opcionalmente según la hora del día), uno por
+    servidor y uno por trabajo. Las conexiones paralelas de un mismo archivo
+    comparten los cubos, así que la suma de todas respeta los límites.
+    """
+    def __init__(self, rate=None, job_rate=None, host_rate=None, schedule=None):
+        """
+        Inicializa el limitador.
+
+        Args:
+            rate (int, opcional): Límite general en bytes/s
+            job_rate (int, opcional): Límite de cada trabajo en bytes/s
+            host_rate (int, opcional): Límite de cada servidor en bytes/s
+            schedule (Schedule, opcional): Límites generales según la hora del día
+        """
+        self._lock = threading.Lock()
+        self._global = TokenBucket()
+        self._hosts = {}
+        self._jobs = weakref.WeakSet()
+        self._next_check = 0.0
+        self.rate = self.job_rate = self.host_rate = self.schedule = None
+        self.configure(rate, job_rate, host_rate, schedule)
+
+    def configure(self, rate=None, job_rate=None, host_rate=None, schedule=None):
+        """
+        Cambia los límites; las descargas en curso los aplican en su siguiente lectura.
+
+        Args:
+            rate (int, opcional): Límite general en bytes/s
+            job_rate (int, opcional): Límite de cada trabajo en bytes/s
+            host_rate (int, opcional): Límite de cada servidor en bytes/s
+            schedule (Schedule, opcional): Límites generales según la hora del día
+        """
+        with self._lock:
+            self.rate, self.job_rate, self.host_rate, self.schedule = rate, job_rate, host_rate, schedule
+            for bucket in self._hosts.values():
+                bucket.set_rate(host_rate)
+            for bucket in list(self._jobs):
+                bucket.set_rate(job_rate)
+            self._next_check = 0.0
+        self.refresh()
+
+    @property
+    def enabled(self):
+        """Indica si hay algún límite configurado."""
+        return bool(self.rate or self.job_rate or self.host_rate or self.schedule)
+
+    def refresh(self, moment=None):
+        """
+        Aplica el límite general que corresponde a la hora actual.
+        Es barato: solo consulta el horario cada SCHEDULE_CHECK segundos.
+
+        Args:
+            moment (datetime.datetime, opcional): Instante a usar (por defecto ahora)
+        """
+        now = time.monotonic()
+        if moment is None and now < self._next_check:
+            return
+        self._next_check = now + SCHEDULE_CHECK
+        rate = self.rate
+        if self.schedule is not None:
+            rate = self.schedule.rate_at(moment or datetime.datetime.now(), self.rate)
+        self._global.set_rate(rate)
+
+    def for_job(self):
+        """
+        Devuelve el limitador de un trabajo (todas sus pistas y conexiones comparten su cubo).
+
+        Returns:
+            JobBandwidth: Limitador del trabajo
+        """
+        bucket = TokenBucket(self.job_rate)
+        with self._lock:
+            self._jobs.add(bucket)
+        return JobBandwidth(self, bucket)
+
+    def throttle(self, url, job_bucket=None, cancel=None):
+        """
+        Crea el limitador de una conexión.
+
+        Args:
+            url (str): URL que se descarga (determina el servidor)
+            job_bucket (TokenBucket, opcional): Cubo del trabajo
+            cancel (threading.Event, opcional): Objeto con is_set() que interrumpe las esperas
+
+        Returns:
+            Throttle: Limitador de la conexión, o None si no hay ningún límite
+        """
+        if not self.enabled:
+            return None
+        host = urlparse(url).hostname or ''
+        with self._lock:
+            host_bucket = self._hosts.get(host)
+            if host_bucket is None:
+                host_bucket = self._hosts[host] = TokenBucket(self.host_rate)
+        buckets = [self._global, host_bucket] + ([job_bucket] if job_bucket is not None else [])
+        return Throttle(self, buckets, cancel)
+
+
+class JobBandwidth:
+    """Vista del limitador para un trabajo concreto."""
+    def __init__(self, limiter, bucket):
+        self.limiter = limiter
+        self.bucket = bucket
+
+    def throttle(self, url, cancel=None):
+        """
+        Crea el limitador de una conexión del trabajo.
+
+        Args:
+            url (str): URL que se descarga
+            cancel (threading.Event, opcional): Objeto con is_set() que interrumpe las esperas
+
+        Returns:
+            Throttle: Limitador de la conexión, o None si no hay ningún límite
+        """
+        return self.limiter.throttle(url, self.bucket, cancel)
+
+
+def get_shared_limiter():
+    """
+    Devuelve el limitador compartido por todo el proceso, creándolo si no existe.
+    Los límites iniciales se leen de PICTA_LIMIT_RATE y PICTA_LIMIT_SCHEDULE
+    (así también se pueden usar desde la interfaz gráfica); sin ellas no hay límite.
+
+    Returns:
+        BandwidthLimiter: Limitador compartido
+    """
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            rate = schedule = None
+            try:
+                if os.environ.get(RATE_ENV):
+                    rate = parse_rate(os.environ[RATE_ENV])
+                if os.environ.get(SCHEDULE_ENV):
+                    schedule = parse_schedule(os.environ[SCHEDULE_ENV])
+            except ValueError as e:
+                print(f"Límite de velocidad ignorado: {e}")
+            _shared_limiter = BandwidthLimiter(rate, schedule=schedule)
+        return _shared_limiter
@@ -0,0 +1,150 @@
+"""
+Micro-benchmark del camino de E/S de las descargas: CPU por GB descargado.
+
+Compara el bucle original (bloques de 1 KB con un aviso de progreso por
+bloque), iter_content con bloques de 256 KB, y el lector adaptativo con
+búfer reutilizable (ChunkReader), además del motor por rangos completo.
+El servidor corre en otro proceso para que solo se mida la CPU del cliente.
+
+    python benchmarks/bench_chunk_io.py [--size-mb 256]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from segmented_download import SegmentedDownloader, ChunkReader
+
+BLOCK = b'\0' * (1024 * 1024)
+
+
+def serve(size, port_queue):
+    """Servidor HTTP mínimo con soporte de rangos que sirve `size` bytes de ceros."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header('Content-Length', str(size))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.end_headers()
+
+        def do_GET(self):
+            start, end = 0, size - 1
+            match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+            if match:
+                start = int(match.group(1))
+                end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.end_headers()
+            remaining = end - start + 1
+            view = memoryview(BLOCK)
+            while remaining > 0:
+                count = min(remaining, len(view))
+                self.wfile.write(view[:count])
+                remaining -= count
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def legacy_loop(session, url, path):
+    """Bucle original: bloques de 1 KB y un aviso de progreso por bloque."""
+    calls = []
+    with session.get(url, stream=True) as response:
+        total = int(response.headers.get('content-length', 0))
+        downloaded = 0
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=1024):
+                if chunk:
+                    f.write(chunk)
+                    downloaded += len(chunk)
+                    calls.append((downloaded, total))
+                    calls.clear()
+
+
+def iter_content_loop(session, url, path):
+    """iter_content con bloques fijos de 256 KB."""
+    with session.get(url, stream=True) as response:
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=256 * 1024):
+                if chunk:
+                    f.write(chunk)
+
+
+def chunk_reader_loop(session, url, path):
+    """Lector adaptativo con búfer reutilizable."""
+    with session.get(url, stream=True) as response:
+        with open(path, 'wb', buffering=0) as f:
+            for chunk in ChunkReader(response):
+                f.write(chunk)
+
+
+def segmented(session, url, path):
+    """Motor por rangos completo (4 conexiones, diario, progreso limitado)."""
+    SegmentedDownloader(session).download(url, path, progress_callback=lambda done, total: None)
+    os.remove(path + '.journal')
+
+
+def measure(name, function, session, url, size, path):
+    """Ejecuta un escenario y devuelve (nombre, segundos, MB/s, segundos de CPU por GB)."""
+    wall, cpu = time.perf_counter(), time.process_time()
+    function(session, url, path)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    assert os.path.getsize(path) == size, f"{name}: tamaño incorrecto"
+    os.remove(path)
+    return name, wall, size / wall / 1048576, cpu * (1 << 30) / size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=256, help="tamaño del archivo de prueba")
+    parser.add_argument('--skip-legacy', action='store_true', help="omitir el bucle de 1 KB (lento)")
+    args = parser.parse_args()
+    size = args.size_mb * 1024 * 1024
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(size, port_queue), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{port_queue.get()}/file.bin"
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=16)
+    session.mount('http://', adapter)
+    path = os.path.join(tempfile.gettempdir(), f"bench_chunk_io_{os.getpid()}.bin")
+
+    scenarios = [("iter_content 256 KB", iter_content_loop),
+                 ("ChunkReader adaptativo", chunk_reader_loop),
+                 ("SegmentedDownloader", segmented)]
+    if not args.skip_legacy:
+        scenarios.insert(0, ("original 1 KB + progreso", legacy_loop))
+
+    print(f"{'escenario':<26} {'s':>7} {'MB/s':>8} {'CPU s/GB':>9}")
+    try:
+        for name, function in scenarios:
+            name, wall, speed, cpu_per_gb = measure(name, function, session, url, size, path)
+            print(f"{name:<26} {wall:7.2f} {speed:8.0f} {cpu_per_gb:9.2f}")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark del análisis del registro de rendimiento de Chrome.
+
+Compara el análisis original (json.loads de todas las entradas y búsqueda
+de subcadenas en la URL) con MediaLogCollector (filtro textual previo,
+clasificador compilado y eliminación de duplicados por URL). Mide el tiempo
+de CPU y el pico de memoria reservada mientras se procesan los lotes.
+
+Por defecto usa un registro sintético como el de benchmarks/fake_picta.py;
+con --recorded se usa uno grabado de verdad (lista JSON con las entradas
+de driver.get_log('performance')).
+
+    python benchmarks/bench_network_log.py [--entries 200000] [--batch 2000] [--recorded registro.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from network_log import MediaLogCollector
+from fake_picta import performance_log
+
+
+def legacy_collect(logs, found, seen_urls):
+    """Análisis original: decodifica todas las entradas antes de mirar su método."""
+    new_media = False
+    for log in logs:
+        try:
+            log_entry = json.loads(log["message"])["message"]
+            if "Network.responseReceived" not in log_entry["method"]:
+                continue
+            request_url = log_entry["params"]["response"]["url"]
+            if request_url in seen_urls:
+                continue
+            if "video%2F" in request_url and request_url.endswith(".mp4"):
+                quality = "Unknown"
+                for candidate in ("480p", "720p", "1080p"):
+                    if candidate in request_url:
+                        quality = candidate
+                        break
+                found['video_sources'].append({'url': request_url, 'quality': quality, 'type': 'video/mp4'})
+            elif "audio%2F" in request_url and request_url.endswith(".mp4"):
+                found['audio_tracks'].append({'url': request_url, 'language': "Desconocido"})
+            elif request_url.endswith(".vtt") or request_url.endswith(".srt"):
+                found['subtitles'].append({'url': request_url, 'language': "Desconocido"})
+            else:
+                continue
+            seen_urls.add(request_url)
+            new_media = True
+        except Exception:
+            continue
+    return new_media
+
+
+def measure(batches, use_collector):
+    """
+    Procesa todos los lotes con uno de los dos análisis.
+
+    Returns:
+        tuple: (segundos de CPU, pico de memoria en MB, recursos encontrados)
+    """
+    tracemalloc.start()
+    start = time.process_time()
+    if use_collector:
+        collector = MediaLogCollector()
+        for batch in batches:
+            collector.feed(batch)
+        found = collector.found
+    else:
+        found = {'video_sources': [], 'audio_tracks': [], 'subtitles': []}
+        seen_urls = set()
+        for batch in batches:
+            legacy_collect(batch, found, seen_urls)
+    cpu = time.process_time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return cpu, peak / 1048576, sum(len(items) for items in found.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=200000, help="entradas del registro sintético")
+    parser.add_argument('--batch', type=int, default=2000, help="entradas por lectura de get_log")
+    parser.add_argument('--recorded', default=None, help="registro grabado (lista JSON de entradas)")
+    args = parser.parse_args()
+
+    if args.recorded:
+        with open(args.recorded, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+    else:
+        entries = [entry for _, entry in performance_log("http://127.0.0.1:8000", noise=args.entries)]
+    batches = [entries[i:i + args.batch] for i in range(0, len(entries), args.batch)]
+    size = sum(len(entry['message']) for entry in entries) / 1048576
+
+    print(f"{len(entries)} entradas ({size:.1f} MB de JSON) en lotes de {args.batch}")
+    print(f"{'análisis':<14} {'CPU s':>8} {'entradas/s':>12} {'pico MB':>8} {'medios':>7}")
+    for label, use_collector in (("original", False), ("prefiltrado", True)):
+        cpu, peak, media = measure(batches, use_collector)
+        rate = len(entries) / cpu if cpu else float('inf')
+        print(f"{label:<14} {cpu:8.3f} {rate:12.0f} {peak:8.2f} {media:7}")
+
+
+if __name__ == "__main__":
+    main()
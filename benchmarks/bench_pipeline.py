@@ -0,0 +1,342 @@
+"""
+Benchmarks de extremo a extremo contra un Picta falso local (benchmarks/fake_picta.py).
+
+Escenarios:
+    extract       PictaDownloader.extract_network_requests con un navegador simulado
+                  que reproduce el registro de red de la página (o Chrome real con
+                  --real-browser)
+    download      download_file con rangos en paralelo
+    throttled     download_file con el ancho de banda de cada conexión limitado
+    failures      download_file con cortes y 503 inyectados (reintentos y reanudación)
+    segments      download_file de una representación DASH por segmentos, con latencia
+                  por petición (descarga en paralelo dentro de la ventana)
+    mux           combinación con FFmpeg de pistas MP4 generadas con FFmpeg
+    pipeline      run_download completo (descarga + combinación) desde el CDN falso
+
+Cada escenario se ejecuta en un proceso nuevo para medir su pico de memoria
+(RSS) sin arrastrar el de los anteriores. Se informa el rendimiento (MB/s),
+la latencia (mediana y p95 de las repeticiones) y el pico de RSS. Con --json
+se guardan los resultados y con --baseline se comparan con otros anteriores:
+las regresiones mayores que --tolerance hacen que el comando termine con 1.
+
+    python benchmarks/bench_pipeline.py [--only download,failures] [--repeat 3]
+                                        [--json resultados.json] [--baseline anteriores.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+import statistics
+import subprocess
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_picta import default_config, start_in_process, media_paths, MEDIA_ID
+
+SCENARIOS = ('extract', 'download', 'throttled', 'failures', 'segments', 'mux', 'pipeline')
+DEFAULT_TOLERANCE = 0.15         # Variación admitida antes de considerar una regresión
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso actual en MB (None si no se puede medir)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class ReplayDriver:
+    """
+    Navegador simulado con la interfaz de WebDriver que usa extract_network_requests.
+    get() carga la página del servidor falso y su registro de red; get_log()
+    entrega las entradas a medida que "llegan", según el tiempo transcurrido.
+    """
+    def __init__(self, base_url, noise):
+        import requests
+        self.session = requests.Session()
+        self.base_url = base_url
+        self.noise = noise
+        self.pending = []
+        self.loaded_at = None
+        self.page = ""
+
+    def get(self, url):
+        self.page = self.session.get(url).text
+        media_id = url.rstrip('/').rsplit('/', 1)[-1]
+        self.pending = self.session.get(f"{self.base_url}/perf-log/{media_id}?noise={self.noise}").json()
+        self.loaded_at = time.monotonic()
+
+    def get_log(self, kind):
+        elapsed = time.monotonic() - self.loaded_at
+        count = 0
+        while count < len(self.pending) and self.pending[count][0] <= elapsed:
+            count += 1
+        ready, self.pending = self.pending[:count], self.pending[count:]
+        return [entry for _, entry in ready]
+
+    def find_elements(self, by, selector):
+        return [self] if f"<{selector}" in self.page else []
+
+    def find_element(self, by, selector):
+        if selector.startswith('h1') and '<h1' in self.page:
+            return self
+        raise LookupError(selector)
+
+    def execute_script(self, script, *args):
+        return None
+
+    @property
+    def text(self):
+        return self.page.split('<h1 class="title">', 1)[-1].split('</h1>', 1)[0]
+
+
+def make_ffmpeg_media(directory, seconds):
+    """
+    Genera con FFmpeg un video (sin audio) y un audio MP4 reales, con el moov al final.
+
+    Returns:
+        tuple: (ruta del video, ruta del audio), o None si FFmpeg no está disponible
+    """
+    if not shutil.which('ffmpeg'):
+        return None
+    video = os.path.join(directory, "video.mp4")
+    audio = os.path.join(directory, "audio.m4a")
+    commands = [
+        ['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', f'testsrc2=size=1280x720:rate=30:duration={seconds}',
+         '-c:v', 'mpeg4', '-q:v', '3', video],
+        ['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+         '-c:a', 'aac', '-b:a', '128k', audio],
+    ]
+    for command in commands:
+        if subprocess.run(command).returncode != 0:
+            return None
+    return video, audio
+
+
+def run_scenario(name, base_url, config, args, workdir):
+    """
+    Ejecuta una repetición de un escenario.
+
+    Returns:
+        dict: seconds y, si aplica, bytes y retries
+    """
+    from picta_downloader import PictaDownloader
+    from retry_policy import RetryPolicy
+    from tracing import get_tracer
+
+    downloader = PictaDownloader(stream_mux=args.stream, temp_root=os.path.join(workdir, "temp"))
+    # Esperas cortas: se mide el coste de reintentar y reanudar, no el de esperar
+    downloader.retry_policy = RetryPolicy(base_delay=0.05, max_delay=0.5, attempts=20)
+    paths = media_paths(config['media_id'])
+    retries = []
+    get_tracer().add_sink(lambda record: retries.append(1) if record['name'] == 'retry' else None)
+    started = time.perf_counter()
+
+    if name == 'extract':
+        driver = ReplayDriver(base_url, args.log_noise)
+        if args.real_browser:
+            driver = downloader.setup_browser()
+        try:
+            info = downloader.extract_network_requests(driver, f"{base_url}/embed/{config['media_id']}")
+        finally:
+            if args.real_browser:
+                driver.quit()
+        assert info['video_sources'] and info['audio_tracks'], "no se encontraron los medios"
+        return {'seconds': time.perf_counter() - started}
+
+    if name in ('download', 'throttled', 'failures', 'segments'):
+        output = os.path.join(workdir, "video.mp4")
+        # La representación DASH 'video' reparte en segmentos la misma pista
+        url = base_url + (paths['manifest'] + "#video" if name == 'segments' else paths['video'])
+        assert downloader.download_file(url, output), "la descarga falló"
+        seconds = time.perf_counter() - started
+        size = os.path.getsize(output)
+        os.remove(output)
+        return {'seconds': seconds, 'bytes': size, 'retries': len(retries)}
+
+    if name == 'mux':
+        from ffmpeg_mux import mux_tracks
+        output = os.path.join(workdir, "mux.mp4")
+        mux_tracks(output, config['video_file'], config['audio_file'])
+        seconds = time.perf_counter() - started
+        size = os.path.getsize(config['video_file']) + os.path.getsize(config['audio_file'])
+        os.remove(output)
+        return {'seconds': seconds, 'bytes': size}
+
+    if name == 'pipeline':
+        from media_manifest import MediaManifest
+        manifest = MediaManifest(f"https://www.picta.cu/medias/{config['media_id']}", "pipeline",
+                                 [{'url': base_url + paths['video'], 'quality': '720p', 'type': 'video/mp4'}],
+                                 [{'url': base_url + paths['audio'], 'language': 'Español'}],
+                                 [{'url': base_url + paths['subtitle'], 'language': 'Español'}])
+        output_dir = os.path.join(workdir, "out")
+        os.makedirs(output_dir, exist_ok=True)
+        selection = {'video': manifest.video_sources[0], 'audio': manifest.audio_tracks[0],
+                     'subtitle': manifest.subtitles[0]}
+        success, result = downloader.run_download(manifest, output_dir, selection)
+        assert success, result
+        seconds = time.perf_counter() - started
+        size = os.path.getsize(result)
+        os.remove(result)
+        return {'seconds': seconds, 'bytes': size}
+
+    raise ValueError(name)
+
+
+def scenario_process(name, config, args, result_queue):
+    """Cuerpo del proceso de un escenario: arranca el servidor, repite y devuelve las medidas."""
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    server = None
+    try:
+        server, base_url = start_in_process(config)
+        runs = []
+        for _ in range(args.warmup):
+            run_scenario(name, base_url, config, args, workdir)
+        for _ in range(args.repeat):
+            runs.append(run_scenario(name, base_url, config, args, workdir))
+        result_queue.put({'runs': runs, 'peak_rss_mb': peak_rss_mb()})
+    except BaseException as e:
+        result_queue.put({'error': f"{type(e).__name__}: {e}"})
+    finally:
+        if server is not None:
+            server.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def summarize(name, result):
+    """Reduce las repeticiones de un escenario a las métricas que se comparan."""
+    if 'error' in result:
+        return {'scenario': name, 'error': result['error']}
+    seconds = sorted(run['seconds'] for run in result['runs'])
+    summary = {
+        'scenario': name,
+        'repeat': len(seconds),
+        'latency_p50_s': round(statistics.median(seconds), 4),
+        'latency_p95_s': round(seconds[min(len(seconds) - 1, int(round(0.95 * (len(seconds) - 1))))], 4),
+        'peak_rss_mb': round(result['peak_rss_mb'], 1) if result['peak_rss_mb'] else None,
+    }
+    sizes = [run['bytes'] for run in result['runs'] if run.get('bytes')]
+    if sizes:
+        speeds = [run['bytes'] / run['seconds'] / 1048576 for run in result['runs']]
+        summary['throughput_mb_s'] = round(statistics.median(speeds), 2)
+    if any('retries' in run for run in result['runs']):
+        summary['retries'] = sum(run.get('retries', 0) for run in result['runs'])
+    return summary
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compara con resultados anteriores.
+
+    Returns:
+        list: Descripción de cada regresión encontrada
+    """
+    previous = {item['scenario']: item for item in baseline.get('results', [])}
+    regressions = []
+    for item in results:
+        old = previous.get(item['scenario'])
+        if not old or 'error' in item or 'error' in old:
+            continue
+        # Mayor es mejor para el rendimiento; menor es mejor para latencia y memoria
+        for key, higher_is_better in (('throughput_mb_s', True), ('latency_p50_s', False),
+                                      ('peak_rss_mb', False)):
+            new_value, old_value = item.get(key), old.get(key)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append(f"{item['scenario']}: {key} {old_value} -> {new_value} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', default=",".join(SCENARIOS), help="escenarios separados por comas")
+    parser.add_argument('--repeat', type=int, default=3, help="repeticiones medidas por escenario")
+    parser.add_argument('--warmup', type=int, default=1, help="repeticiones previas sin medir")
+    parser.add_argument('--video-mb', type=float, default=128, help="tamaño de la pista de video sintética")
+    parser.add_argument('--throttle-mb', type=float, default=8, help="MB/s por conexión en 'throttled'")
+    parser.add_argument('--fail-rate', type=float, default=0.2, help="fracción de respuestas que fallan en 'failures'")
+    parser.add_argument('--log-noise', type=int, default=5000, help="entradas ajenas a los medios en 'extract'")
+    parser.add_argument('--segment-kb', type=int, default=1024, help="tamaño de cada segmento en 'segments'")
+    parser.add_argument('--segment-latency-ms', type=float, default=20,
+                        help="latencia de cada petición en 'segments'")
+    parser.add_argument('--mux-seconds', type=int, default=30, help="duración de las pistas generadas para 'mux'")
+    parser.add_argument('--stream', action='store_true', help="usar la combinación en streaming en 'pipeline'")
+    parser.add_argument('--real-browser', action='store_true', help="usar Chrome real en 'extract'")
+    parser.add_argument('--json', dest='json_path', default=None, help="guardar los resultados en un archivo")
+    parser.add_argument('--baseline', default=None, help="resultados anteriores con los que comparar")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.only.split(',') if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    media_dir = tempfile.mkdtemp(prefix="bench_media_")
+    real_media = make_ffmpeg_media(media_dir, args.mux_seconds) if {'mux', 'pipeline'} & set(names) else None
+    base = dict(video_mb=args.video_mb, audio_mb=max(1, args.video_mb / 16), media_id=MEDIA_ID)
+    configs = {
+        'extract': default_config(**dict(base, video_mb=1, audio_mb=1)),
+        'download': default_config(**base),
+        'throttled': default_config(**dict(base, video_mb=min(args.video_mb, 64)),
+                                    throttle=int(args.throttle_mb * 1048576)),
+        'failures': default_config(**base, fail_rate=args.fail_rate),
+        'segments': default_config(**base, segment_kb=args.segment_kb, latency=args.segment_latency_ms / 1000),
+        'mux': default_config(**base, video_file=real_media[0], audio_file=real_media[1]) if real_media else None,
+        'pipeline': default_config(**base, video_file=real_media[0], audio_file=real_media[1]) if real_media else None,
+    }
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    print(f"{'escenario':<10} {'p50 s':>8} {'p95 s':>8} {'MB/s':>8} {'RSS MB':>8} {'reintentos':>10}")
+    try:
+        for name in names:
+            if configs[name] is None:
+                results.append({'scenario': name, 'error': "FFmpeg no disponible"})
+                print(f"{name:<10} omitido (FFmpeg no disponible)")
+                continue
+            result_queue = context.Queue()
+            process = context.Process(target=scenario_process, args=(name, configs[name], args, result_queue))
+            process.start()
+            result = result_queue.get()
+            process.join()
+            summary = summarize(name, result)
+            results.append(summary)
+            if 'error' in summary:
+                print(f"{name:<10} error: {summary['error']}")
+                continue
+            print(f"{name:<10} {summary['latency_p50_s']:8.3f} {summary['latency_p95_s']:8.3f} "
+                  f"{summary.get('throughput_mb_s', '-'):>8} {summary['peak_rss_mb'] or '-':>8} "
+                  f"{summary.get('retries', '-'):>10}")
+    finally:
+        shutil.rmtree(media_dir, ignore_errors=True)
+
+    report = {'time': time.time(), 'python': platform.python_version(), 'platform': platform.platform(),
+              'args': {key: value for key, value in vars(args).items() if key not in ('json_path', 'baseline')},
+              'results': results}
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESIÓN {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
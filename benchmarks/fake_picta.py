@@ -0,0 +1,371 @@
+"""
+Servidor local que imita la página /embed/ de Picta y su CDN de medios.
+
+Sirve una página de reproducción, las pistas de video, audio y subtítulos
+(con soporte de rangos), un manifiesto DASH que reparte esas mismas pistas
+en segmentos, y el registro de red que vería el navegador. Se
+puede limitar el ancho de banda de cada conexión, añadir latencia y provocar
+fallos (conexiones cortadas a medias o respuestas 503).
+
+    python benchmarks/fake_picta.py [--port 8000] [--video-mb 64] [--throttle 20M] [--fail-rate 0.05]
+
+Las pistas son MP4 sintéticos (cajas ftyp/mdat/moov con el moov al final,
+como los de Picta) salvo que se indiquen archivos reales con --video-file y
+--audio-file (por ejemplo, generados con FFmpeg para medir la combinación).
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import struct
+import argparse
+import threading
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bandwidth import parse_rate
+
+MEDIA_ID = "bench-1"
+WRITE_BLOCK = 64 * 1024          # Bytes por escritura al enviar un cuerpo
+FAIL_MODES = ('reset', 'unavailable')
+
+SUBTITLE = "WEBVTT\n\n" + "".join(
+    f"00:{i // 60:02d}:{i % 60:02d}.000 --> 00:{i // 60:02d}:{i % 60:02d}.900\nLínea {i}\n\n" for i in range(600))
+
+
+def box(box_type, payload):
+    """Caja ISO BMFF con cabecera de 32 bits."""
+    return struct.pack('>I4s', 8 + len(payload), box_type.encode('latin-1')) + payload
+
+
+def synthetic_mp4(size, moov_last=True, samples=256, kind='video', duration=60):
+    """
+    Crea un MP4 sintético de unos `size` bytes: ftyp, mdat y un moov con una pista
+    (manejador, idioma, códec, dimensiones y tablas stsz/stco). No se puede
+    reproducir, pero tiene la estructura que recorren mp4_boxes y el motor de descarga.
+
+    Args:
+        size (int): Tamaño aproximado en bytes
+        moov_last (bool, opcional): Poner el moov al final (como un MP4 sin faststart)
+        samples (int, opcional): Entradas de la tabla de fragmentos
+        kind (str, opcional): 'video' (avc1 1280x720) o 'audio' (mp4a estéreo 44,1 kHz)
+        duration (int, opcional): Duración declarada en segundos
+
+    Returns:
+        bytes: Contenido del archivo
+    """
+    ftyp = box('ftyp', b'isom\0\0\0\0isomiso2mp41')
+    payload_size = max(samples, size - 4096)
+    step = payload_size // samples
+    language = sum((ord(char) - 0x60) << shift for char, shift in zip('spa', (10, 5, 0)))
+    if kind == 'video':
+        handler = b'vide'
+        entry = box('avc1', b'\0' * 6 + b'\0\1' + b'\0' * 16 + struct.pack('>HH', 1280, 720) + b'\0' * 50)
+    else:
+        handler = b'soun'
+        entry = box('mp4a', b'\0' * 6 + b'\0\1' + b'\0' * 8 + struct.pack('>HHHHI', 2, 16, 0, 0, 44100 << 16))
+
+    def moov(mdat_offset):
+        offsets = b''.join(struct.pack('>I', mdat_offset + 8 + i * step) for i in range(samples))
+        stbl = box('stbl', box('stsd', b'\0' * 4 + struct.pack('>I', 1) + entry)
+                   + box('stsz', b'\0' * 4 + struct.pack('>II', step, samples))
+                   + box('stco', b'\0\0\0\0' + struct.pack('>I', samples) + offsets))
+        mdia = box('mdia', box('mdhd', b'\0' * 12 + struct.pack('>IIHH', 1000, duration * 1000, language, 0))
+                   + box('hdlr', b'\0' * 8 + handler + b'\0' * 13)
+                   + box('minf', stbl))
+        mvhd = box('mvhd', b'\0' * 12 + struct.pack('>II', 1000, duration * 1000) + b'\0' * 80)
+        return box('moov', mvhd + box('trak', mdia))
+
+    # Contenido pseudoaleatorio pero reproducible (no comprimible, como un video real)
+    block = random.Random(size).randbytes(WRITE_BLOCK)
+    mdat = box('mdat', (block * (payload_size // len(block) + 1))[:payload_size])
+    if moov_last:
+        return ftyp + mdat + moov(len(ftyp))
+    header = moov(0)
+    return ftyp + moov(len(ftyp) + len(header)) + mdat
+
+
+def media_paths(media_id=MEDIA_ID):
+    """Rutas de las pistas en el CDN falso (con los patrones que reconoce el extractor)."""
+    return {
+        'video': f"/cdn/video%2F{media_id}_720p.mp4",
+        'audio': f"/cdn/audio%2F{media_id}_spa_128k.mp4",
+        'subtitle': f"/cdn/subs%2F{media_id}_spa.vtt",
+        'manifest': f"/cdn/dash%2F{media_id}.mpd",
+    }
+
+
+def dash_manifest(paths, sizes, segment_size):
+    """
+    Manifiesto DASH cuyas representaciones ('video' y 'audio') son listas de
+    segmentos por rangos de bytes de las pistas MP4.
+
+    Args:
+        paths (dict): Rutas de las pistas (media_paths())
+        sizes (dict): Tamaño de las pistas de video y audio
+        segment_size (int): Bytes por segmento
+
+    Returns:
+        str: XML del manifiesto
+    """
+    def representation(kind, attributes):
+        name = paths[kind].rsplit('/', 1)[-1]
+        segments = "".join(f'<SegmentURL mediaRange="{start}-{min(start + segment_size, sizes[kind]) - 1}"/>'
+                           for start in range(0, sizes[kind], segment_size))
+        return (f'<Representation id="{kind}" {attributes}><BaseURL>{name}</BaseURL>'
+                f'<SegmentList>{segments}</SegmentList></Representation>')
+
+    video = representation('video', 'bandwidth="2500000" height="720"')
+    audio = representation('audio', 'bandwidth="128000"')
+    return ('<?xml version="1.0"?><MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" '
+            'mediaPresentationDuration="PT60S"><Period>'
+            f'<AdaptationSet contentType="video" mimeType="video/mp4">{video}</AdaptationSet>'
+            f'<AdaptationSet contentType="audio" mimeType="audio/mp4" lang="es">{audio}</AdaptationSet>'
+            '</Period></MPD>')
+
+
+def performance_log(base_url, media_id=MEDIA_ID, noise=2000):
+    """
+    Registro de rendimiento de Chrome que produciría la página de un video.
+
+    Args:
+        base_url (str): URL base del servidor
+        media_id (str, opcional): Identificador del medio
+        noise (int, opcional): Entradas ajenas a los medios (scripts, imágenes, métricas...)
+
+    Returns:
+        list: Tuplas (segundos desde la carga, entrada) como las de driver.get_log('performance')
+    """
+    rng = random.Random(noise)
+    methods = ('Network.requestWillBeSent', 'Network.dataReceived', 'Network.loadingFinished',
+               'Page.frameNavigated', 'Network.responseReceived')
+
+    def entry(method, url):
+        message = {'message': {'method': method, 'params': {
+            'requestId': str(rng.randrange(1 << 30)), 'timestamp': time.time(),
+            'response': {'url': url, 'status': 200, 'mimeType': 'application/octet-stream',
+                         'headers': {'content-type': 'application/octet-stream'}},
+            'request': {'url': url, 'method': 'GET'}}}}
+        return {'level': 'INFO', 'timestamp': int(time.time() * 1000), 'message': json.dumps(message)}
+
+    log = []
+    for i in range(noise):
+        url = f"{base_url}/static/{rng.choice(('js', 'css', 'img', 'api'))}/{i}.{rng.choice(('js', 'png', 'json'))}"
+        log.append((rng.uniform(0.0, 1.5), entry(rng.choice(methods), url)))
+    # Los medios llegan poco después de iniciar la reproducción
+    for delay, path in zip((0.4, 0.5, 0.6), media_paths(media_id).values()):
+        log.append((delay, entry('Network.requestWillBeSent', base_url + path)))
+        log.append((delay + 0.05, entry('Network.responseReceived', base_url + path)))
+    log.sort(key=lambda item: item[0])
+    return log
+
+
+class FakePictaHandler(BaseHTTPRequestHandler):
+    """Atiende la página, el registro de red y los medios según la configuración del servidor."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._handle(head=True)
+
+    def do_GET(self):
+        self._handle(head=False)
+
+    def _handle(self, head):
+        config = self.server.config
+        if config['latency']:
+            time.sleep(config['latency'])
+        path = self.path.split('?')[0]
+        if path.startswith('/embed/'):
+            return self._send_bytes(self._page(path[len('/embed/'):]).encode('utf-8'), 'text/html', head)
+        if path.startswith('/perf-log/'):
+            noise = int(re.search(r'noise=(\d+)', self.path).group(1)) if 'noise=' in self.path else 2000
+            log = performance_log(f"http://{self.headers.get('Host')}", path[len('/perf-log/'):], noise)
+            return self._send_bytes(json.dumps(log).encode('utf-8'), 'application/json', head)
+        data = self.server.media.get(path)
+        if data is None:
+            return self._send_status(404)
+        self._send_media(data, head)
+
+    def _page(self, media_id):
+        paths = media_paths(media_id)
+        return ("<!DOCTYPE html><html><head><title>Picta</title></head><body>"
+                f"<h1 class=\"title\">Video de prueba {media_id}</h1>"
+                f"<video src=\"{paths['video']}\" preload=\"none\"></video>"
+                f"<audio src=\"{paths['audio']}\" preload=\"none\"></audio>"
+                f"<track src=\"{paths['subtitle']}\" kind=\"subtitles\" srclang=\"es\">"
+                "</body></html>")
+
+    def _send_status(self, status):
+        self.send_response(status)
+        if status == 503:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_bytes(self, body, content_type, head):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _send_media(self, data, head):
+        size = len(data)
+        start, end = 0, size - 1
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        failure = None if head else self.server.pick_failure()
+        if failure == 'unavailable':
+            return self._send_status(503)
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', f'"{size:x}"')
+        self.end_headers()
+        if head:
+            return
+
+        # Un corte a mitad de la respuesta deja el cuerpo incompleto
+        stop = end + 1 if failure != 'reset' else start + (end + 1 - start) // 2
+        throttle = self.server.config['throttle']
+        view = memoryview(data)
+        position = start
+        started = time.monotonic()
+        while position < stop:
+            count = min(WRITE_BLOCK, stop - position)
+            self.wfile.write(view[position:position + count])
+            position += count
+            if throttle:
+                ahead = (position - start) / throttle - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+        if failure == 'reset':
+            self.close_connection = True
+
+
+class FakePictaServer(ThreadingHTTPServer):
+    """Servidor HTTP con los medios en memoria y un generador de fallos reproducible."""
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, FakePictaHandler)
+        self.config = config
+        self.media = load_media(config)
+        self._random = random.Random(config['seed'])
+        self._lock = threading.Lock()
+
+    def pick_failure(self):
+        """Decide si la respuesta actual falla y cómo."""
+        if not self.config['fail_rate']:
+            return None
+        with self._lock:
+            if self._random.random() >= self.config['fail_rate']:
+                return None
+            return self._random.choice(FAIL_MODES)
+
+    def handle_error(self, request, client_address):
+        # Los clientes cortan conexiones a propósito (cancelaciones, segmentos robados)
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+
+def default_config(**overrides):
+    """
+    Configuración del servidor.
+
+    Args:
+        **overrides: video_mb, audio_mb, throttle (bytes/s por conexión), latency (s),
+            fail_rate (0-1), seed, video_file, audio_file, media_id, segment_kb (segmentos DASH)
+
+    Returns:
+        dict: Configuración completa
+    """
+    config = {'video_mb': 64, 'audio_mb': 8, 'throttle': None, 'latency': 0.0, 'fail_rate': 0.0, 'seed': 1,
+              'video_file': None, 'audio_file': None, 'media_id': MEDIA_ID, 'segment_kb': 1024}
+    config.update(overrides)
+    return config
+
+
+def load_media(config):
+    """Prepara en memoria las pistas que sirve el CDN falso."""
+    paths = media_paths(config['media_id'])
+
+    def track(path, megabytes, kind):
+        if path:
+            with open(path, 'rb') as f:
+                return f.read()
+        return synthetic_mp4(int(megabytes * 1024 * 1024), kind=kind)
+
+    media = {
+        paths['video']: track(config['video_file'], config['video_mb'], 'video'),
+        paths['audio']: track(config['audio_file'], config['audio_mb'], 'audio'),
+        paths['subtitle']: SUBTITLE.encode('utf-8'),
+    }
+    sizes = {kind: len(media[paths[kind]]) for kind in ('video', 'audio')}
+    media[paths['manifest']] = dash_manifest(paths, sizes, int(config['segment_kb'] * 1024)).encode('utf-8')
+    return media
+
+
+def _serve(config, port_queue, port=0):
+    server = FakePictaServer(('127.0.0.1', port), config)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def start_in_process(config):
+    """
+    Arranca el servidor en otro proceso (así no consume la CPU ni la memoria medidas).
+
+    Args:
+        config (dict): Configuración (default_config())
+
+    Returns:
+        tuple: (proceso, URL base); el proceso se detiene con terminate()
+    """
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(config, port_queue), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{port_queue.get()}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--video-mb', type=float, default=64)
+    parser.add_argument('--audio-mb', type=float, default=8)
+    parser.add_argument('--video-file', default=None, help="servir este archivo como pista de video")
+    parser.add_argument('--audio-file', default=None, help="servir este archivo como pista de audio")
+    parser.add_argument('--throttle', type=parse_rate, default=None, help="velocidad por conexión (por ejemplo 20M)")
+    parser.add_argument('--latency', type=float, default=0.0, help="segundos antes de cada respuesta")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="fracción de respuestas de medios que fallan")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    config = default_config(video_mb=args.video_mb, audio_mb=args.audio_mb, throttle=args.throttle,
+                            latency=args.latency, fail_rate=args.fail_rate, seed=args.seed,
+                            video_file=args.video_file, audio_file=args.audio_file)
+    server = FakePictaServer(('127.0.0.1', args.port), config)
+    print(f"Picta falso en http://127.0.0.1:{server.server_port}/embed/{MEDIA_ID}")
+    for name, path in media_paths().items():
+        print(f"  {name:<9} http://127.0.0.1:{server.server_port}{path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+from tracing import get_tracer
+
+# Valores por defecto del pool de navegadores
+DEFAULT_MAX_SIZE = 2           # Navegadores abiertos como máximo a la vez
+DEFAULT_MAX_USES = 20          # Trabajos por navegador antes de reciclarlo
+DEFAULT_IDLE_TIMEOUT = 120     # Segundos sin uso antes de cerrar un navegador
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def chromedriver_path():
+    """
+    Resuelve la ruta del binario de ChromeDriver una sola vez por proceso.
+    ChromeDriverManager().install() consulta versiones y el disco, así que
+    el resultado se guarda para los siguientes navegadores.
+
+    Returns:
+        str: Ruta del ejecutable de ChromeDriver
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+def launch_chrome():
+    """
+    Lanza un Chrome sin cabeza preparado para capturar las solicitudes de red.
+    No depende de ningún descargador, así que sirve de fábrica del pool
+    compartido por todo el proceso.
+
+    Returns:
+        WebDriver: Instancia configurada del navegador Chrome
+    """
+    # Selenium solo se importa si hace falta el navegador (arranque más rápido)
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")  # Ejecutar en modo sin cabeza (sin interfaz gráfica)
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--autoplay-policy=no-user-gesture-required")  # Permitir play() sin interacción
+    chrome_options.add_argument("--mute-audio")
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")  # Sin imágenes: solo interesan las URLs
+    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+
+    # Habilitar registro de red (crucial para capturar las URLs de los archivos)
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    # Configurar el driver de Chrome (la ruta se resuelve una vez por proceso)
+    with get_tracer().span("browser.launch"):
+        service = Service(chromedriver_path())
+        return webdriver.Chrome(service=service, options=chrome_options)
+
+
+class _PooledDriver:
+    """Navegador del pool junto con sus datos de uso."""
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.last_used = time.monotonic()
+        self.base_handle = driver.current_window_handle
+
+
+class BrowserPool:
+    """
+    Pool acotado de navegadores Chrome ya lanzados y compartidos entre análisis.
+    Cada trabajo recibe una pestaña nueva con el registro de rendimiento vacío;
+    los navegadores se reciclan tras max_uses trabajos y se cierran si pasan
+    idle_timeout segundos sin uso.
+    """
+    def __init__(self, factory, max_size=DEFAULT_MAX_SIZE, max_uses=DEFAULT_MAX_USES,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        """
+        Inicializa el pool (los navegadores se lanzan bajo demanda o con prelaunch()).
+
+        Args:
+            factory (callable): Función sin argumentos que devuelve un WebDriver nuevo
+            max_size (int, opcional): Número máximo de navegadores abiertos
+            max_uses (int, opcional): Trabajos por navegador antes de reciclarlo
+            idle_timeout (float, opcional): Segundos sin uso antes de cerrar un navegador
+        """
+        self.factory = factory
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+
+        self._condition = threading.Condition()
+        self._idle = []
+        self._in_use = 0
+        self._launching = 0
+        self._prelaunching = 0
+        self._closed = False
+        self._stats = {
+            'launches': 0,
+            'recycled': 0,
+            'reaped': 0,
+            'acquisitions': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+        # Hilo que cierra los navegadores ociosos
+        self._reaper = threading.Thread(target=self._reap_idle, daemon=True)
+        self._reaper.start()
+
+    def prelaunch(self, count=1, background=False):
+        """
+        Lanza navegadores por adelantado hasta tener count libres (ociosos o
+        arrancando), para que el siguiente análisis no espere al arranque de Chrome.
+        Quien pida un navegador mientras tanto espera al que ya se está lanzando.
+
+        Args:
+            count (int, opcional): Navegadores libres que se quieren tener
+            background (bool, opcional): Lanzarlos en un hilo aparte y volver enseguida
+        """
+        if background:
+            threading.Thread(target=self._prelaunch_quietly, args=(count,), daemon=True).start()
+            return
+        while True:
+            with self._condition:
+                if (self._closed or len(self._idle) + self._prelaunching >= count
+                        or len(self._idle) + self._in_use + self._launching >= self.max_size):
+                    return
+                self._launching += 1
+                self._prelaunching += 1
+            pooled = None
+            try:
+                pooled = self._launch()
+            finally:
+                with self._condition:
+                    self._launching -= 1
+                    self._prelaunching -= 1
+                    if pooled is not None:
+                        self._idle.append(pooled)
+                    self._condition.notify()
+
+    def _prelaunch_quietly(self, count):
+        """prelaunch() para un hilo aparte: un fallo solo se anota (el préstamo lo repetirá)."""
+        try:
+            self.prelaunch(count)
+        except Exception as e:
+            print(f"No se pudo lanzar el navegador por adelantado: {e}")
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """
+        Presta un navegador con una pestaña nueva para un trabajo.
+
+        Args:
+            timeout (float, opcional): Segundos máximos de espera por un navegador libre
+
+        Yields:
+            WebDriver: Navegador situado en una pestaña aislada para el trabajo
+        """
+        pooled = self._acquire(timeout)
+        broken = False
+        try:
+            self._open_job_tab(pooled)
+            yield pooled.driver
+        except Exception:
+            broken = not self._is_alive(pooled)
+            raise
+        finally:
+            self._release(pooled, broken)
+
+    def metrics(self):
+        """
+        Devuelve las métricas del pool.
+
+        Returns:
+            dict: Lanzamientos, reciclajes, cierres por inactividad, préstamos,
+            tiempo de espera total/máximo/medio y navegadores ociosos/en uso/arrancando
+        """
+        with self._condition:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._in_use
+            stats['launching'] = self._launching
+        acquisitions = stats['acquisitions']
+        stats['wait_time_avg'] = stats['wait_time_total'] / acquisitions if acquisitions else 0.0
+        return stats
+
+    def shutdown(self):
+        """Cierra todos los navegadores ociosos y rechaza nuevos préstamos."""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for pooled in idle:
+            self._quit(pooled)
+
+    def _launch(self):
+        """Lanza un navegador nuevo y lo contabiliza."""
+        pooled = _PooledDriver(self.factory())
+        with self._condition:
+            self._stats['launches'] += 1
+        return pooled
+
+    def _acquire(self, timeout):
+        """Obtiene un navegador ocioso o lanza uno nuevo si hay hueco en el pool."""
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("El pool de navegadores está cerrado")
+                if self._idle:
+                    pooled = self._idle.pop()
+                    self._in_use += 1
+                    break
+                # Si hay uno lanzándose por adelantado, esperarlo en vez de lanzar otro
+                if not self._prelaunching and self._in_use + self._launching < self.max_size:
+                    self._launching += 1
+                    pooled = None
+                    break
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No hay navegadores libres en el pool")
+                self._condition.wait(remaining)
+
+        launched = pooled is None
+        if launched:
+            try:
+                pooled = self._launch()
+            finally:
+                with self._condition:
+                    self._launching -= 1
+                    self._condition.notify()
+            with self._condition:
+                self._in_use += 1
+
+        waited = time.monotonic() - start
+        with self._condition:
+            self._stats['acquisitions'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        get_tracer().event("browser.acquire", waited=round(waited, 6), launched=launched)
+        return pooled
+
+    def _release(self, pooled, broken):
+        """Devuelve un navegador al pool, o lo cierra si está roto o agotado."""
+        pooled.uses += 1
+        pooled.last_used = time.monotonic()
+
+        if not broken:
+            broken = not self._close_job_tab(pooled)
+
+        recycle = broken or pooled.uses >= self.max_uses
+        with self._condition:
+            self._in_use -= 1
+            if recycle or self._closed:
+                if recycle:
+                    self._stats['recycled'] += 1
+            else:
+                self._idle.append(pooled)
+                pooled = None
+            self._condition.notify()
+        if pooled is not None:
+            self._quit(pooled)
+
+    def _open_job_tab(self, pooled):
+        """Abre una pestaña limpia para el trabajo y vacía el registro de rendimiento."""
+        pooled.driver.switch_to.new_window('tab')
+        # Leer el registro lo vacía: el trabajo solo verá sus propias solicitudes
+        pooled.driver.get_log('performance')
+
+    def _close_job_tab(self, pooled):
+        """
+        Cierra la pestaña del trabajo y limpia el estado compartido del navegador.
+
+        Returns:
+            bool: True si el navegador quedó en buen estado
+        """
+        driver = pooled.driver
+        try:
+            for handle in driver.window_handles:
+                if handle != pooled.base_handle:
+                    driver.switch_to.window(handle)
+                    driver.close()
+            driver.switch_to.window(pooled.base_handle)
+            driver.delete_all_cookies()
+            driver.get_log('performance')
+            return True
+        except Exception as e:
+            print(f"Error al limpiar el navegador del pool: {e}")
+            return False
+
+    def _is_alive(self, pooled):
+        """Comprueba si el navegador sigue respondiendo."""
+        try:
+            pooled.driver.current_window_handle
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, pooled):
+        """Cierra un navegador ignorando errores."""
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            print(f"Error al cerrar el navegador: {e}")
+
+    def _reap_idle(self):
+        """Cierra periódicamente los navegadores que llevan demasiado tiempo sin uso."""
+        interval = max(1.0, self.idle_timeout / 2)
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            with self._condition:
+                if self._closed:
+                    return
+                expired = [p for p in self._idle if now - p.last_used >= self.idle_timeout]
+                self._idle = [p for p in self._idle if p not in expired]
+                self._stats['reaped'] += len(expired)
+            for pooled in expired:
+                self._quit(pooled)
+
+
+def shared_pool_metrics():
+    """
+    Devuelve las métricas del pool compartido sin crearlo.
+
+    Returns:
+        dict: BrowserPool.metrics(), o None si el proceso no ha usado el navegador
+    """
+    with _shared_pool_lock:
+        pool = _shared_pool
+    return pool.metrics() if pool is not None else None
+
+
+def get_shared_pool(**kwargs):
+    """
+    Devuelve el pool de navegadores compartido por todo el proceso, creándolo si no existe.
+    Sus navegadores se lanzan con launch_chrome(), igual para todos los descargadores.
+    El pool se cierra automáticamente al salir de la aplicación.
+
+    Args:
+        **kwargs: Opciones de BrowserPool (solo se usan al crear el pool)
+
+    Returns:
+        BrowserPool: Pool compartido
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = BrowserPool(launch_chrome, **kwargs)
+            atexit.register(_shared_pool.shutdown)
+        return _shared_pool
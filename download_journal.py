@@ -0,0 +1,266 @@
+import os
+import json
+import threading
+
+JOURNAL_SUFFIX = '.journal'
+SEGMENTS_SUFFIX = '.segments'
+
+
+class DownloadJournal:
+    """
+    Diario de una descarga por rangos guardado junto al archivo temporal.
+    Registra qué rangos de bytes ya están escritos en disco y el ETag y
+    Last-Modified del recurso, para poder reanudar solo las partes que
+    faltan incluso después de reiniciar la aplicación.
+    """
+    def __init__(self, output_path, size, etag=None, last_modified=None, completed=None):
+        """
+        Inicializa el diario.
+
+        Args:
+            output_path (str): Ruta del archivo que se está descargando
+            size (int): Tamaño total del recurso en bytes
+            etag (str, opcional): ETag del recurso
+            last_modified (str, opcional): Last-Modified del recurso
+            completed (list, opcional): Rangos [inicio, fin) ya escritos
+        """
+        self.output_path = output_path
+        self.path = output_path + JOURNAL_SUFFIX
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.completed = []
+        self._lock = threading.Lock()
+        for start, end in completed or []:
+            self._merge(start, end)
+
+    @classmethod
+    def load(cls, output_path):
+        """
+        Carga el diario de un archivo, si existe y el archivo sigue en disco.
+
+        Args:
+            output_path (str): Ruta del archivo que se está descargando
+
+        Returns:
+            DownloadJournal: Diario cargado, o None si no hay nada que reanudar
+        """
+        journal_path = output_path + JOURNAL_SUFFIX
+        if not os.path.exists(journal_path) or not os.path.exists(output_path):
+            return None
+        try:
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            journal = cls(output_path, data['size'], data.get('etag'),
+                          data.get('last_modified'), data.get('completed'))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Diario de descarga ilegible, se descarta: {e}")
+            return None
+        if os.path.getsize(output_path) != journal.size:
+            return None
+        return journal
+
+    @staticmethod
+    def discard(output_path):
+        """
+        Elimina un archivo descargado junto con su diario.
+
+        Args:
+            output_path (str): Ruta del archivo descargado
+        """
+        for path in (output_path, output_path + JOURNAL_SUFFIX):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def matches(self, info):
+        """
+        Comprueba que el recurso remoto no cambió desde que empezó la descarga.
+
+        Args:
+            info (dict): Resultado de probe_resource (size, etag, last_modified)
+
+        Returns:
+            bool: True si es seguro reanudar con los datos ya descargados
+        """
+        if info.get('size') != self.size:
+            return False
+        if self.etag and info.get('etag'):
+            return self.etag == info['etag']
+        if self.last_modified and info.get('last_modified'):
+            return self.last_modified == info['last_modified']
+        # Sin validadores solo se puede confiar en el tamaño
+        return True
+
+    @property
+    def validator(self):
+        """str: Valor para la cabecera If-Range (ETag o Last-Modified), o None."""
+        # Los ETag débiles no son válidos en If-Range
+        if self.etag and not self.etag.startswith('W/'):
+            return self.etag
+        return self.last_modified
+
+    @property
+    def completed_bytes(self):
+        """int: Bytes ya escritos en disco."""
+        with self._lock:
+            return sum(end - start for start, end in self.completed)
+
+    @property
+    def is_complete(self):
+        """bool: True si el archivo está completo."""
+        return self.completed_bytes >= self.size
+
+    def missing_ranges(self):
+        """
+        Calcula los rangos que faltan por descargar.
+
+        Returns:
+            list: Tuplas (inicio, fin) con el fin inclusivo, como en la cabecera Range
+        """
+        missing = []
+        position = 0
+        with self._lock:
+            for start, end in self.completed:
+                if start > position:
+                    missing.append((position, start - 1))
+                position = max(position, end)
+        if position < self.size:
+            missing.append((position, self.size - 1))
+        return missing
+
+    def mark(self, start, end):
+        """
+        Registra un rango [inicio, fin) como escrito en disco.
+
+        Args:
+            start (int): Primer byte del rango
+            end (int): Byte siguiente al último del rango
+        """
+        with self._lock:
+            self._merge(start, end)
+
+    def save(self):
+        """Guarda el diario en disco de forma atómica."""
+        with self._lock:
+            data = {
+                'size': self.size,
+                'etag': self.etag,
+                'last_modified': self.last_modified,
+                'completed': [list(r) for r in self.completed],
+            }
+            temp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+
+    def _merge(self, start, end):
+        """Inserta un rango y fusiona los que se solapan o son contiguos."""
+        if end <= start:
+            return
+        merged = []
+        for current_start, current_end in sorted(self.completed + [[start, end]]):
+            if merged and current_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], current_end)
+            else:
+                merged.append([current_start, current_end])
+        self.completed = merged
+
+
+class SegmentJournal:
+    """
+    Diario de una descarga por segmentos (DASH o HLS) guardado junto al archivo.
+    Los segmentos se escriben en orden, así que basta con anotar cuántos hay
+    ya en disco y hasta qué byte llegan. Una huella de la lista de segmentos
+    evita continuar con los de otra representación.
+    """
+    def __init__(self, output_path, fingerprint, segments, written=0, size=0):
+        """
+        Inicializa el diario.
+
+        Args:
+            output_path (str): Ruta del archivo que se está descargando
+            fingerprint (str): Huella de la lista de segmentos
+            segments (int): Número total de segmentos
+            written (int, opcional): Segmentos ya escritos
+            size (int, opcional): Bytes que ocupan los segmentos escritos
+        """
+        self.output_path = output_path
+        self.path = output_path + SEGMENTS_SUFFIX
+        self.fingerprint = fingerprint
+        self.segments = segments
+        self.written = written
+        self.size = size
+
+    @classmethod
+    def load(cls, output_path):
+        """
+        Carga el diario de un archivo, si existe y el archivo sigue en disco.
+
+        Args:
+            output_path (str): Ruta del archivo que se está descargando
+
+        Returns:
+            SegmentJournal: Diario cargado, o None si no hay nada que reanudar
+        """
+        journal_path = output_path + SEGMENTS_SUFFIX
+        if not os.path.exists(journal_path) or not os.path.exists(output_path):
+            return None
+        try:
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            journal = cls(output_path, data['fingerprint'], data['segments'], data['written'], data['size'])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Diario de segmentos ilegible, se descarta: {e}")
+            return None
+        # Lo que pase de journal.size se descarta al reanudar; si falta algo, no sirve
+        if os.path.getsize(output_path) < journal.size:
+            return None
+        return journal
+
+    @staticmethod
+    def discard(output_path):
+        """
+        Elimina el diario de un archivo (el archivo se conserva).
+
+        Args:
+            output_path (str): Ruta del archivo descargado
+        """
+        try:
+            os.remove(output_path + SEGMENTS_SUFFIX)
+        except OSError:
+            pass
+
+    @property
+    def completed_bytes(self):
+        """int: Bytes ya escritos en disco."""
+        return self.size
+
+    @property
+    def is_complete(self):
+        """bool: True si están todos los segmentos."""
+        return self.written >= self.segments
+
+    def advance(self, count):
+        """
+        Registra un segmento más escrito a continuación de los anteriores.
+
+        Args:
+            count (int): Bytes del segmento
+        """
+        self.written += 1
+        self.size += count
+
+    def save(self):
+        """Guarda el diario en disco de forma atómica."""
+        data = {
+            'fingerprint': self.fingerprint,
+            'segments': self.segments,
+            'written': self.written,
+            'size': self.size,
+        }
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.path)
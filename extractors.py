@@ -0,0 +1,521 @@
+import re
+import json
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin, urlsplit, quote
+
+from media_manifest import media_slug, language_name
+from tracing import get_tracer
+
+HTTP_TIMEOUT = 10  # Segundos por petición HTTP durante la extracción
+
+# Tipos de las fuentes servidas por segmentos (se descargan con adaptive_download)
+DASH_MIME_TYPE = "application/dash+xml"
+HLS_MIME_TYPE = "application/vnd.apple.mpegurl"
+
+# Manifiestos DASH o HLS referenciados en el HTML de una página
+MANIFEST_URL = re.compile(r'https?://[^"\'\s<>]+?\.(?:mpd|m3u8)\b[^"\'\s<>]*')
+HLS_ATTRIBUTE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+ISO_DURATION = re.compile(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:([\d.]+)S)?)?$')
+
+
+class Extractor:
+    """
+    Interfaz común de los motores de extracción.
+    Cada motor recibe la URL /embed/ de un video y devuelve el mismo
+    diccionario video_info (title, video_sources, audio_tracks, subtitles).
+    """
+    name = "base"
+
+    def extract(self, url):
+        """
+        Extrae la información del video.
+
+        Args:
+            url (str): URL del video de Picta en formato /embed/
+
+        Returns:
+            dict: Información del video, o None si este motor no pudo obtenerla
+        """
+        raise NotImplementedError
+
+    def prepare(self):
+        """
+        Aviso de que un motor anterior no encontró el video y puede que este
+        se necesite; los motores con un arranque lento lo adelantan aquí.
+        """
+
+
+class ApiExtractor(Extractor):
+    """
+    Motor sin navegador que consulta la API JSON pública de Picta.
+    Obtiene la publicación por su slug y resuelve el manifiesto DASH
+    (o HLS) para conocer las fuentes de video y audio.
+    """
+    name = "api"
+    API_BASE_URL = "https://api.picta.cu/v2/"
+
+    def __init__(self, session, headers=None, api_base_url=None):
+        """
+        Inicializa el motor.
+
+        Args:
+            session (requests.Session): Sesión HTTP compartida
+            headers (dict, opcional): Cabeceras HTTP para las peticiones
+            api_base_url (str, opcional): URL base de la API (útil para pruebas)
+        """
+        self.session = session
+        self.headers = headers or {}
+        self.api_base_url = api_base_url or self.API_BASE_URL
+
+    def extract(self, url):
+        slug = media_slug(url)
+        if not slug:
+            return None
+
+        response = self.session.get(
+            urljoin(self.api_base_url, "publicacion/"),
+            params={'slug_url': slug, 'format': 'json'},
+            headers=self.headers,
+            timeout=HTTP_TIMEOUT,
+        )
+        response.raise_for_status()
+        results = response.json().get('results') or []
+        if not results:
+            return None
+        publication = results[0]
+
+        video_sources = []
+        audio_tracks = []
+        manifest_url = publication.get('url_manifiesto')
+        if manifest_url:
+            video_sources, audio_tracks = fetch_manifest_sources(self.session, manifest_url, self.headers)
+
+        subtitles = []
+        if publication.get('url_subtitulo'):
+            subtitles.append({
+                'url': publication['url_subtitulo'],
+                'language': language_name(publication.get('idioma_subtitulo') or 'es'),
+            })
+
+        return {
+            'title': (publication.get('nombre') or "Video de Picta").strip(),
+            'video_sources': video_sources,
+            'audio_tracks': audio_tracks,
+            'subtitles': subtitles,
+        }
+
+
+class EmbedPageExtractor(Extractor):
+    """
+    Motor sin navegador que analiza el HTML de la página /embed/.
+    Busca elementos <video>, <source> y <track>, y manifiestos DASH o HLS y
+    JSON incrustados en la página.
+    """
+    name = "embed"
+
+    def __init__(self, session, headers=None):
+        """
+        Inicializa el motor.
+
+        Args:
+            session (requests.Session): Sesión HTTP compartida
+            headers (dict, opcional): Cabeceras HTTP para las peticiones
+        """
+        self.session = session
+        self.headers = headers or {}
+
+    def extract(self, url):
+        from bs4 import BeautifulSoup
+
+        response = self.session.get(url, headers=self.headers, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        page_url = response.url or url
+        soup = BeautifulSoup(response.text, 'html.parser')
+
+        video_sources = []
+        audio_tracks = []
+        subtitles = []
+
+        # Fuentes declaradas directamente en el reproductor
+        for video in soup.find_all('video'):
+            candidates = [video.get('src')] + [source.get('src') for source in video.find_all('source')]
+            for src in filter(None, candidates):
+                src = urljoin(page_url, src)
+                if manifest_type(src):
+                    video_sources, audio_tracks = self._resolve_manifest(src, video_sources, audio_tracks)
+                else:
+                    video_sources.append({
+                        'url': src,
+                        'quality': quality_from_url(src),
+                        'type': 'video/mp4',
+                    })
+            for track in video.find_all('track'):
+                if track.get('src'):
+                    subtitles.append({
+                        'url': urljoin(page_url, track['src']),
+                        'language': track.get('label') or language_name(track.get('srclang')),
+                    })
+
+        # Manifiestos DASH o HLS referenciados en scripts o atributos de datos
+        if not video_sources:
+            for manifest_url in set(MANIFEST_URL.findall(response.text)):
+                video_sources, audio_tracks = self._resolve_manifest(manifest_url, video_sources, audio_tracks)
+
+        # Subtítulos referenciados en el JSON de la página
+        if not subtitles:
+            for match in re.finditer(r'"url_subtitulo"\s*:\s*("(?:[^"\\]|\\.)*")', response.text):
+                subtitle_url = json.loads(match.group(1))
+                if subtitle_url:
+                    subtitles.append({'url': subtitle_url, 'language': language_name('es')})
+
+        return {
+            'title': page_title(soup),
+            'video_sources': video_sources,
+            'audio_tracks': audio_tracks,
+            'subtitles': subtitles,
+        }
+
+    def _resolve_manifest(self, manifest_url, video_sources, audio_tracks):
+        """Descarga un manifiesto DASH o HLS y añade sus fuentes a las listas existentes."""
+        videos, audios = fetch_manifest_sources(self.session, manifest_url, self.headers)
+        return video_sources + videos, audio_tracks + audios
+
+
+class SeleniumExtractor(Extractor):
+    """
+    Motor de respaldo basado en Chrome sin cabeza.
+    Captura las URLs multimedia del registro de rendimiento del navegador.
+    Si se le da un pool, reutiliza navegadores ya lanzados en vez de abrir uno nuevo.
+    """
+    name = "selenium"
+
+    def __init__(self, downloader, pool=None):
+        """
+        Inicializa el motor.
+
+        Args:
+            downloader (PictaDownloader): Descargador que sabe abrir el navegador
+                y analizar sus solicitudes de red
+            pool (BrowserPool, opcional): Pool de navegadores compartido
+        """
+        self.downloader = downloader
+        self.pool = pool
+
+    def prepare(self):
+        # Lanzar Chrome mientras los motores HTTP que quedan siguen probando
+        if self.pool is not None:
+            self.pool.prelaunch(background=True)
+
+    def extract(self, url):
+        if self.pool is not None:
+            with self.pool.driver() as driver:
+                return self.downloader.extract_network_requests(driver, url)
+
+        driver = self.downloader.setup_browser()
+        try:
+            return self.downloader.extract_network_requests(driver, url)
+        finally:
+            # Cerrar el navegador
+            driver.quit()
+
+
+def run_extractors(extractors, url, status_callback=None):
+    """
+    Prueba los motores de extracción en orden y devuelve el primer resultado con video.
+
+    Args:
+        extractors (list): Motores (Extractor) en orden de preferencia
+        url (str): URL del video de Picta en formato /embed/
+        status_callback (callable, opcional): Función que recibe mensajes de estado
+
+    Returns:
+        dict: Información del video, o None si ningún motor encontró fuentes de video
+    """
+    status = status_callback or (lambda message: None)
+    tracer = get_tracer()
+    for index, extractor in enumerate(extractors):
+        status(f"Obteniendo información del video ({extractor.name})...")
+        with tracer.span(f"extract.{extractor.name}") as span:
+            try:
+                video_info = extractor.extract(url)
+                found = bool(video_info and video_info['video_sources'])
+                span.set(found=found)
+            except Exception as e:
+                span.error = type(e).__name__
+                print(f"Error en el extractor {extractor.name}: {e}")
+                found = False
+        if found:
+            return video_info
+        # Los motores que quedan pueden ir preparándose (el navegador tarda en arrancar)
+        for remaining in extractors[index + 1:]:
+            remaining.prepare()
+    return None
+
+
+def page_title(soup):
+    """
+    Obtiene el título del video de una página HTML ya analizada.
+
+    Args:
+        soup (BeautifulSoup): Página analizada
+
+    Returns:
+        str: Título del video
+    """
+    for selector in ("h1.title", "h1"):
+        element = soup.select_one(selector)
+        if element and element.get_text(strip=True):
+            return element.get_text(strip=True)
+    meta = soup.find('meta', property='og:title')
+    if meta and meta.get('content'):
+        return meta['content'].strip()
+    if soup.title and soup.title.string:
+        return soup.title.string.strip()
+    return "Video de Picta"
+
+
+def quality_from_url(url):
+    """
+    Deduce la calidad de un video a partir de su URL.
+
+    Args:
+        url (str): URL del archivo de video
+
+    Returns:
+        str: Calidad (por ejemplo "720p"), o "Unknown" si no aparece en la URL
+    """
+    match = re.search(r'(\d{3,4})p', url)
+    return f"{match.group(1)}p" if match else "Unknown"
+
+
+def _local(tag):
+    """Nombre de una etiqueta XML sin el espacio de nombres."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _child(element, name):
+    """Primer hijo directo con el nombre indicado (sin espacio de nombres)."""
+    for child in element:
+        if _local(child.tag) == name:
+            return child
+    return None
+
+
+def _base_url(element, base):
+    """Resuelve el <BaseURL> de un elemento respecto a la base heredada."""
+    base_element = _child(element, 'BaseURL')
+    if base_element is not None and base_element.text:
+        return urljoin(base, base_element.text.strip())
+    return base
+
+
+def manifest_type(url):
+    """
+    Indica si una URL es un manifiesto de transmisión adaptativa.
+
+    Args:
+        url (str): URL de una fuente (las representaciones DASH llevan su id como fragmento)
+
+    Returns:
+        str: DASH_MIME_TYPE, HLS_MIME_TYPE o None si es un archivo normal
+    """
+    path = urlsplit(url).path.lower()
+    if path.endswith('.mpd'):
+        return DASH_MIME_TYPE
+    if path.endswith('.m3u8'):
+        return HLS_MIME_TYPE
+    return None
+
+
+def representation_url(mpd_url, representation_id):
+    """
+    URL de una representación DASH servida por segmentos: la del manifiesto con
+    el id de la representación como fragmento (que no se envía al servidor).
+
+    Args:
+        mpd_url (str): URL del manifiesto
+        representation_id (str): Atributo id de la representación
+
+    Returns:
+        str: URL de la fuente
+    """
+    return f"{mpd_url.split('#', 1)[0]}#{quote(representation_id, safe='')}"
+
+
+def parse_iso_duration(text):
+    """
+    Convierte una duración ISO 8601 de un manifiesto ("PT1H2M3.5S") a segundos.
+
+    Args:
+        text (str): Duración, o None
+
+    Returns:
+        float: Segundos, o None si no se indicó o no se reconoce
+    """
+    match = ISO_DURATION.match((text or '').strip())
+    if not text or not match:
+        return None
+    days, hours, minutes, seconds = (float(value or 0) for value in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def hls_attributes(line):
+    """
+    Lee la lista de atributos de una etiqueta HLS (#EXT-X-...:CLAVE=valor,...).
+
+    Args:
+        line (str): Línea completa de la etiqueta
+
+    Returns:
+        dict: Atributos, con las comillas de los valores ya quitadas
+    """
+    attributes = line.split(':', 1)[1] if ':' in line else ''
+    return {key: value.strip('"') for key, value in HLS_ATTRIBUTE.findall(attributes)}
+
+
+def fetch_manifest_sources(session, manifest_url, headers=None):
+    """
+    Descarga un manifiesto DASH o HLS y obtiene sus fuentes.
+
+    Args:
+        session (requests.Session): Sesión HTTP compartida
+        manifest_url (str): URL del manifiesto
+        headers (dict, opcional): Cabeceras HTTP
+
+    Returns:
+        tuple: (video_sources, audio_tracks) en el formato de video_info
+    """
+    response = session.get(manifest_url, headers=headers or {}, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    final_url = response.url or manifest_url
+    if manifest_type(final_url) == HLS_MIME_TYPE or response.text.lstrip().startswith('#EXTM3U'):
+        return parse_hls_sources(response.text, final_url)
+    return parse_mpd_sources(response.text, final_url)
+
+
+def _is_segmented(*elements):
+    """True si alguno de los elementos define sus segmentos (plantilla o lista)."""
+    return any(_child(element, name) is not None
+               for element in elements for name in ('SegmentTemplate', 'SegmentList'))
+
+
+def parse_mpd_sources(mpd_text, mpd_url):
+    """
+    Obtiene las fuentes de video y audio de un manifiesto DASH.
+    Las representaciones servidas como un único archivo (con <BaseURL> propio)
+    se descargan directamente; las servidas por segmentos (SegmentTemplate o
+    SegmentList) llevan como URL la del manifiesto con su id de fragmento y su
+    tasa de bits y tamaño estimado, porque no se pueden sondear.
+
+    Args:
+        mpd_text (str): Contenido XML del manifiesto
+        mpd_url (str): URL del manifiesto (para resolver rutas relativas)
+
+    Returns:
+        tuple: (video_sources, audio_tracks) en el formato de video_info
+    """
+    root = ET.fromstring(mpd_text)
+    base = _base_url(root, mpd_url)
+    duration = parse_iso_duration(root.get('mediaPresentationDuration'))
+
+    video_sources = []
+    audio_tracks = []
+    for period in root:
+        if _local(period.tag) != 'Period':
+            continue
+        period_base = _base_url(period, base)
+        for adaptation in period:
+            if _local(adaptation.tag) != 'AdaptationSet':
+                continue
+            adaptation_base = _base_url(adaptation, period_base)
+            for representation in adaptation:
+                if _local(representation.tag) != 'Representation':
+                    continue
+                mime_type = representation.get('mimeType') or adaptation.get('mimeType') or ''
+                content_type = adaptation.get('contentType') or mime_type.split('/')[0]
+                bandwidth = int(representation.get('bandwidth') or 0)
+
+                properties = {}
+                if _is_segmented(representation, adaptation, period) and representation.get('id'):
+                    url = representation_url(mpd_url, representation.get('id'))
+                    mime_type = DASH_MIME_TYPE
+                    if bandwidth:
+                        properties['bitrate'] = bandwidth
+                    if duration:
+                        properties['duration'] = duration
+                    if bandwidth and duration:
+                        properties['size'] = int(bandwidth * duration / 8)
+                elif _child(representation, 'BaseURL') is not None:
+                    url = _base_url(representation, adaptation_base)
+                else:
+                    continue
+
+                if content_type == 'video':
+                    height = representation.get('height') or adaptation.get('height')
+                    video_sources.append(dict({
+                        'url': url,
+                        'quality': f"{height}p" if height else quality_from_url(url),
+                        'type': mime_type or 'video/mp4',
+                    }, **properties))
+                elif content_type == 'audio':
+                    language = language_name(representation.get('lang') or adaptation.get('lang'))
+                    bitrate = f"{round(bandwidth / 1000)}k" if bandwidth else "Unknown"
+                    audio_tracks.append(dict({
+                        'url': url,
+                        'language': f"{language} ({bitrate})",
+                    }, **properties))
+    return video_sources, audio_tracks
+
+
+def parse_hls_sources(playlist_text, playlist_url):
+    """
+    Obtiene las fuentes de video y audio de una lista de reproducción HLS.
+    En una lista maestra cada variante (#EXT-X-STREAM-INF) es una fuente de
+    video y cada audio alternativo (#EXT-X-MEDIA) una pista de audio; una lista
+    de segmentos es en sí misma la única fuente. Los subtítulos HLS (WebVTT
+    troceado) no se ofrecen.
+
+    Args:
+        playlist_text (str): Contenido de la lista
+        playlist_url (str): URL de la lista (para resolver rutas relativas)
+
+    Returns:
+        tuple: (video_sources, audio_tracks) en el formato de video_info
+    """
+    lines = [line.strip() for line in playlist_text.splitlines() if line.strip()]
+    if not any(line.startswith('#EXT-X-STREAM-INF') for line in lines):
+        return [{'url': playlist_url, 'quality': quality_from_url(playlist_url), 'type': HLS_MIME_TYPE}], []
+
+    video_sources = []
+    audio_tracks = []
+    seen = set()
+    for index, line in enumerate(lines):
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            attributes = hls_attributes(line)
+            uri = next((candidate for candidate in lines[index + 1:] if not candidate.startswith('#')), None)
+            if not uri:
+                continue
+            url = urljoin(playlist_url, uri)
+            if url in seen:
+                continue
+            seen.add(url)
+            resolution = re.match(r'\d+x(\d+)$', attributes.get('RESOLUTION', ''))
+            source = {
+                'url': url,
+                'quality': f"{resolution.group(1)}p" if resolution else quality_from_url(url),
+                'type': HLS_MIME_TYPE,
+            }
+            if attributes.get('BANDWIDTH', '').isdigit():
+                source['bitrate'] = int(attributes['BANDWIDTH'])
+            video_sources.append(source)
+        elif line.startswith('#EXT-X-MEDIA:'):
+            attributes = hls_attributes(line)
+            if attributes.get('TYPE') != 'AUDIO' or not attributes.get('URI'):
+                continue
+            url = urljoin(playlist_url, attributes['URI'])
+            if url in seen:
+                continue
+            seen.add(url)
+            language = language_name(attributes.get('LANGUAGE') or attributes.get('NAME'))
+            audio_tracks.append({'url': url, 'language': f"{language} (Unknown)"})
+    return video_sources, audio_tracks
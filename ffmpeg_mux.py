@@ -0,0 +1,373 @@
+import os
+import re
+import json
+import time
+import threading
+import subprocess
+from collections import deque
+
+from segmented_download import DownloadCancelled
+
+# Modos de combinación que se informan al usuario
+MUX_COPY = "copia"                 # Todos los flujos se copian sin recodificar
+MUX_TRANSCODE = "recodificación"   # Al menos un flujo de audio o video se recodifica
+
+# Códecs que el contenedor MP4 admite tal cual (se pueden copiar sin recodificar)
+MP4_VIDEO_CODECS = {'h264', 'hevc', 'av1', 'vp9', 'mpeg4'}
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'alac', 'ac3', 'eac3', 'opus', 'flac'}
+
+# Códecs de destino cuando hay que recodificar
+FALLBACK_VIDEO_CODEC = 'libx264'
+FALLBACK_AUDIO_CODEC = 'aac'
+SUBTITLE_CODEC = 'mov_text'        # Los subtítulos de texto siempre se convierten (es instantáneo)
+
+PROBE_TIMEOUT = 30                 # Segundos máximos para ffprobe
+MUX_IDLE_TIMEOUT = 120             # Segundos sin progreso antes de dar FFmpeg por colgado
+WAIT_INTERVAL = 0.2                # Segundos entre comprobaciones de cancelación y plazos
+LOG_LINES = 200                    # Últimas líneas de FFmpeg que se conservan para los errores
+
+DURATION_PATTERN = re.compile(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+
+
+class FFmpegError(RuntimeError):
+    """FFmpeg terminó con error."""
+    def __init__(self, message, log=""):
+        super().__init__(message)
+        self.log = log
+
+
+class FFmpegTimeout(FFmpegError):
+    """FFmpeg superó el plazo máximo o dejó de avanzar."""
+
+
+def probe_media(path):
+    """
+    Obtiene los flujos y el formato de un archivo con ffprobe.
+    Usa ffmpeg-python si está instalado y, si no, llama a ffprobe directamente.
+
+    Args:
+        path (str): Ruta del archivo
+
+    Returns:
+        dict: Salida JSON de ffprobe ('streams' y 'format'), o None si no se pudo analizar
+    """
+    try:
+        import ffmpeg
+        return ffmpeg.probe(path)
+    except ImportError:
+        pass
+    except Exception as e:
+        print(f"Error al analizar {path} con ffprobe: {e}")
+        return None
+
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_streams', '-show_format', path],
+            capture_output=True, text=True, timeout=PROBE_TIMEOUT, check=True,
+        )
+        return json.loads(result.stdout)
+    except (OSError, ValueError, subprocess.SubprocessError) as e:
+        print(f"Error al analizar {path} con ffprobe: {e}")
+        return None
+
+
+def stream_codec(probe, codec_type):
+    """
+    Devuelve el códec del primer flujo de un tipo.
+
+    Args:
+        probe (dict): Resultado de probe_media
+        codec_type (str): 'video', 'audio' o 'subtitle'
+
+    Returns:
+        str: Nombre del códec, o None si no hay flujos de ese tipo (o no se pudo analizar)
+    """
+    for stream in (probe or {}).get('streams', []):
+        if stream.get('codec_type') == codec_type:
+            return stream.get('codec_name')
+    return None
+
+
+def subtitle_list(subtitle_path):
+    """
+    Normaliza el argumento de subtítulos (una ruta, una lista de rutas o None).
+
+    Args:
+        subtitle_path (str o list): Archivo o archivos de subtítulos
+
+    Returns:
+        list: Rutas de los archivos de subtítulos
+    """
+    if not subtitle_path:
+        return []
+    return [subtitle_path] if isinstance(subtitle_path, str) else list(subtitle_path)
+
+
+def build_mux_command(output_file, video_path, audio_path=None, subtitle_path=None,
+                      probes=None, force_transcode=False, subtitle_languages=None):
+    """
+    Construye el comando de FFmpeg que combina las pistas en un MP4.
+    Cada flujo se copia si su códec es compatible con MP4 y solo se recodifica
+    cuando no lo es. Si un archivo no se pudo analizar se intenta copiar.
+
+    Args:
+        output_file (str): Ruta del archivo final
+        video_path (str): Archivo de video
+        audio_path (str, opcional): Archivo de audio separado
+        subtitle_path (str o list, opcional): Archivo de subtítulos, o lista de archivos
+        probes (dict, opcional): Resultados de probe_media por ruta
+        force_transcode (bool, opcional): Recodificar el audio aunque parezca compatible
+            (reintento cuando la copia falló)
+        subtitle_languages (list, opcional): Código ISO 639-2 de cada archivo de subtítulos
+
+    Returns:
+        tuple: (comando, modo) con modo MUX_COPY o MUX_TRANSCODE
+    """
+    probes = probes or {}
+    cmd = ['ffmpeg', '-hide_banner', '-nostdin', '-i', video_path]
+    maps = ['-map', '0:v:0']
+    if audio_path:
+        cmd.extend(['-i', audio_path])
+        maps.extend(['-map', '1:a:0'])
+        audio_source = audio_path
+    else:
+        # Si no hay audio separado, usar el del video (si lo tiene)
+        maps.extend(['-map', '0:a?'])
+        audio_source = video_path
+    subtitle_paths = subtitle_list(subtitle_path)
+    first_subtitle = 2 if audio_path else 1
+    for index, path in enumerate(subtitle_paths):
+        cmd.extend(['-i', path])
+        maps.extend(['-map', f"{first_subtitle + index}:s:0"])
+    cmd.extend(maps)
+
+    transcoded = False
+    video_codec = stream_codec(probes.get(video_path), 'video')
+    if video_codec and video_codec not in MP4_VIDEO_CODECS:
+        cmd.extend(['-c:v', FALLBACK_VIDEO_CODEC])
+        transcoded = True
+    else:
+        cmd.extend(['-c:v', 'copy'])
+
+    audio_codec = stream_codec(probes.get(audio_source), 'audio')
+    if force_transcode or (audio_codec and audio_codec not in MP4_AUDIO_CODECS):
+        cmd.extend(['-c:a', FALLBACK_AUDIO_CODEC])
+        transcoded = True
+    else:
+        cmd.extend(['-c:a', 'copy'])
+
+    if subtitle_paths:
+        cmd.extend(['-c:s', SUBTITLE_CODEC])
+        for index, language in enumerate(subtitle_languages or []):
+            if language and index < len(subtitle_paths):
+                cmd.extend([f'-metadata:s:s:{index}', f'language={language}'])
+
+    # Especificar archivo de salida y sobrescribir si existe
+    cmd.extend(['-y', output_file])
+    return cmd, MUX_TRANSCODE if transcoded else MUX_COPY
+
+
+class FFmpegRunner:
+    """
+    Ejecuta FFmpeg en segundo plano sin bloquear ni acumular toda su salida.
+    Lee el progreso de "-progress pipe:1" (out_time_us/out_time_ms) y lo
+    informa como (microsegundos procesados, duración total). De la salida de
+    errores solo se guardan las últimas líneas. Se puede cancelar en cualquier
+    momento y admite un plazo máximo total y otro sin avances.
+    """
+    def __init__(self, cmd, duration=None, progress_callback=None, cancel_event=None,
+                 timeout=None, idle_timeout=None, stdin=subprocess.DEVNULL, log_lines=LOG_LINES):
+        """
+        Inicializa el ejecutor.
+
+        Args:
+            cmd (list): Comando de FFmpeg (sin las opciones de progreso)
+            duration (float, opcional): Duración del resultado en segundos; si no se
+                indica se toma de la línea "Duration:" de FFmpeg
+            progress_callback (callable, opcional): Función (procesado, total) en microsegundos
+            cancel_event (threading.Event, opcional): Evento que detiene FFmpeg
+            timeout (float, opcional): Segundos máximos de ejecución
+            idle_timeout (float, opcional): Segundos máximos sin progreso
+            stdin (int, opcional): Entrada estándar de FFmpeg (subprocess.PIPE para alimentarla)
+            log_lines (int, opcional): Líneas de la salida de errores que se conservan
+        """
+        self.cmd = [cmd[0], '-progress', 'pipe:1', '-nostats'] + list(cmd[1:])
+        self.duration_us = int(duration * 1000000) if duration else 0
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.stdin = stdin
+        self.log_lines = deque(maxlen=log_lines)
+        self.process = None
+        self._cancelled = threading.Event()
+        self._threads = []
+        self._started_at = None
+        self._last_progress = None
+
+    @property
+    def log(self):
+        """str: Últimas líneas de la salida de errores de FFmpeg."""
+        return "\n".join(self.log_lines)
+
+    def start(self):
+        """
+        Lanza FFmpeg y los hilos que leen su salida.
+
+        Returns:
+            FFmpegRunner: El propio ejecutor (para encadenar start().wait())
+        """
+        print(f"Executing command: {' '.join(self.cmd)}")
+        self.process = subprocess.Popen(self.cmd, stdin=self.stdin, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE)
+        self._started_at = self._last_progress = time.monotonic()
+        for target, stream in ((self._read_progress, self.process.stdout),
+                               (self._read_log, self.process.stderr)):
+            thread = threading.Thread(target=target, args=(stream,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def cancel(self):
+        """Detiene FFmpeg; wait() lanzará DownloadCancelled."""
+        self._cancelled.set()
+        self._kill()
+
+    def wait(self):
+        """
+        Espera a que FFmpeg termine.
+
+        Raises:
+            DownloadCancelled: Si se canceló
+            FFmpegTimeout: Si se superó alguno de los plazos
+            FFmpegError: Si FFmpeg terminó con error
+        """
+        timed_out = None
+        while self.process.poll() is None:
+            now = time.monotonic()
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                self.cancel()
+            elif self.timeout and now - self._started_at > self.timeout:
+                timed_out = f"FFmpeg superó el plazo de {self.timeout} s"
+            elif self.idle_timeout and now - self._last_progress > self.idle_timeout:
+                timed_out = f"FFmpeg no avanzó en {self.idle_timeout} s"
+            if timed_out:
+                self._kill()
+            self._cancelled.wait(WAIT_INTERVAL)
+        for thread in self._threads:
+            thread.join()
+
+        if self._cancelled.is_set():
+            raise DownloadCancelled(self.cmd[-1])
+        if timed_out:
+            raise FFmpegTimeout(timed_out, self.log)
+        if self.process.returncode != 0:
+            raise FFmpegError(f"FFmpeg terminó con código {self.process.returncode}", self.log)
+
+    def run(self):
+        """Lanza FFmpeg y espera a que termine (ver wait())."""
+        self.start().wait()
+
+    def _kill(self):
+        """Termina el proceso de FFmpeg si sigue vivo."""
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+
+    def _read_progress(self, stream):
+        """Interpreta los bloques clave=valor de "-progress" a medida que llegan."""
+        for line in iter(stream.readline, b''):
+            key, _, value = line.decode('ascii', 'replace').strip().partition('=')
+            # out_time_ms también está en microsegundos (nombre histórico de FFmpeg)
+            if key in ('out_time_us', 'out_time_ms') and value.isdigit():
+                self._last_progress = time.monotonic()
+                if self.progress_callback and self.duration_us:
+                    self.progress_callback(min(int(value), self.duration_us), self.duration_us)
+            elif key == 'progress':
+                self._last_progress = time.monotonic()
+                if value == 'end' and self.progress_callback and self.duration_us:
+                    self.progress_callback(self.duration_us, self.duration_us)
+        stream.close()
+
+    def _read_log(self, stream):
+        """Guarda las últimas líneas de la salida de errores y detecta la duración."""
+        for line in iter(stream.readline, b''):
+            text = line.decode('utf-8', 'replace').rstrip()
+            self.log_lines.append(text)
+            if not self.duration_us:
+                match = DURATION_PATTERN.search(text)
+                if match:
+                    hours, minutes, seconds = match.groups()
+                    self.duration_us = int((int(hours) * 3600 + int(minutes) * 60 + float(seconds)) * 1000000)
+        stream.close()
+
+
+def media_duration(probe):
+    """
+    Devuelve la duración de un archivo analizado con probe_media.
+
+    Args:
+        probe (dict): Resultado de probe_media
+
+    Returns:
+        float: Duración en segundos, o None si no se conoce
+    """
+    try:
+        return float((probe or {}).get('format', {}).get('duration'))
+    except (TypeError, ValueError):
+        return None
+
+
+def mux_tracks(output_file, video_path, audio_path=None, subtitle_path=None, status_callback=None,
+               progress_callback=None, cancel_event=None, subtitle_languages=None):
+    """
+    Combina las pistas descargadas en el MP4 final, copiando los flujos siempre que se pueda.
+    Si la copia falla (por ejemplo, porque no se pudieron analizar los códecs),
+    se reintenta recodificando el audio.
+
+    Args:
+        output_file (str): Ruta del archivo final
+        video_path (str): Archivo de video
+        audio_path (str, opcional): Archivo de audio separado
+        subtitle_path (str o list, opcional): Archivo de subtítulos, o lista de archivos
+        status_callback (callable, opcional): Función que recibe mensajes de estado
+        progress_callback (callable, opcional): Función (procesado, total) en microsegundos
+        cancel_event (threading.Event, opcional): Evento que detiene FFmpeg
+        subtitle_languages (list, opcional): Código ISO 639-2 de cada archivo de subtítulos
+
+    Returns:
+        str: Modo usado (MUX_COPY o MUX_TRANSCODE)
+
+    Raises:
+        FFmpegError: Si FFmpeg no pudo combinar las pistas
+        DownloadCancelled: Si cancel_event se activó
+    """
+    status = status_callback or (lambda message: None)
+    probes = {path: probe_media(path) for path in (video_path, audio_path) if path}
+    duration = media_duration(probes.get(video_path))
+
+    def run(cmd):
+        runner = FFmpegRunner(cmd, duration, progress_callback, cancel_event, idle_timeout=MUX_IDLE_TIMEOUT)
+        try:
+            runner.run()
+        except (FFmpegError, DownloadCancelled):
+            # No dejar un archivo final a medio escribir
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            raise
+
+    cmd, mode = build_mux_command(output_file, video_path, audio_path, subtitle_path, probes,
+                                  subtitle_languages=subtitle_languages)
+    status(f"Combinando archivos ({mode})...")
+    try:
+        run(cmd)
+        return mode
+    except FFmpegError as e:
+        if mode == MUX_TRANSCODE:
+            raise
+        print(f"FFmpeg stderr: {e.log}")
+
+    status(f"La copia directa falló; combinando archivos ({MUX_TRANSCODE})...")
+    cmd, mode = build_mux_command(output_file, video_path, audio_path, subtitle_path, probes,
+                                  force_transcode=True, subtitle_languages=subtitle_languages)
+    run(cmd)
+    return mode
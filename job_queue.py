@@ -0,0 +1,594 @@
+import os
+import json
+import time
+import uuid
+import threading
+
+from media_manifest import MediaManifest
+from segmented_download import DownloadCancelled
+from progress import ProgressAggregator, DEFAULT_INTERVAL
+from tracing import get_tracer
+from selection import policy_from_dict, SelectionError
+
+# Estados de un trabajo
+QUEUED = "en cola"            # Pendiente de análisis
+ANALYZING = "analizando"
+READY = "listo"               # Analizado, pendiente de descarga
+DOWNLOADING = "descargando"
+PAUSED = "en pausa"
+COMPLETED = "completado"
+FAILED = "fallido"
+CANCELLED = "cancelado"
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+# Límites de concurrencia por defecto
+DEFAULT_ANALYSIS_WORKERS = 1
+DEFAULT_DOWNLOAD_WORKERS = 2
+
+
+def default_queue_path():
+    """
+    Devuelve la ruta por defecto del archivo donde se persiste la cola.
+
+    Returns:
+        str: Ruta del archivo JSON de la cola
+    """
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(base, 'picta_downloader', 'queue.json')
+
+
+class Job:
+    """
+    Trabajo de la cola: una URL que se analiza y se descarga.
+    Si el trabajo ya trae manifiesto (por ejemplo, analizado desde la interfaz),
+    empieza directamente en la etapa de descarga.
+    """
+    def __init__(self, url, output_dir, priority=0, custom_filename=None, selection=None,
+                 manifest=None, job_id=None, state=None, sequence=0, policy=None):
+        """
+        Inicializa el trabajo.
+
+        Args:
+            url (str): URL del video de Picta
+            output_dir (str): Directorio donde se guardará el video
+            priority (int, opcional): Prioridad (mayor se atiende antes)
+            custom_filename (str, opcional): Nombre personalizado para el archivo
+            selection (dict, opcional): Pistas elegidas ('video', 'audio', 'subtitles');
+                si no se indica, la política las elige en cuanto se analiza
+            manifest (MediaManifest, opcional): Manifiesto ya analizado
+            job_id (str, opcional): Identificador del trabajo
+            state (str, opcional): Estado inicial
+            sequence (int, opcional): Orden de llegada (desempata prioridades)
+            policy (dict, opcional): Política de selección serializada (selection.py);
+                por defecto la mejor calidad y el mejor audio, sin subtítulos
+        """
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.url = url
+        self.output_dir = output_dir
+        self.priority = priority
+        self.custom_filename = custom_filename
+        self.selection = selection
+        self.policy = policy
+        self.manifest = manifest
+        self.state = state or (READY if manifest else QUEUED)
+        self.sequence = sequence
+        self.message = ""
+        self.output_file = None
+        self.downloaded = 0
+        self.total = 0
+        self.speed = 0.0              # Bytes por segundo (suavizado); no se persiste
+        self.eta = None               # Segundos restantes estimados; no se persiste
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    @property
+    def title(self):
+        """str: Título del video si ya se analizó, o la URL."""
+        return self.manifest.title if self.manifest else self.url
+
+    def to_dict(self):
+        """
+        Serializa el trabajo a un diccionario compatible con JSON.
+
+        Returns:
+            dict: Trabajo serializado
+        """
+        return {
+            'id': self.id,
+            'url': self.url,
+            'title': self.title,
+            'output_dir': self.output_dir,
+            'priority': self.priority,
+            'custom_filename': self.custom_filename,
+            'selection': self.selection,
+            'policy': self.policy,
+            'manifest': self.manifest.to_dict() if self.manifest else None,
+            'state': self.state,
+            'sequence': self.sequence,
+            'message': self.message,
+            'output_file': self.output_file,
+            'downloaded': self.downloaded,
+            'total': self.total,
+            'speed': self.speed,
+            'eta': self.eta,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Reconstruye un trabajo serializado con to_dict().
+
+        Args:
+            data (dict): Trabajo serializado
+
+        Returns:
+            Job: Trabajo reconstruido
+        """
+        manifest = MediaManifest.from_dict(data['manifest']) if data.get('manifest') else None
+        job = cls(data['url'], data['output_dir'], data.get('priority', 0), data.get('custom_filename'),
+                  data.get('selection'), manifest, data['id'], data.get('state'), data.get('sequence', 0),
+                  data.get('policy'))
+        job.message = data.get('message', "")
+        job.output_file = data.get('output_file')
+        job.downloaded = data.get('downloaded', 0)
+        job.total = data.get('total', 0)
+        job.created_at = data.get('created_at', job.created_at)
+        job.updated_at = data.get('updated_at', job.updated_at)
+        return job
+
+
+class JobQueue:
+    """
+    Cola de trabajos de descarga con concurrencia acotada.
+    El análisis y la descarga tienen sus propios hilos y límites, de modo que
+    varias URLs se analizan mientras otras se descargan. Los trabajos tienen
+    prioridad, se pueden pausar, reanudar y cancelar, y la cola se guarda en
+    disco para sobrevivir a reinicios.
+    """
+    def __init__(self, analyze_fn, download_fn, analysis_workers=DEFAULT_ANALYSIS_WORKERS,
+                 download_workers=DEFAULT_DOWNLOAD_WORKERS, state_path=None, discard_fn=None,
+                 progress_interval=DEFAULT_INTERVAL):
+        """
+        Inicializa la cola y carga los trabajos guardados.
+
+        Args:
+            analyze_fn (callable): Función (job, status_callback) -> MediaManifest o None
+            download_fn (callable): Función (job, status_callback, progress_callback, cancel_event)
+                -> (éxito, mensaje o ruta del archivo final)
+            analysis_workers (int, opcional): Análisis simultáneos
+            download_workers (int, opcional): Descargas simultáneas
+            state_path (str, opcional): Archivo JSON donde persistir la cola
+                (por defecto default_queue_path(); False para no persistir)
+            discard_fn (callable, opcional): Función (job) que borra los datos parciales
+                de un trabajo cancelado
+            progress_interval (float, opcional): Segundos entre publicaciones del progreso
+        """
+        self.analyze_fn = analyze_fn
+        self.download_fn = download_fn
+        self.discard_fn = discard_fn
+        self.analysis_workers = analysis_workers
+        self.download_workers = download_workers
+        self.state_path = default_queue_path() if state_path is None else state_path
+
+        self._condition = threading.Condition()
+        # Serializa los guardados: una foto anterior nunca sustituye en disco a una más reciente
+        self._save_lock = threading.Lock()
+        self._jobs = {}
+        self._cancel_events = {}
+        self._pending_action = {}
+        self._listeners = []
+        self._progress_listeners = []
+        self._progress = ProgressAggregator(self._publish_progress, progress_interval)
+        self._tracer = get_tracer()
+        self._threads = []
+        self._closed = False
+        self._sequence = 0
+        self._load()
+
+    def subscribe(self, listener):
+        """
+        Registra una función que recibe cada cambio de un trabajo.
+        Se llama desde los hilos de la cola con una copia del trabajo (dict).
+
+        Args:
+            listener (callable): Función (job_dict)
+        """
+        self._listeners.append(listener)
+
+    def subscribe_progress(self, listener):
+        """
+        Registra una función que recibe el progreso de las descargas.
+        Se llama como mucho una vez por intervalo, desde el hilo de muestreo,
+        con los trabajos cuyo progreso cambió y el agregado de todos.
+
+        Args:
+            listener (callable): Función (jobs, overall): lista de copias (dict) de los
+                trabajos y dict con downloaded, total, speed y eta del conjunto
+        """
+        self._progress_listeners.append(listener)
+
+    def start(self):
+        """Arranca los hilos de análisis y de descarga."""
+        for _ in range(self.analysis_workers):
+            self._threads.append(threading.Thread(target=self._worker, args=(QUEUED,), daemon=True))
+        for _ in range(self.download_workers):
+            self._threads.append(threading.Thread(target=self._worker, args=(READY,), daemon=True))
+        for thread in self._threads:
+            thread.start()
+        self._progress.start()
+
+    def shutdown(self, wait=False):
+        """
+        Detiene la cola. Las descargas en curso se pausan y se reanudarán
+        en el próximo arranque.
+
+        Args:
+            wait (bool, opcional): Esperar a que terminen los hilos
+        """
+        with self._condition:
+            self._closed = True
+            for job_id, event in self._cancel_events.items():
+                self._pending_action[job_id] = READY
+                event.set()
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._progress.stop()
+        self._save()
+
+    def add(self, url, output_dir, priority=0, custom_filename=None, selection=None, manifest=None,
+            policy=None):
+        """
+        Añade un trabajo a la cola.
+
+        Args:
+            url (str): URL del video de Picta
+            output_dir (str): Directorio donde se guardará el video
+            priority (int, opcional): Prioridad (mayor se atiende antes)
+            custom_filename (str, opcional): Nombre personalizado para el archivo
+            selection (dict, opcional): Pistas elegidas ('video', 'audio', 'subtitles')
+            manifest (MediaManifest, opcional): Manifiesto ya analizado
+            policy (SelectionPolicy o ManualSelection, opcional): Política que elige las pistas
+
+        Returns:
+            Job: Trabajo creado
+
+        Raises:
+            SelectionError: Si el manifiesto ya está analizado y la política no lo admite
+        """
+        if selection is None and manifest is not None and policy is not None:
+            selection = policy.resolve(manifest)
+        with self._condition:
+            self._sequence += 1
+            job = Job(url, output_dir, priority, custom_filename, selection, manifest,
+                      sequence=self._sequence, policy=policy.to_dict() if policy else None)
+            self._jobs[job.id] = job
+            self._condition.notify_all()
+        self._changed(job, persist=True)
+        return job
+
+    def add_many(self, urls, output_dir, priority=0, policy=None):
+        """
+        Añade varias URLs a la cola (por ejemplo, los capítulos de una serie).
+
+        Args:
+            urls (list): URLs de videos de Picta
+            output_dir (str): Directorio donde se guardarán los videos
+            priority (int, opcional): Prioridad de todos los trabajos
+            policy (SelectionPolicy, opcional): Política que elige las pistas de cada video
+
+        Returns:
+            list: Trabajos creados
+        """
+        return [self.add(url, output_dir, priority, policy=policy) for url in urls if url.strip()]
+
+    def jobs(self):
+        """
+        Devuelve todos los trabajos en orden de atención.
+
+        Returns:
+            list: Copias (dict) de los trabajos
+        """
+        with self._condition:
+            return [job.to_dict() for job in sorted(self._jobs.values(), key=self._order)]
+
+    def get(self, job_id):
+        """
+        Devuelve un trabajo.
+
+        Args:
+            job_id (str): Identificador del trabajo
+
+        Returns:
+            dict: Copia del trabajo, o None si no existe
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def set_priority(self, job_id, priority):
+        """
+        Cambia la prioridad de un trabajo pendiente.
+
+        Args:
+            job_id (str): Identificador del trabajo
+            priority (int): Nueva prioridad
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if not job:
+                return
+            job.priority = priority
+            self._condition.notify_all()
+        self._changed(job, persist=True)
+
+    def pause(self, job_id):
+        """
+        Pausa un trabajo. Si se está descargando, la descarga se detiene y
+        los datos parciales se conservan para reanudarla.
+
+        Args:
+            job_id (str): Identificador del trabajo
+        """
+        self._stop(job_id, PAUSED)
+
+    def resume(self, job_id):
+        """
+        Reanuda un trabajo en pausa (o reintenta uno fallido).
+
+        Args:
+            job_id (str): Identificador del trabajo
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if not job or job.state not in (PAUSED, FAILED):
+                return
+            job.state = READY if job.manifest else QUEUED
+            job.message = ""
+            self._condition.notify_all()
+        self._changed(job, persist=True)
+
+    def cancel(self, job_id):
+        """
+        Cancela un trabajo pendiente o en curso.
+
+        Args:
+            job_id (str): Identificador del trabajo
+        """
+        self._stop(job_id, CANCELLED)
+
+    def clear_finished(self):
+        """Quita de la cola los trabajos completados, fallidos o cancelados."""
+        with self._condition:
+            for job_id in [j.id for j in self._jobs.values() if j.state in FINISHED_STATES]:
+                del self._jobs[job_id]
+        self._save()
+
+    def wait_all(self, job_ids=None, timeout=None):
+        """
+        Espera a que los trabajos terminen (completados, fallidos, cancelados o en pausa).
+
+        Args:
+            job_ids (list, opcional): Trabajos a esperar (por defecto todos)
+            timeout (float, opcional): Segundos máximos de espera
+
+        Returns:
+            bool: True si todos terminaron, False si se agotó el plazo o se cerró la cola
+        """
+        def settled():
+            jobs = [self._jobs[i] for i in job_ids if i in self._jobs] if job_ids else self._jobs.values()
+            return all(job.state in FINISHED_STATES + (PAUSED,) for job in jobs)
+
+        with self._condition:
+            return self._condition.wait_for(lambda: settled() or self._closed, timeout) and settled()
+
+    def _stop(self, job_id, new_state):
+        """Pausa o cancela un trabajo según su estado actual."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if not job or job.state in FINISHED_STATES:
+                return
+            if job.state in (ANALYZING, DOWNLOADING):
+                # El hilo que lo procesa aplicará el estado al detenerse
+                self._pending_action[job_id] = new_state
+                if job_id in self._cancel_events:
+                    self._cancel_events[job_id].set()
+                return
+            job.state = new_state
+            job.message = "En pausa" if new_state == PAUSED else "Cancelado"
+            self._condition.notify_all()
+        self._changed(job, persist=True)
+        if new_state == CANCELLED:
+            self._discard(job)
+
+    def _order(self, job):
+        """Clave de orden: mayor prioridad primero y, a igualdad, orden de llegada."""
+        return (-job.priority, job.sequence)
+
+    def _next_job(self, stage):
+        """Espera y reserva el siguiente trabajo de una etapa (QUEUED o READY)."""
+        with self._condition:
+            while not self._closed:
+                candidates = [job for job in self._jobs.values() if job.state == stage]
+                if candidates:
+                    job = min(candidates, key=self._order)
+                    job.state = ANALYZING if stage == QUEUED else DOWNLOADING
+                    if stage == READY:
+                        self._cancel_events[job.id] = threading.Event()
+                    return job
+                self._condition.wait()
+        return None
+
+    def _worker(self, stage):
+        """Bucle de un hilo de la cola para la etapa indicada."""
+        while True:
+            job = self._next_job(stage)
+            if job is None:
+                return
+            self._changed(job, persist=True)
+            if stage == QUEUED:
+                self._run_analysis(job)
+            else:
+                self._run_download(job)
+
+    def _status_callback(self, job):
+        """Crea el callback de mensajes de estado de un trabajo."""
+        def status(message):
+            job.message = message
+            self._changed(job)
+        return status
+
+    def _run_analysis(self, job):
+        """Analiza un trabajo y lo deja listo para la descarga."""
+        # Los tramos medidos dentro de la etapa quedan asociados al trabajo
+        with self._tracer.job(job.id), self._tracer.span("job.analysis", url=job.url) as span:
+            try:
+                manifest = self.analyze_fn(job, self._status_callback(job))
+                if manifest and manifest.has_video:
+                    # Elegir las pistas ya: la descarga empieza sin esperar a nadie
+                    if job.selection is None:
+                        job.selection = policy_from_dict(job.policy).resolve(manifest)
+                    job.manifest = manifest
+                    next_state, job.message = READY, "Analizado"
+                else:
+                    next_state, job.message = FAILED, "No se encontraron fuentes de video."
+            except SelectionError as e:
+                next_state, job.message = FAILED, str(e)
+            except Exception as e:
+                next_state, job.message = FAILED, f"Error: {e}"
+            span.set(result=next_state)
+        self._finish_stage(job, next_state)
+
+    def _run_download(self, job):
+        """Descarga un trabajo analizado."""
+        def progress(downloaded, total):
+            # Solo se anota; el agregador lo publica a frecuencia fija
+            self._progress.update(job.id, downloaded, total)
+
+        with self._tracer.job(job.id), self._tracer.span("job.download", title=job.title) as span:
+            try:
+                success, message = self.download_fn(job, self._status_callback(job), progress,
+                                                    self._cancel_events[job.id])
+                if success:
+                    job.output_file = message
+                    next_state, job.message = COMPLETED, "¡Descarga completada!"
+                else:
+                    next_state, job.message = FAILED, message
+            except DownloadCancelled:
+                next_state = PAUSED
+            except Exception as e:
+                next_state, job.message = FAILED, f"Error: {e}"
+            span.set(result=next_state)
+        self._finish_stage(job, next_state)
+
+    def _finish_stage(self, job, next_state):
+        """Aplica el estado final de una etapa, respetando pausas y cancelaciones pedidas."""
+        last = self._progress.remove(job.id)
+        with self._condition:
+            if last:
+                job.downloaded, job.total = last
+            job.speed, job.eta = 0.0, None
+            self._cancel_events.pop(job.id, None)
+            pending = self._pending_action.pop(job.id, None)
+            if pending == PAUSED and next_state == READY:
+                # La pausa llegó durante el análisis: conservar el manifiesto
+                next_state = PAUSED
+            elif pending == READY:
+                # Cierre de la aplicación: se reanudará en el próximo arranque
+                next_state = READY if job.manifest else QUEUED
+            elif pending and next_state not in (COMPLETED, FAILED):
+                next_state = pending
+            job.state = next_state
+            if next_state in (PAUSED, CANCELLED):
+                job.message = "En pausa" if next_state == PAUSED else "Cancelado"
+            self._condition.notify_all()
+        self._changed(job, persist=True)
+        if next_state == CANCELLED:
+            self._discard(job)
+
+    def _discard(self, job):
+        """Borra los datos parciales de un trabajo cancelado (ya no se reanudará)."""
+        if not self.discard_fn or not job.manifest:
+            return
+        try:
+            self.discard_fn(job)
+        except Exception as e:
+            print(f"Error al borrar los temporales del trabajo {job.id}: {e}")
+
+    def _publish_progress(self, samples, overall):
+        """Aplica una muestra del agregador a los trabajos y la entrega a los suscriptores."""
+        snapshots = []
+        with self._condition:
+            for job_id, sample in samples.items():
+                job = self._jobs.get(job_id)
+                if job is None or job.state != DOWNLOADING:
+                    continue
+                job.downloaded, job.total = sample['downloaded'], sample['total']
+                job.speed, job.eta = sample['speed'], sample['eta']
+                snapshots.append(job.to_dict())
+        if not snapshots:
+            return
+        for listener in list(self._progress_listeners):
+            try:
+                listener(snapshots, overall)
+            except Exception as e:
+                print(f"Error al notificar el progreso: {e}")
+
+    def _changed(self, job, persist=False):
+        """Notifica un cambio de un trabajo y, si es un cambio de estado, guarda la cola."""
+        job.updated_at = time.time()
+        snapshot = job.to_dict()
+        for listener in list(self._listeners):
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Error al notificar el trabajo {job.id}: {e}")
+        if persist:
+            self._save()
+
+    def _save(self):
+        """
+        Guarda la cola en disco de forma atómica.
+        Desde la foto de la cola hasta el os.replace se mantiene _save_lock, así
+        dos hilos que guardan a la vez escriben en el mismo orden en que tomaron
+        sus fotos (nunca queda en disco un estado anterior al último).
+        """
+        if not self.state_path:
+            return
+        with self._save_lock:
+            with self._condition:
+                data = {'sequence': self._sequence, 'jobs': [job.to_dict() for job in self._jobs.values()]}
+            try:
+                os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+                temp_path = f"{self.state_path}.{threading.get_ident()}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(temp_path, self.state_path)
+            except OSError as e:
+                print(f"Error al guardar la cola: {e}")
+
+    def _load(self):
+        """Carga la cola guardada; los trabajos que estaban en curso vuelven a su etapa."""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            jobs = [Job.from_dict(item) for item in data.get('jobs', [])]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error al cargar la cola guardada: {e}")
+            return
+        self._sequence = data.get('sequence', len(jobs))
+        for job in jobs:
+            if job.state == ANALYZING:
+                job.state = QUEUED
+            elif job.state == DOWNLOADING:
+                job.state = READY
+            self._jobs[job.id] = job
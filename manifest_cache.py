@@ -0,0 +1,221 @@
+import os
+import re
+import json
+import time
+import threading
+from urllib.parse import urlparse, parse_qs
+
+from media_manifest import MediaManifest, media_slug
+
+# Valores por defecto de la caché de manifiestos
+DEFAULT_TTL = 6 * 60 * 60      # 6 horas
+DEFAULT_MAX_ENTRIES = 200      # Número máximo de manifiestos guardados en disco
+VALIDATION_TIMEOUT = 5         # Segundos para la petición HEAD de validación
+
+# Parámetros habituales de caducidad en URLs firmadas (epoch en segundos)
+EXPIRY_PARAMS = ('expires', 'expire', 'exp', 'e')
+
+
+def default_cache_dir():
+    """
+    Devuelve el directorio de caché por defecto según el sistema operativo.
+
+    Returns:
+        str: Ruta del directorio de caché de manifiestos
+    """
+    if os.name == 'nt':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'picta_downloader', 'manifests')
+
+
+def url_expiry(url):
+    """
+    Obtiene el momento de caducidad de una URL firmada, si lo indica en la query.
+
+    Args:
+        url (str): URL a inspeccionar
+
+    Returns:
+        float: Epoch de caducidad, o None si la URL no lo indica
+    """
+    query = parse_qs(urlparse(url).query)
+    for key, values in query.items():
+        if key.lower() in EXPIRY_PARAMS and values and values[0].isdigit():
+            return float(values[0])
+    return None
+
+
+class ManifestCache:
+    """
+    Caché persistente en disco de manifiestos ya extraídos.
+    Cada manifiesto se guarda como un JSON con el slug del medio como clave.
+    Las entradas caducan tras un TTL y se desalojan por LRU cuando se supera
+    el número máximo de entradas.
+    """
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 session=None, headers=None):
+        """
+        Inicializa la caché.
+
+        Args:
+            cache_dir (str, opcional): Directorio donde guardar los manifiestos
+            ttl (float, opcional): Segundos de validez de cada manifiesto
+            max_entries (int, opcional): Número máximo de manifiestos en disco
+            session (requests.Session, opcional): Sesión para validar URLs firmadas
+            headers (dict, opcional): Cabeceras HTTP para la validación
+        """
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.session = session
+        self.headers = headers or {}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path_for(self, slug):
+        """Ruta del archivo JSON de un slug (sin caracteres problemáticos)."""
+        safe_slug = re.sub(r'[^\w\-]', '_', slug)
+        return os.path.join(self.cache_dir, f"{safe_slug}.json")
+
+    def get(self, url):
+        """
+        Busca un manifiesto válido para la URL.
+
+        Args:
+            url (str): URL del video de Picta (/medias/ o /embed/)
+
+        Returns:
+            MediaManifest: Manifiesto en caché, o None si no existe, caducó
+            o sus URLs firmadas ya no son accesibles
+        """
+        slug = media_slug(url)
+        if not slug:
+            return None
+
+        path = self._path_for(slug)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = MediaManifest.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # Comprobar TTL
+        if time.time() - manifest.created_at > self.ttl:
+            self.invalidate(url)
+            return None
+
+        # Comprobar que las URLs firmadas siguen siendo válidas
+        if not self._urls_alive(manifest):
+            self.invalidate(url)
+            return None
+
+        # Marcar como usado recientemente (LRU por fecha de modificación)
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return manifest
+
+    def put(self, manifest):
+        """
+        Guarda un manifiesto en la caché y desaloja las entradas más antiguas si hace falta.
+
+        Args:
+            manifest (MediaManifest): Manifiesto a guardar
+        """
+        if not manifest.media_id or not manifest.has_video:
+            return
+
+        path = self._path_for(manifest.media_id)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(manifest.to_dict(), f, ensure_ascii=False)
+                # Reemplazo atómico para no dejar archivos a medio escribir
+                os.replace(temp_path, path)
+            except OSError as e:
+                print(f"Error al guardar el manifiesto en caché: {e}")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                return
+            self._evict()
+
+    def invalidate(self, url):
+        """
+        Elimina de la caché el manifiesto de una URL.
+
+        Args:
+            url (str): URL del video de Picta
+        """
+        slug = media_slug(url)
+        if not slug:
+            return
+        try:
+            os.remove(self._path_for(slug))
+        except OSError:
+            pass
+
+    def clear(self):
+        """Elimina todos los manifiestos de la caché."""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+    def _evict(self):
+        """Desaloja los manifiestos usados hace más tiempo hasta respetar max_entries."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+        for _, path in sorted(entries)[:excess]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _urls_alive(self, manifest):
+        """
+        Comprueba de forma barata que la URL principal del manifiesto sigue siendo válida.
+        Primero mira la caducidad indicada en la propia URL y después hace una petición HEAD.
+
+        Args:
+            manifest (MediaManifest): Manifiesto a validar
+
+        Returns:
+            bool: True si el manifiesto se puede reutilizar
+        """
+        url = manifest.video_sources[0]['url']
+
+        expiry = url_expiry(url)
+        if expiry is not None and expiry <= time.time():
+            return False
+
+        if self.session is None:
+            return True
+
+        try:
+            response = self.session.head(url, headers=self.headers, allow_redirects=True,
+                                         timeout=VALIDATION_TIMEOUT)
+            # Algunos servidores no admiten HEAD; en ese caso no se puede descartar la URL
+            if response.status_code == 405:
+                return True
+            return response.status_code < 400
+        except Exception as e:
+            print(f"Error al validar el manifiesto en caché: {e}")
+            return False
@@ -0,0 +1,231 @@
+import re
+import time
+from urllib.parse import urlparse
+
+
+# Nombres legibles de los códigos de idioma habituales en Picta
+LANGUAGE_NAMES = {
+    'es': "Español",
+    'spa': "Español",
+    'en': "Inglés",
+    'eng': "Inglés",
+}
+
+
+def language_name(code):
+    """
+    Convierte un código de idioma (ISO 639-1 o 639-2) en un nombre legible.
+
+    Args:
+        code (str): Código de idioma, por ejemplo 'es' o 'eng'
+
+    Returns:
+        str: Nombre del idioma, o "Desconocido" si no se reconoce
+    """
+    if not code:
+        return "Desconocido"
+    return LANGUAGE_NAMES.get(code.lower().split('-')[0], code)
+
+
+def language_code(language):
+    """
+    Normaliza un idioma (código o nombre legible, con o sin detalles entre
+    paréntesis) a un código ISO 639-2 para poder compararlo.
+
+    Args:
+        language (str): Por ejemplo 'es', 'spa', 'es-ES', 'Español' o 'Español (128k)'
+
+    Returns:
+        str: Código ISO 639-2 ('spa', 'eng'...), el valor en minúsculas si no se
+        reconoce, o None si está vacío
+    """
+    if not language:
+        return None
+    value = language.split('(')[0].strip().lower()
+    code = value.split('-')[0]
+    name = LANGUAGE_NAMES.get(code)
+    if name is None:
+        name = next((known for known in LANGUAGE_NAMES.values() if known.lower() == value), None)
+    if name is None:
+        return value
+    # El código de tres letras de ese nombre
+    return next(key for key, known in LANGUAGE_NAMES.items() if known == name and len(key) == 3)
+
+
+def to_embed_url(url):
+    """
+    Convierte una URL de Picta del formato /medias/ al formato /embed/.
+    (El formato /embed/ es necesario para extraer correctamente la información)
+
+    Args:
+        url (str): URL del video de Picta
+
+    Returns:
+        str: URL en formato /embed/
+    """
+    if "/medias/" in url:
+        return url.replace("/medias/", "/embed/")
+    return url
+
+
+def media_slug(url):
+    """
+    Obtiene el identificador (slug) del medio a partir de una URL de Picta.
+    Las URLs /medias/<slug> y /embed/<slug> del mismo video producen el mismo slug.
+
+    Args:
+        url (str): URL del video de Picta
+
+    Returns:
+        str: Slug normalizado del medio, o None si la URL no es de un medio
+    """
+    path = urlparse(url.strip()).path
+    match = re.search(r'/(?:medias|embed)/([^/?#]+)', path)
+    if not match:
+        return None
+    return match.group(1).lower()
+
+
+class MediaManifest:
+    """
+    Resultado reutilizable de la etapa de análisis.
+    Contiene todo lo necesario para que la etapa de descarga trabaje sin
+    volver a abrir el navegador: título y fuentes de video, audio y subtítulos.
+    """
+    def __init__(self, url, title, video_sources=None, audio_tracks=None, subtitles=None, created_at=None):
+        """
+        Inicializa el manifiesto con la información extraída.
+
+        Args:
+            url (str): URL original del video de Picta
+            title (str): Título del video
+            video_sources (list, opcional): Fuentes de video ({'url', 'quality', 'type'})
+            audio_tracks (list, opcional): Pistas de audio ({'url', 'language'})
+            subtitles (list, opcional): Pistas de subtítulos ({'url', 'language'})
+            created_at (float, opcional): Momento de la extracción (epoch)
+        """
+        self.url = url
+        self.embed_url = to_embed_url(url)
+        self.media_id = media_slug(url)
+        self.title = title
+        self.video_sources = video_sources or []
+        self.audio_tracks = audio_tracks or []
+        self.subtitles = subtitles or []
+        self.created_at = created_at if created_at is not None else time.time()
+
+    @classmethod
+    def from_video_info(cls, url, video_info):
+        """
+        Crea un manifiesto a partir del diccionario devuelto por extract_network_requests.
+
+        Args:
+            url (str): URL original del video de Picta
+            video_info (dict): Información del video (title, video_sources, audio_tracks, subtitles)
+
+        Returns:
+            MediaManifest: Manifiesto con la información del video
+        """
+        return cls(
+            url,
+            video_info.get('title', "Video de Picta"),
+            video_info.get('video_sources'),
+            video_info.get('audio_tracks'),
+            video_info.get('subtitles'),
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Reconstruye un manifiesto serializado con to_dict().
+
+        Args:
+            data (dict): Manifiesto serializado
+
+        Returns:
+            MediaManifest: Manifiesto reconstruido
+        """
+        return cls(
+            data['url'],
+            data['title'],
+            data.get('video_sources'),
+            data.get('audio_tracks'),
+            data.get('subtitles'),
+            data.get('created_at'),
+        )
+
+    def to_dict(self):
+        """
+        Serializa el manifiesto a un diccionario compatible con JSON.
+
+        Returns:
+            dict: Manifiesto serializado
+        """
+        data = self.video_info
+        data['url'] = self.url
+        data['created_at'] = self.created_at
+        return data
+
+    @property
+    def video_info(self):
+        """dict: Información del video en el formato usado por la interfaz."""
+        return {
+            'title': self.title,
+            'video_sources': list(self.video_sources),
+            'audio_tracks': list(self.audio_tracks),
+            'subtitles': list(self.subtitles),
+        }
+
+    @property
+    def has_video(self):
+        """bool: True si el manifiesto tiene al menos una fuente de video."""
+        return bool(self.video_sources)
+
+    def default_selection(self):
+        """
+        Elige las pistas para una descarga sin intervención del usuario con la
+        política por defecto: la mayor calidad de video y la primera pista de
+        audio, sin subtítulos.
+
+        Returns:
+            dict: Pistas elegidas ('video', 'audio', 'subtitles')
+        """
+        # Importación diferida: selection depende de este módulo
+        from selection import SelectionPolicy
+        return SelectionPolicy().resolve(self)
+
+    def find_track(self, kind, track):
+        """
+        Busca en este manifiesto la pista equivalente a otra (por ejemplo, de un
+        manifiesto anterior cuyos enlaces caducaron): misma calidad de video o
+        mismo idioma de audio o subtítulos.
+
+        Args:
+            kind (str): 'video', 'audio' o 'subtitle'
+            track (dict): Pista a buscar
+
+        Returns:
+            dict: Pista equivalente, o None si no hay ninguna
+        """
+        candidates = {'video': self.video_sources, 'audio': self.audio_tracks, 'subtitle': self.subtitles}[kind]
+        key = 'quality' if kind == 'video' else 'language'
+        for candidate in candidates:
+            if candidate.get(key) == track.get(key):
+                return candidate
+        # Si solo hay una pista de ese tipo no hay duda posible
+        return candidates[0] if len(candidates) == 1 else None
+
+    def matches_url(self, url):
+        """
+        Indica si una URL corresponde al mismo medio que este manifiesto.
+
+        Args:
+            url (str): URL a comparar
+
+        Returns:
+            bool: True si ambas URLs apuntan al mismo medio
+        """
+        slug = media_slug(url)
+        if slug and self.media_id:
+            return slug == self.media_id
+        return to_embed_url(url.strip()) == self.embed_url
+
@@ -0,0 +1,240 @@
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from mp4_boxes import HEAD_SIZE, scan_top_level, detect_layout, parse_moov
+from media_manifest import language_name
+from extractors import manifest_type
+from segmented_download import PROBE_TIMEOUT, READ_TIMEOUT
+from tracing import get_tracer
+from progress import format_size
+
+PROBE_WORKERS = 4                  # Pistas que se sondean a la vez
+MAX_PROBE_MOOV = 8 * 1024 * 1024   # moov más grande que se descarga para leer sus propiedades
+DEFAULT_CACHE_SIZE = 512           # Resultados que se conservan en memoria
+
+_shared_prober = None
+_shared_prober_lock = threading.Lock()
+
+
+def resource_key(url):
+    """
+    Clave de caché de un recurso: la URL sin la query (los enlaces firmados cambian
+    de firma pero apuntan al mismo archivo).
+
+    Args:
+        url (str): URL del recurso
+
+    Returns:
+        str: Esquema, servidor y ruta
+    """
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+
+class MediaProber:
+    """
+    Sondea las propiedades reales de las pistas MP4 sin descargarlas.
+    Pide por rangos el inicio del archivo (y el moov si está al final), lee
+    de él resolución, códec, tasa de bits, duración e idioma, y toma el tamaño
+    total de Content-Range. Las pistas se sondean en paralelo y los resultados
+    se guardan en una caché LRU por recurso.
+    """
+    def __init__(self, session, headers=None, workers=PROBE_WORKERS, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        Inicializa el sondeador.
+
+        Args:
+            session (requests.Session): Sesión HTTP compartida
+            headers (dict, opcional): Cabeceras HTTP para las peticiones
+            workers (int, opcional): Pistas que se sondean a la vez
+            cache_size (int, opcional): Resultados que se conservan en memoria
+        """
+        self.session = session
+        self.headers = headers or {}
+        self.workers = workers
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def probe(self, url):
+        """
+        Sondea una pista (o devuelve el resultado en caché).
+
+        Args:
+            url (str): URL de la pista
+
+        Returns:
+            dict: size (bytes o None) y, si es un MP4 reconocible, layout, duration,
+            codec, language, bitrate, width/height o channels/sample_rate; None si
+            no se pudo sondear
+        """
+        key = resource_key(url)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        try:
+            info = self._probe(url)
+        except Exception as e:
+            print(f"Error al sondear {url}: {e}")
+            return None
+
+        with self._lock:
+            self._cache[key] = info
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return info
+
+    def probe_many(self, urls):
+        """
+        Sondea varias pistas en paralelo.
+
+        Args:
+            urls (list): URLs de las pistas
+
+        Returns:
+            dict: {url: resultado de probe()}
+        """
+        urls = list(dict.fromkeys(urls))
+        if len(urls) <= 1:
+            return {url: self.probe(url) for url in urls}
+        probe = get_tracer().bind(self.probe)
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(urls))) as executor:
+            return dict(zip(urls, executor.map(probe, urls)))
+
+    def enrich(self, video_info):
+        """
+        Completa las pistas de video y audio de un video_info con sus propiedades
+        reales. La calidad del video pasa a ser su altura real y el idioma del
+        audio el declarado en el archivo, cuando se conocen. Las fuentes DASH/HLS
+        por segmentos no se sondean: sus propiedades vienen del manifiesto.
+
+        Args:
+            video_info (dict): Información del video (se modifica en el sitio)
+
+        Returns:
+            dict: El mismo video_info
+        """
+        tracks = video_info.get('video_sources', []) + video_info.get('audio_tracks', [])
+        results = self.probe_many([track['url'] for track in tracks if not manifest_type(track['url'])])
+        for track in video_info.get('video_sources', []):
+            info = results.get(track['url'])
+            if not info:
+                continue
+            _copy_properties(track, info, ('size', 'duration', 'codec', 'bitrate', 'width', 'height'))
+            if info.get('height'):
+                track['quality'] = f"{info['height']}p"
+        for track in video_info.get('audio_tracks', []):
+            info = results.get(track['url'])
+            if not info:
+                continue
+            _copy_properties(track, info, ('size', 'duration', 'codec', 'bitrate', 'channels', 'sample_rate'))
+            if info.get('language'):
+                bitrate = f"{round(info['bitrate'] / 1000)}k" if info.get('bitrate') else "Unknown"
+                track['language'] = f"{language_name(info['language'])} ({bitrate})"
+        return video_info
+
+    def _probe(self, url):
+        """Lee el inicio del archivo, localiza el moov y extrae sus propiedades."""
+        response = self.session.get(url, headers=dict(self.headers, Range=f"bytes=0-{HEAD_SIZE - 1}"),
+                                    stream=True, timeout=(PROBE_TIMEOUT, READ_TIMEOUT))
+        with response:
+            response.raise_for_status()
+            match = re.match(r'bytes\s+\d+-\d+/(\d+)', response.headers.get('Content-Range', ''))
+            if response.status_code != 206 or not match:
+                # Sin rangos no se lee nada más: basta con el tamaño
+                length = response.headers.get('Content-Length', '')
+                return {'size': int(length) if length.isdigit() else None}
+            size = int(match.group(1))
+            head = response.content
+
+        info = {'size': size}
+        boxes = scan_top_level(lambda start, end: self._fetch(url, start, end), size, head)
+        info['layout'] = detect_layout(boxes)
+        moov = next(((offset, box_size) for box_type, offset, box_size in boxes if box_type == 'moov'), None)
+        if not moov or moov[1] > MAX_PROBE_MOOV:
+            return info
+        offset, box_size = moov
+        if offset + box_size <= len(head):
+            data = head[offset:offset + box_size]
+        else:
+            data = self._fetch(url, offset, offset + box_size - 1)
+        properties = parse_moov(data)
+        if not properties:
+            return info
+
+        info['duration'] = properties['duration']
+        # Las pistas de Picta llevan un solo flujo; si hay varios manda el de video
+        streams = sorted(properties['tracks'], key=lambda track: track['kind'] != 'video')
+        if streams:
+            stream = streams[0]
+            _copy_properties(info, stream, ('codec', 'language', 'width', 'height', 'channels', 'sample_rate'))
+            info['duration'] = info['duration'] or stream['duration']
+            info['bitrate'] = stream['bitrate']
+        if not info.get('bitrate') and info['duration']:
+            # MP4 fragmentado (sin tabla de muestras): se estima con el tamaño del archivo
+            info['bitrate'] = int(size * 8 / info['duration'])
+        return info
+
+    def _fetch(self, url, start, end):
+        response = self.session.get(url, headers=dict(self.headers, Range=f"bytes={start}-{end}"),
+                                    timeout=(PROBE_TIMEOUT, READ_TIMEOUT))
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise IOError(f"El servidor no admite rangos ({response.status_code})")
+        return response.content
+
+
+def get_shared_prober(session, headers=None):
+    """
+    Devuelve el sondeador compartido por todo el proceso, creándolo si no existe.
+    Cada análisis de la cola crea su propio PictaDownloader; con un único
+    sondeador, su caché sirve también a los análisis repetidos o renovados del
+    mismo medio (los enlaces firmados nuevos tienen la misma clave).
+
+    Args:
+        session (requests.Session): Sesión HTTP con la que se crea el sondeador
+            (las llamadas posteriores reutilizan la del primero)
+        headers (dict, opcional): Cabeceras HTTP para las peticiones
+
+    Returns:
+        MediaProber: Sondeador compartido
+    """
+    global _shared_prober
+    with _shared_prober_lock:
+        if _shared_prober is None:
+            _shared_prober = MediaProber(session, headers)
+        return _shared_prober
+
+
+def describe_track(track):
+    """
+    Resume las propiedades sondeadas de una pista para mostrarlas junto a su nombre.
+
+    Args:
+        track (dict): Pista de video o audio (enriquecida con MediaProber.enrich)
+
+    Returns:
+        str: Por ejemplo "1280x720 avc1, 2.1 Mb/s, 182.4 MB", o "" si no se sondeó
+    """
+    parts = []
+    if track.get('width') and track.get('height'):
+        parts.append(f"{track['width']}x{track['height']} {track.get('codec') or ''}".strip())
+    elif track.get('codec'):
+        parts.append(track['codec'])
+    if track.get('bitrate'):
+        parts.append(f"{track['bitrate'] / 1000000:.1f} Mb/s" if track['bitrate'] >= 1000000
+                     else f"{track['bitrate'] / 1000:.0f} kb/s")
+    if track.get('size'):
+        parts.append(format_size(track['size']))
+    return ", ".join(parts)
+
+
+def _copy_properties(target, source, keys):
+    for key in keys:
+        if source.get(key) is not None:
+            target[key] = source[key]
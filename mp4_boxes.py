@@ -0,0 +1,307 @@
+import struct
+
+# Disposición de un MP4 respecto a su lectura secuencial
+LAYOUT_STREAMABLE = "moov al inicio"   # moov antes de mdat (faststart o MP4 fragmentado)
+LAYOUT_MOOV_LAST = "moov al final"     # mdat antes de moov: no se puede leer de una tubería
+LAYOUT_UNKNOWN = "desconocido"         # No parece un MP4
+
+HEAD_SIZE = 64 * 1024                  # Bytes iniciales que se leen para reconocer el archivo
+MAX_MOOV_SIZE = 64 * 1024 * 1024       # Límite razonable para cargar un moov en memoria
+
+# Cajas contenedoras que hay que recorrer para llegar a las tablas de fragmentos
+CHUNK_OFFSET_PATH = {'moov', 'trak', 'mdia', 'minf', 'stbl'}
+KNOWN_TOP_LEVEL = {'ftyp', 'styp', 'moov', 'mdat', 'moof', 'mfra', 'free', 'skip', 'wide',
+                   'uuid', 'sidx', 'pdin', 'meta', 'emsg', 'prft'}
+
+
+def parse_box_header(data, offset=0):
+    """
+    Lee la cabecera de una caja ISO BMFF.
+
+    Args:
+        data (bytes): Datos que contienen la cabecera
+        offset (int, opcional): Posición de la cabecera dentro de data
+
+    Returns:
+        tuple: (tipo, tamaño total, tamaño de cabecera), o None si faltan bytes.
+        Un tamaño total de 0 indica que la caja llega hasta el final del archivo.
+    """
+    if len(data) - offset < 8:
+        return None
+    size, box_type = struct.unpack_from('>I4s', data, offset)
+    box_type = box_type.decode('latin-1')
+    if size == 1:
+        if len(data) - offset < 16:
+            return None
+        size = struct.unpack_from('>Q', data, offset + 8)[0]
+        return box_type, size, 16
+    return box_type, size, 8
+
+
+def iter_boxes(data, start=0, end=None):
+    """
+    Recorre las cajas consecutivas de un bloque de datos.
+
+    Args:
+        data (bytes): Datos
+        start (int, opcional): Posición de la primera caja
+        end (int, opcional): Fin del bloque (por defecto len(data))
+
+    Yields:
+        tuple: (tipo, posición, tamaño total, tamaño de cabecera)
+    """
+    end = len(data) if end is None else end
+    offset = start
+    while offset < end:
+        header = parse_box_header(data, offset)
+        if not header:
+            return
+        box_type, size, header_size = header
+        size = size or end - offset
+        if size < header_size:
+            return
+        yield box_type, offset, size, header_size
+        offset += size
+
+
+def scan_top_level(fetch, size, head=None):
+    """
+    Localiza las cajas de primer nivel de un MP4 remoto leyendo solo sus cabeceras.
+
+    Args:
+        fetch (callable): Función (inicio, fin) -> bytes, con el fin inclusivo
+        size (int): Tamaño total del archivo
+        head (bytes, opcional): Primeros bytes del archivo, si ya se leyeron
+
+    Returns:
+        list: Tuplas (tipo, posición, tamaño) de las cajas de primer nivel
+    """
+    head = head if head is not None else fetch(0, min(size, HEAD_SIZE) - 1)
+    boxes = []
+    offset = 0
+    while offset < size:
+        if offset + 16 <= len(head):
+            data, position = head, offset
+        else:
+            data, position = fetch(offset, min(size, offset + 16) - 1), 0
+        header = parse_box_header(data, position)
+        if not header:
+            break
+        box_type, box_size, header_size = header
+        box_size = box_size or size - offset
+        if box_size < header_size or box_type not in KNOWN_TOP_LEVEL:
+            break
+        boxes.append((box_type, offset, box_size))
+        offset += box_size
+    return boxes
+
+
+def detect_layout(boxes):
+    """
+    Indica si un MP4 se puede leer de forma secuencial.
+
+    Args:
+        boxes (list): Resultado de scan_top_level
+
+    Returns:
+        str: LAYOUT_STREAMABLE, LAYOUT_MOOV_LAST o LAYOUT_UNKNOWN
+    """
+    types = [box_type for box_type, _, _ in boxes]
+    if not types or types[0] not in ('ftyp', 'styp'):
+        return LAYOUT_UNKNOWN
+    if 'moov' not in types:
+        return LAYOUT_UNKNOWN
+    if 'mdat' not in types or types.index('moov') < types.index('mdat'):
+        return LAYOUT_STREAMABLE
+    return LAYOUT_MOOV_LAST
+
+
+def relocate_chunk_offsets(moov, shift):
+    """
+    Corrige las tablas stco/co64 de un moov que va a cambiar de sitio.
+
+    Args:
+        moov (bytes): Caja moov completa
+        shift (callable): Función (posición original) -> nueva posición
+
+    Returns:
+        bytes: Caja moov corregida, o None si un desplazamiento ya no cabe en stco (32 bits)
+    """
+    moov = bytearray(moov)
+
+    def patch(start, end):
+        for box_type, offset, size, header_size in iter_boxes(moov, start, end):
+            body = offset + header_size
+            if box_type in CHUNK_OFFSET_PATH:
+                if not patch(body, offset + size):
+                    return False
+            elif box_type in ('stco', 'co64'):
+                count = struct.unpack_from('>I', moov, body + 4)[0]
+                entry_format, entry_size = ('>I', 4) if box_type == 'stco' else ('>Q', 8)
+                position = body + 8
+                for _ in range(count):
+                    value = shift(struct.unpack_from(entry_format, moov, position)[0])
+                    if box_type == 'stco' and value > 0xFFFFFFFF:
+                        return False
+                    struct.pack_into(entry_format, moov, position, value)
+                    position += entry_size
+        return True
+
+    header = parse_box_header(moov)
+    if not header or header[0] != 'moov' or not patch(header[2], len(moov)):
+        return None
+    return bytes(moov)
+
+
+def faststart_pieces(fetch, size, boxes):
+    """
+    Planifica la lectura secuencial de un MP4 con el moov al final, como si
+    tuviera el moov al inicio (lo que hace "-movflags faststart", pero al vuelo).
+    El moov se descarga primero, se corrigen sus desplazamientos y se envía
+    justo después de ftyp; el resto de cajas se leen después en su orden.
+
+    Args:
+        fetch (callable): Función (inicio, fin) -> bytes, con el fin inclusivo
+        size (int): Tamaño total del archivo
+        boxes (list): Resultado de scan_top_level
+
+    Returns:
+        list: Piezas ('data', bytes) o ('range', inicio, fin) en orden de envío,
+        o None si el archivo no se puede reordenar
+    """
+    moov_box = next(((offset, box_size) for box_type, offset, box_size in boxes if box_type == 'moov'), None)
+    if boxes[0][0] != 'ftyp' or not moov_box or moov_box[1] > MAX_MOOV_SIZE:
+        return None
+    moov_offset, moov_size = moov_box
+    ftyp_end = boxes[0][2]
+
+    def shift(position):
+        # Lo que estaba entre ftyp y moov se desplaza lo que ocupa el moov
+        return position + moov_size if ftyp_end <= position < moov_offset else position
+
+    moov = relocate_chunk_offsets(fetch(moov_offset, moov_offset + moov_size - 1), shift)
+    if moov is None:
+        return None
+
+    pieces = [('range', 0, ftyp_end - 1), ('data', moov)]
+    if moov_offset > ftyp_end:
+        pieces.append(('range', ftyp_end, moov_offset - 1))
+    if moov_offset + moov_size < size:
+        pieces.append(('range', moov_offset + moov_size, size - 1))
+    return pieces
+
+
+# Tipos de pista según el manejador (hdlr) de cada trak
+HANDLER_KINDS = {'vide': 'video', 'soun': 'audio', 'text': 'subtitle', 'sbtl': 'subtitle', 'subt': 'subtitle'}
+
+
+def find_box(data, path, start=0, end=None):
+    """
+    Busca una caja siguiendo una ruta de contenedores.
+
+    Args:
+        data (bytes): Datos
+        path (list): Tipos de caja desde el nivel de start, por ejemplo ['mdia', 'mdhd']
+        start (int, opcional): Inicio del bloque
+        end (int, opcional): Fin del bloque
+
+    Returns:
+        tuple: (inicio del contenido, fin de la caja), o None si no existe
+    """
+    for box_type, offset, size, header_size in iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return offset + header_size, offset + size
+            return find_box(data, path[1:], offset + header_size, offset + size)
+    return None
+
+
+def _full_box_times(data, body):
+    """Lee escala de tiempo y duración de un mvhd/mdhd (versión 0 o 1)."""
+    if data[body] == 1:
+        timescale, duration = struct.unpack_from('>IQ', data, body + 20)
+        return timescale, duration, body + 32
+    timescale, duration = struct.unpack_from('>II', data, body + 12)
+    return timescale, duration, body + 20
+
+
+def _language_code(packed):
+    """Decodifica el idioma ISO 639-2 empaquetado en 15 bits de un mdhd."""
+    code = "".join(chr(((packed >> shift) & 0x1F) + 0x60) for shift in (10, 5, 0))
+    return code if code.isalpha() and code != 'und' else None
+
+
+def _sample_bytes(data, stbl):
+    """Suma los tamaños de las muestras de una pista (stsz), o None si no hay tabla."""
+    stsz = find_box(data, ['stsz'], *stbl)
+    if not stsz:
+        return None
+    sample_size, count = struct.unpack_from('>II', data, stsz[0] + 4)
+    if sample_size:
+        return sample_size * count
+    if stsz[0] + 12 + 4 * count > stsz[1]:
+        return None
+    return sum(struct.unpack_from(f'>{count}I', data, stsz[0] + 12))
+
+
+def parse_moov(moov):
+    """
+    Obtiene las propiedades de un MP4 a partir de su caja moov.
+
+    Args:
+        moov (bytes): Caja moov completa
+
+    Returns:
+        dict: duration (s) y tracks, una lista de dicts con kind ('video', 'audio'
+        o 'subtitle'), codec, language (ISO 639-2 o None), duration, bytes (tamaño
+        de las muestras, o None en MP4 fragmentados), bitrate (bits/s o None) y,
+        según el tipo, width/height o channels/sample_rate. None si no es un moov.
+    """
+    header = parse_box_header(moov)
+    if not header or header[0] != 'moov':
+        return None
+    body_start = header[2]
+    info = {'duration': None, 'tracks': []}
+    mvhd = find_box(moov, ['mvhd'], body_start)
+    if mvhd:
+        timescale, duration, _ = _full_box_times(moov, mvhd[0])
+        info['duration'] = duration / timescale if timescale else None
+
+    for box_type, offset, size, header_size in iter_boxes(moov, body_start):
+        if box_type != 'trak':
+            continue
+        trak = (offset + header_size, offset + size)
+        mdia = find_box(moov, ['mdia'], *trak)
+        hdlr = find_box(moov, ['hdlr'], *mdia) if mdia else None
+        mdhd = find_box(moov, ['mdhd'], *mdia) if mdia else None
+        stbl = find_box(moov, ['minf', 'stbl'], *mdia) if mdia else None
+        if not hdlr or not mdhd or not stbl:
+            continue
+
+        handler = moov[hdlr[0] + 8:hdlr[0] + 12].decode('latin-1')
+        timescale, duration, language_offset = _full_box_times(moov, mdhd[0])
+        track = {
+            'kind': HANDLER_KINDS.get(handler, handler),
+            'codec': None,
+            'language': _language_code(struct.unpack_from('>H', moov, language_offset)[0]),
+            'duration': duration / timescale if timescale else None,
+            'bytes': _sample_bytes(moov, stbl),
+        }
+
+        # Primera entrada de stsd: códec y propiedades de la muestra
+        stsd = find_box(moov, ['stsd'], *stbl)
+        entry = next(iter_boxes(moov, stsd[0] + 8, stsd[1]), None) if stsd else None
+        if entry:
+            sample_type, entry_offset, _, entry_header = entry
+            track['codec'] = sample_type.strip()
+            fields = entry_offset + entry_header + 8
+            if track['kind'] == 'video':
+                track['width'], track['height'] = struct.unpack_from('>HH', moov, fields + 16)
+            elif track['kind'] == 'audio':
+                track['channels'] = struct.unpack_from('>H', moov, fields + 8)[0]
+                track['sample_rate'] = struct.unpack_from('>I', moov, fields + 16)[0] >> 16
+
+        track['bitrate'] = (int(track['bytes'] * 8 / track['duration'])
+                            if track['bytes'] and track['duration'] else None)
+        info['tracks'].append(track)
+    return info
@@ -0,0 +1,155 @@
+import re
+import json
+from urllib.parse import unquote, urlsplit
+
+from media_manifest import LANGUAGE_NAMES, language_name
+from extractors import manifest_type
+
+# Métodos del registro de rendimiento que llevan la URL de una solicitud
+REQUEST_SENT = "Network.requestWillBeSent"
+RESPONSE_RECEIVED = "Network.responseReceived"
+
+# Fragmentos que debe contener el texto de una entrada para que merezca la pena
+# decodificarla (la mayoría son scripts, imágenes, métricas o eventos de página)
+MEDIA_HINTS = ("video%2F", "audio%2F", ".vtt", ".srt", ".mpd", ".m3u8")
+
+# Clasificación de las URLs multimedia
+VIDEO_URL = re.compile(r'video%2F.*\.mp4$')
+AUDIO_URL = re.compile(r'audio%2F.*\.mp4$')
+SUBTITLE_URL = re.compile(r'\.(?:vtt|srt)$')
+VIDEO_QUALITY = re.compile(r'480p|720p|1080p')
+AUDIO_BITRATE = re.compile(r'128k|192k')
+
+# Fragmentos del nombre del archivo; los técnicos (tasas de bits, calidades,
+# identificadores) se saltan al buscar el idioma
+NAME_SEPARATOR = re.compile(r'[-_.\s]+')
+TECHNICAL_TOKEN = re.compile(r'\d+[kp]?')
+
+
+def classify_media_url(url):
+    """
+    Clasifica una URL del registro de red.
+
+    Args:
+        url (str): URL de la solicitud
+
+    Returns:
+        tuple: (tipo, pista) con tipo 'video_sources', 'audio_tracks', 'subtitles' o
+        'manifests' (DASH o HLS), o None si la URL no es de un recurso multimedia
+    """
+    if manifest_type(url):
+        return 'manifests', {'url': url, 'type': manifest_type(url)}
+
+    if VIDEO_URL.search(url):
+        quality = VIDEO_QUALITY.search(url)
+        return 'video_sources', {
+            'url': url,
+            'quality': quality.group(0) if quality else "Unknown",
+            'type': 'video/mp4'
+        }
+
+    if AUDIO_URL.search(url):
+        bitrate = AUDIO_BITRATE.search(url)
+        return 'audio_tracks', {
+            'url': url,
+            'language': f"{_language(url)} ({bitrate.group(0) if bitrate else 'Unknown'})"
+        }
+
+    if SUBTITLE_URL.search(url):
+        return 'subtitles', {
+            'url': url,
+            'language': _language(url)
+        }
+    return None
+
+
+def _language(url):
+    """
+    Deduce el idioma del sufijo del nombre del archivo: el último fragmento
+    delimitado que no sea una tasa de bits, una calidad o un número
+    ("..._spa_128k.mp4", "...-en.vtt"). Lo que va antes es el título, que puede
+    contener palabras como "en", "es" o "de" que no indican el idioma.
+    """
+    name = unquote(urlsplit(url).path).rsplit('/', 1)[-1].lower()
+    stem = name.rsplit('.', 1)[0]
+    for token in reversed(NAME_SEPARATOR.split(stem)):
+        if not token or TECHNICAL_TOKEN.fullmatch(token):
+            continue
+        return language_name(token) if token in LANGUAGE_NAMES else "Desconocido"
+    return "Desconocido"
+
+
+def entry_url(message):
+    """
+    Obtiene la URL de una entrada del registro de rendimiento, si es una solicitud
+    o una respuesta de red.
+
+    Args:
+        message (str): Campo "message" de la entrada (JSON)
+
+    Returns:
+        str: URL, o None si la entrada no es de red o no está bien formada
+    """
+    try:
+        log_entry = json.loads(message)["message"]
+        method = log_entry["method"]
+        # La URL se conoce ya al enviar la solicitud; con los medios bloqueados
+        # nunca llega la respuesta
+        if method == REQUEST_SENT:
+            return log_entry["params"]["request"]["url"]
+        if method == RESPONSE_RECEIVED:
+            return log_entry["params"]["response"]["url"]
+    except (ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+class MediaLogCollector:
+    """
+    Procesa por lotes el registro de rendimiento del navegador y acumula los
+    recursos multimedia. Antes de decodificar una entrada se comprueba en su
+    texto que sea de red y que pueda contener una URL multimedia, así que el
+    JSON solo se decodifica en unas pocas; los duplicados se descartan por URL
+    sobre la marcha.
+    """
+    def __init__(self):
+        self.found = {'video_sources': [], 'audio_tracks': [], 'subtitles': [], 'manifests': []}
+        self.seen_urls = set()
+        self.entries = 0       # Entradas recibidas
+        self.parsed = 0        # Entradas que pasaron el filtro y se decodificaron
+
+    def feed(self, logs):
+        """
+        Procesa un lote de entradas.
+
+        Args:
+            logs (list): Entradas devueltas por driver.get_log('performance')
+
+        Returns:
+            bool: True si se encontró algún recurso multimedia nuevo
+        """
+        new_media = False
+        self.entries += len(logs)
+        for log in logs:
+            message = log.get("message") if isinstance(log, dict) else None
+            if not message or not _may_be_media(message):
+                continue
+            self.parsed += 1
+            url = entry_url(message)
+            if url is None or url in self.seen_urls:
+                continue
+            media = classify_media_url(url)
+            if media is None:
+                continue
+            kind, track = media
+            self.found[kind].append(track)
+            self.seen_urls.add(url)
+            new_media = True
+        return new_media
+
+
+def _may_be_media(message):
+    """Filtro textual barato: entrada de red con algún indicio de URL multimedia."""
+    if RESPONSE_RECEIVED not in message and REQUEST_SENT not in message:
+        return False
+    return any(hint in message for hint in MEDIA_HINTS)
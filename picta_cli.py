@@ -0,0 +1,464 @@
+"""
+Interfaz de línea de comandos de Picta Downloader.
+
+No importa PyQt5 ni abre un navegador salvo que haga falta, de modo que
+arranca rápido y se puede usar en servidores o scripts:
+
+    python picta_cli.py analyze URL [--json]
+    python picta_cli.py download URL... [-i lista.txt] [-o DIR] [--json]
+    python picta_cli.py daemon --spool-dir DIR [-o DIR] [--json]
+
+Con --json cada evento se escribe como una línea JSON en la salida estándar
+y los mensajes de diagnóstico van a la salida de errores. Con --trace,
+--chrome-trace y --metrics se guardan los tiempos de cada etapa. Las pistas
+de cada video se eligen sin preguntar con --max-height, --audio-lang,
+--subtitles y --max-size.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+from functools import partial
+
+from job_queue import JobQueue, COMPLETED, FINISHED_STATES, DEFAULT_ANALYSIS_WORKERS, DEFAULT_DOWNLOAD_WORKERS
+from progress import format_speed, format_eta
+from bandwidth import get_shared_limiter, parse_rate, parse_schedule
+from tracing import get_tracer
+from browser_pool import shared_pool_metrics
+from media_probe import describe_track
+from selection import SelectionPolicy, SUBTITLES_ALL, SUBTITLES_NONE
+
+# Códigos de salida
+EXIT_OK = 0              # Todo se descargó (o analizó) correctamente
+EXIT_FAILED = 1          # Algún trabajo falló o no se encontraron fuentes
+EXIT_USAGE = 2           # Argumentos inválidos (el mismo que usa argparse)
+EXIT_INTERRUPTED = 130   # Interrumpido por SIGINT/SIGTERM; las descargas quedan en pausa
+
+PROGRESS_INTERVAL = 1.0  # Segundos entre eventos de progreso (agrupan todos los trabajos)
+WAIT_INTERVAL = 0.5      # Intervalo de espera del hilo principal (para atender señales)
+SPOOL_SUFFIX = '.txt'    # Archivos con URLs que recoge el modo daemon
+SPOOL_DONE_SUFFIX = '.queued'
+
+
+def read_url_file(path):
+    """
+    Lee un archivo con una URL por línea ("-" para la entrada estándar).
+    Las líneas vacías y las que empiezan por "#" se ignoran.
+
+    Args:
+        path (str): Ruta del archivo
+
+    Returns:
+        list: URLs leídas
+    """
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith('#')]
+
+
+class EventPrinter:
+    """
+    Escribe los cambios de los trabajos en la salida estándar, como texto
+    legible o como líneas JSON. Los cambios de estado se escriben siempre;
+    el progreso llega ya agrupado de la cola: un evento por intervalo con
+    todos los trabajos que avanzaron y el total.
+    """
+    def __init__(self, stream, as_json=False):
+        """
+        Inicializa la salida de eventos.
+
+        Args:
+            stream (file): Flujo donde escribir los eventos
+            as_json (bool, opcional): Escribir una línea JSON por evento
+        """
+        self.stream = stream
+        self.as_json = as_json
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        """
+        Escribe un evento.
+
+        Args:
+            event (str): Tipo de evento ("job", "progress", "analysis"...)
+            **fields: Datos del evento
+        """
+        with self._lock:
+            if self.as_json:
+                record = {'event': event, 'time': round(time.time(), 3)}
+                record.update(fields)
+                self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                self.stream.write(self._format(event, fields) + "\n")
+            self.stream.flush()
+
+    def job_changed(self, job):
+        """
+        Listener de la cola: escribe un evento cuando cambia el estado o el mensaje.
+
+        Args:
+            job (dict): Copia del trabajo (Job.to_dict())
+        """
+        state = (job['state'], job['message'])
+        if self._last.get(job['id']) != state:
+            self._last[job['id']] = state
+            self.emit('job', **self._job_fields(job))
+            if job['state'] in FINISHED_STATES:
+                self.emit('timing', id=job['id'], stages=get_tracer().job_summary(job['id']))
+
+    def progress_changed(self, jobs, overall):
+        """
+        Listener de progreso de la cola: un solo evento con todos los trabajos.
+
+        Args:
+            jobs (list): Copias de los trabajos cuyo progreso cambió
+            overall (dict): Progreso agregado de todas las descargas
+        """
+        self.emit('progress',
+                  jobs=[{'id': job['id'], 'downloaded': job['downloaded'], 'total': job['total'],
+                         'speed': round(job['speed']), 'eta': self._round(job['eta'])} for job in jobs],
+                  downloaded=overall['downloaded'], total=overall['total'],
+                  speed=round(overall['speed']), eta=self._round(overall['eta']))
+
+    @staticmethod
+    def _round(eta):
+        return None if eta is None else round(eta, 1)
+
+    def _job_fields(self, job):
+        """Campos de un trabajo que se publican en los eventos."""
+        return {
+            'id': job['id'],
+            'url': job['url'],
+            'title': job['title'],
+            'state': job['state'],
+            'message': job['message'],
+            'downloaded': job['downloaded'],
+            'total': job['total'],
+            'output_file': job['output_file'],
+        }
+
+    def _format(self, event, fields):
+        """Representación legible de un evento."""
+        if event == 'progress':
+            parts = [f"[{job['id']}] {self._percent(job)}% {format_speed(job['speed'])} "
+                     f"{format_eta(job['eta'])}" for job in fields['jobs']]
+            if len(fields['jobs']) > 1:
+                parts.append(f"total {self._percent(fields)}% {format_speed(fields['speed'])}")
+            return "  ".join(parts)
+        if event == 'timing':
+            stages = ", ".join(f"{name} {stage['seconds']:.1f} s" +
+                               (f" ({format_speed(stage['bytes'] / stage['seconds'])})"
+                                if stage['bytes'] and stage['seconds'] else "")
+                               for name, stage in fields['stages'].items())
+            return f"[{fields['id']}] tiempos: {stages}"
+        if event == 'browsers':
+            return (f"navegadores: {fields['launches']} lanzados, {fields['acquisitions']} préstamos, "
+                    f"espera media {fields['wait_time_avg']:.1f} s (máx. {fields['wait_time_max']:.1f} s), "
+                    f"{fields['recycled']} reciclados, {fields['reaped']} cerrados por inactividad")
+        if event == 'job':
+            line = f"[{fields['id']}] {fields['state']}: {fields['title']}"
+            if fields['message']:
+                line += f" - {fields['message']}"
+            return line
+        return " ".join(f"{key}={value}" for key, value in fields.items())
+
+    @staticmethod
+    def _percent(fields):
+        return int(fields['downloaded'] * 100 / fields['total']) if fields['total'] else 0
+
+
+def install_stop_handlers(stop_event):
+    """
+    Hace que SIGINT y SIGTERM pidan una parada ordenada en lugar de abortar.
+
+    Args:
+        stop_event (threading.Event): Evento que se activa al recibir la señal
+    """
+    def handler(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, handler)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, handler)
+
+
+def rate_argument(text):
+    """Tipo de argparse para las velocidades."""
+    try:
+        return parse_rate(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def schedule_argument(text):
+    """Tipo de argparse para el horario de límites."""
+    try:
+        return parse_schedule(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def list_argument(value):
+    """Convierte una lista separada por comas en una lista de valores."""
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def subtitles_argument(value):
+    """Convierte el valor de --subtitles en la opción de subtítulos de la política."""
+    if value.strip().lower() in (SUBTITLES_ALL, 'all'):
+        return SUBTITLES_ALL
+    if value.strip().lower() in (SUBTITLES_NONE, 'none'):
+        return SUBTITLES_NONE
+    return list_argument(value)
+
+
+def build_policy(args):
+    """Crea la política de selección de pistas de las opciones de la línea de comandos."""
+    return SelectionPolicy(args.max_height, args.audio_lang, not args.no_audio, args.subtitles, args.max_size)
+
+
+def build_queue(args):
+    """Crea la cola de trabajos con las etapas del descargador."""
+    from picta_downloader import analyze_job, download_job, discard_job
+    from workspace import WorkspaceManager
+
+    limiter = get_shared_limiter()
+    if args.limit_rate or args.limit_job or args.limit_host or args.schedule:
+        limiter.configure(args.limit_rate or limiter.rate, args.limit_job, args.limit_host,
+                          args.schedule or limiter.schedule)
+
+    # Borrar los temporales que dejaron ejecuciones anteriores interrumpidas
+    WorkspaceManager(args.temp_dir).cleanup_orphans()
+    return JobQueue(analyze_job, partial(download_job, stream_mux=args.stream, temp_root=args.temp_dir),
+                    analysis_workers=args.analysis_workers, download_workers=args.download_workers,
+                    state_path=getattr(args, 'state_path', False),
+                    discard_fn=partial(discard_job, temp_root=args.temp_dir),
+                    progress_interval=PROGRESS_INTERVAL)
+
+
+def command_analyze(args, printer):
+    """Analiza una URL y muestra sus pistas sin descargar nada."""
+    from picta_downloader import PictaDownloader
+
+    def status(message):
+        print(message, file=sys.stderr)
+
+    manifest = PictaDownloader().analyze(args.url, status, use_cache=not args.no_cache)
+    if not manifest or not manifest.has_video:
+        printer.emit('analysis', url=args.url, error="No se encontraron fuentes de video.")
+        return EXIT_FAILED
+
+    if args.json:
+        printer.emit('analysis', **manifest.to_dict())
+    else:
+        printer.stream.write(f"Título: {manifest.title}\n")
+        for source in manifest.video_sources:
+            printer.stream.write(f"  video     {source['quality']:>8}  {describe_track(source)}  {source['url']}\n")
+        for track in manifest.audio_tracks:
+            printer.stream.write(f"  audio     {track['language']}  {describe_track(track)}  {track['url']}\n")
+        for subtitle in manifest.subtitles:
+            printer.stream.write(f"  subtítulo {subtitle['language']}  {subtitle['url']}\n")
+        printer.stream.flush()
+    return EXIT_OK
+
+
+def command_download(args, printer):
+    """Descarga una o varias URLs y termina cuando acaban todas."""
+    urls = list(args.urls)
+    for path in args.input_file or []:
+        urls.extend(read_url_file(path))
+    if not urls:
+        print("No se indicó ninguna URL.", file=sys.stderr)
+        return EXIT_USAGE
+
+    stop_event = threading.Event()
+    install_stop_handlers(stop_event)
+
+    job_queue = build_queue(args)
+    job_queue.subscribe(printer.job_changed)
+    job_queue.subscribe_progress(printer.progress_changed)
+    job_ids = [job.id for job in job_queue.add_many(urls, args.output_dir, policy=build_policy(args))]
+    job_queue.start()
+
+    while not stop_event.is_set():
+        if job_queue.wait_all(job_ids, timeout=WAIT_INTERVAL):
+            break
+    job_queue.shutdown(wait=True)
+
+    if stop_event.is_set():
+        return EXIT_INTERRUPTED
+    states = [job_queue.get(job_id)['state'] for job_id in job_ids]
+    return EXIT_OK if all(state == COMPLETED for state in states) else EXIT_FAILED
+
+
+def command_daemon(args, printer):
+    """
+    Mantiene la cola en marcha y recoge archivos de URLs de un directorio.
+    Cada archivo *.txt que aparece en el directorio se añade a la cola y se
+    renombra a *.queued. La cola se persiste, así que las descargas
+    interrumpidas continúan en el siguiente arranque.
+    """
+    os.makedirs(args.spool_dir, exist_ok=True)
+    stop_event = threading.Event()
+    install_stop_handlers(stop_event)
+
+    job_queue = build_queue(args)
+    job_queue.subscribe(printer.job_changed)
+    job_queue.subscribe_progress(printer.progress_changed)
+    job_queue.start()
+    printer.emit('daemon', state="iniciado", spool_dir=os.path.abspath(args.spool_dir))
+
+    while not stop_event.is_set():
+        for name in sorted(os.listdir(args.spool_dir)):
+            if not name.endswith(SPOOL_SUFFIX):
+                continue
+            path = os.path.join(args.spool_dir, name)
+            try:
+                urls = read_url_file(path)
+                os.replace(path, path[:-len(SPOOL_SUFFIX)] + SPOOL_DONE_SUFFIX)
+            except OSError as e:
+                print(f"Error al leer {path}: {e}", file=sys.stderr)
+                continue
+            jobs = job_queue.add_many(urls, args.output_dir, policy=build_policy(args))
+            printer.emit('spool', file=name, jobs=[job.id for job in jobs])
+        if args.metrics:
+            # El daemon no termina: mantener las métricas al día para quien las recoja
+            try:
+                get_tracer().write_prometheus(args.metrics)
+            except OSError as e:
+                print(f"No se pudieron guardar las métricas: {e}", file=sys.stderr)
+        stop_event.wait(args.poll)
+
+    job_queue.shutdown(wait=True)
+    printer.emit('daemon', state="detenido")
+    return EXIT_INTERRUPTED
+
+
+def report_browsers(printer):
+    """Publica las métricas del pool de navegadores si el proceso llegó a usarlo."""
+    metrics = shared_pool_metrics()
+    if metrics:
+        printer.emit('browsers', **{key: round(value, 3) if isinstance(value, float) else value
+                                    for key, value in metrics.items()})
+
+
+def write_traces(args, tracer):
+    """Guarda la traza de Chrome y las métricas pedidas en la línea de comandos."""
+    try:
+        if args.chrome_trace:
+            tracer.write_chrome_trace(args.chrome_trace)
+        if args.metrics:
+            tracer.write_prometheus(args.metrics)
+    except OSError as e:
+        print(f"No se pudieron guardar las trazas: {e}", file=sys.stderr)
+
+
+def build_parser():
+    """Construye el analizador de argumentos."""
+    parser = argparse.ArgumentParser(prog="picta_cli",
+                                     description="Descarga videos de Picta sin interfaz gráfica.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--json', action='store_true',
+                        help="escribir los eventos como líneas JSON en la salida estándar")
+    common.add_argument('--trace', metavar='ARCHIVO', default=None,
+                        help="añadir los tiempos de cada etapa a un archivo JSON Lines")
+    common.add_argument('--chrome-trace', metavar='ARCHIVO', default=None,
+                        help="guardar al terminar una traza para chrome://tracing o Perfetto")
+    common.add_argument('--metrics', metavar='ARCHIVO', default=None,
+                        help="guardar los totales por etapa en formato de Prometheus")
+    workers = argparse.ArgumentParser(add_help=False)
+    workers.add_argument('-o', '--output-dir', default=os.path.join(os.path.expanduser('~'), 'Downloads'),
+                         help="directorio donde se guardan los videos")
+    workers.add_argument('--analysis-workers', type=int, default=DEFAULT_ANALYSIS_WORKERS,
+                         help="análisis simultáneos")
+    workers.add_argument('--download-workers', type=int, default=DEFAULT_DOWNLOAD_WORKERS,
+                         help="descargas simultáneas")
+    workers.add_argument('--temp-dir', default=None,
+                         help="directorio de los archivos temporales (mejor en el mismo disco que los videos)")
+    workers.add_argument('--stream', action='store_true',
+                         help="combinar las pistas mientras se descargan, sin archivos temporales")
+    workers.add_argument('--limit-rate', type=rate_argument, default=None,
+                         help="velocidad máxima de todas las descargas (por ejemplo 2M o 500K)")
+    workers.add_argument('--limit-job', type=rate_argument, default=None,
+                         help="velocidad máxima de cada trabajo")
+    workers.add_argument('--limit-host', type=rate_argument, default=None,
+                         help="velocidad máxima por servidor")
+    workers.add_argument('--schedule', type=schedule_argument, default=None,
+                         help="límites según la hora, por ejemplo \"08:00-23:00=1M\" "
+                              "(fuera de los tramos se usa --limit-rate)")
+    workers.add_argument('--max-height', type=int, default=None,
+                         help="mejor calidad de video hasta esta altura (por ejemplo 720)")
+    workers.add_argument('--audio-lang', type=list_argument, default=None,
+                         help="idiomas de audio preferidos en orden, por ejemplo \"spa,eng\"")
+    workers.add_argument('--no-audio', action='store_true', help="no incluir pista de audio separada")
+    workers.add_argument('--subtitles', type=subtitles_argument, default=SUBTITLES_NONE,
+                         help="subtítulos a incluir: \"todos\", \"ninguno\" o idiomas (\"spa,eng\")")
+    workers.add_argument('--max-size', type=float, default=None, metavar='MB',
+                         help="tamaño máximo de video más audio; se elige la mejor calidad que quepa")
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    analyze = subparsers.add_parser('analyze', parents=[common], help="mostrar las pistas de un video")
+    analyze.add_argument('url', help="URL del video de Picta")
+    analyze.add_argument('--no-cache', action='store_true', help="ignorar la caché de manifiestos")
+    analyze.set_defaults(handler=command_analyze)
+
+    download = subparsers.add_parser('download', parents=[common, workers], help="descargar videos")
+    download.add_argument('urls', nargs='*', help="URLs de videos de Picta")
+    download.add_argument('-i', '--input-file', action='append',
+                          help="archivo con una URL por línea (\"-\" para la entrada estándar)")
+    download.set_defaults(handler=command_download, state_path=False)
+
+    daemon = subparsers.add_parser('daemon', parents=[common, workers],
+                                   help="procesar continuamente los archivos de URLs de un directorio")
+    daemon.add_argument('--spool-dir', required=True, help="directorio vigilado con archivos *.txt de URLs")
+    daemon.add_argument('--poll', type=float, default=2.0, help="segundos entre revisiones del directorio")
+    daemon.add_argument('--state-path', default=None,
+                        help="archivo donde persistir la cola (por defecto el de la aplicación)")
+    daemon.set_defaults(handler=command_daemon)
+    return parser
+
+
+def main(argv=None):
+    """
+    Punto de entrada de la línea de comandos.
+
+    Args:
+        argv (list, opcional): Argumentos (por defecto sys.argv[1:])
+
+    Returns:
+        int: Código de salida
+    """
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'analysis_workers', 1) < 1 or getattr(args, 'download_workers', 1) < 1:
+        print("El número de hilos debe ser al menos 1.", file=sys.stderr)
+        return EXIT_USAGE
+
+    stream = sys.stdout
+    if args.json:
+        # Los mensajes de diagnóstico (print) no deben mezclarse con las líneas JSON
+        sys.stdout = sys.stderr
+    printer = EventPrinter(stream, as_json=args.json)
+    tracer = get_tracer()
+    trace_sink = tracer.open_jsonl(args.trace) if args.trace else None
+    try:
+        return args.handler(args, printer)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    finally:
+        sys.stdout = stream
+        report_browsers(printer)
+        write_traces(args, tracer)
+        if trace_sink:
+            trace_sink.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
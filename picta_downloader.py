@@ -0,0 +1,720 @@
+import os
+import re
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from media_manifest import MediaManifest, to_embed_url, language_code
+from manifest_cache import ManifestCache
+from extractors import (ApiExtractor, EmbedPageExtractor, SeleniumExtractor, run_extractors, manifest_type,
+                        fetch_manifest_sources)
+from browser_pool import launch_chrome, get_shared_pool
+from segmented_download import SegmentedDownloader, DownloadCancelled, DEFAULT_CONNECTIONS, probe_resource
+from progress import CombinedProgress
+from ffmpeg_mux import mux_tracks, FFmpegError
+from stream_mux import StreamingMuxer
+from workspace import WorkspaceManager, InsufficientSpaceError
+from bandwidth import get_shared_limiter
+from retry_policy import RetryPolicy
+from download_journal import DownloadJournal, SegmentJournal
+from tracing import get_tracer
+from network_log import MediaLogCollector
+from media_probe import get_shared_prober
+from adaptive_download import AdaptiveDownloader
+from selection import selected_subtitles, policy_from_dict
+
+# Parámetros de la extracción con Selenium
+EXTRACTION_TIMEOUT = 25        # Plazo máximo total para encontrar los recursos (segundos)
+LOG_POLL_INTERVAL = 0.25       # Intervalo entre lecturas del registro de rendimiento
+MEDIA_SETTLE_TIME = 0.5        # Espera extra tras ver video y audio (por los subtítulos)
+MEDIA_QUIET_PERIOD = 2.0       # Espera sin recursos nuevos si solo se ha visto video
+URL_REFRESH_INTERVAL = 60      # Segundos durante los que se reutilizan los enlaces renovados
+
+# Solicitudes que el navegador no necesita hacer durante la extracción
+# (comodines de Network.setBlockedURLs)
+BLOCKED_RESOURCE_PATTERNS = [
+    "*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*",
+    "*.woff*", "*.ttf*", "*.otf*", "*.eot*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*googlesyndication.com*", "*facebook.net*", "*hotjar.com*",
+]
+# Medios: la URL queda en el registro al enviarse la solicitud y se cancela sin
+# descargar ni un byte
+BLOCKED_MEDIA_PATTERNS = ["*video%2F*.mp4*", "*audio%2F*.mp4*", "*.m4s*", "*.vtt*", "*.srt*"]
+
+def media_requests_complete(found, idle_for):
+    """
+    Predicado por defecto que indica si la extracción ya tiene lo necesario.
+    
+    Args:
+        found (dict): Listas acumuladas de video_sources, audio_tracks, subtitles y manifests
+        idle_for (float): Segundos transcurridos sin ver recursos multimedia nuevos
+        
+    Returns:
+        bool: True si se puede terminar la extracción
+    """
+    if not found['video_sources']:
+        # Un manifiesto DASH/HLS ya describe todas las fuentes
+        return bool(found.get('manifests')) and idle_for >= MEDIA_SETTLE_TIME
+    if found['audio_tracks']:
+        return idle_for >= MEDIA_SETTLE_TIME
+    return idle_for >= MEDIA_QUIET_PERIOD
+
+class PictaDownloader:
+    """
+    Clase principal que maneja la extracción de información y descarga de archivos.
+    Extrae la información por HTTP (API de Picta o página /embed/), con Selenium
+    como respaldo, y utiliza requests para descargar archivos.
+    """
+    def __init__(self, stream_mux=False, temp_root=None):
+        """
+        Inicializa el descargador con la configuración necesaria.
+        
+        Args:
+            stream_mux (bool, opcional): Combinar las pistas mientras se descargan,
+                sin archivos temporales (si las pistas lo permiten)
+            temp_root (str, opcional): Directorio de los archivos temporales; conviene
+                que esté en el mismo disco que los videos para que el paso final sea
+                un simple renombrado (por defecto default_temp_root())
+        """
+        self.session = requests.Session()
+        # Pool de conexiones suficiente para las descargas por rangos en paralelo
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=DEFAULT_CONNECTIONS * 4)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        }
+        self.base_url = "https://www.picta.cu"
+        # Espacios de trabajo temporales, uno por trabajo (sobreviven a reinicios para reanudar)
+        self.workspaces = WorkspaceManager(temp_root)
+        self.temp_dir = self.workspaces.root
+        # Caché en disco de manifiestos ya extraídos (evita abrir el navegador)
+        self.manifest_cache = ManifestCache(session=self.session, headers=self.headers)
+        # Sondeo por rangos de las propiedades reales de cada pista (con una caché
+        # de todo el proceso, compartida por todos los análisis)
+        self.media_prober = get_shared_prober(self.session, self.headers)
+        # Límite de velocidad: los cubos general y por servidor son de todo el proceso,
+        # el del trabajo lo comparten todas las pistas y conexiones de esta instancia
+        self.bandwidth = get_shared_limiter().for_job()
+        # Motor de descarga por rangos en paralelo
+        self.segmented_downloader = SegmentedDownloader(self.session, self.headers, bandwidth=self.bandwidth)
+        # Motor de las fuentes DASH/HLS servidas por segmentos (varios a la vez, escritos en orden)
+        self.adaptive_downloader = AdaptiveDownloader(self.session, self.headers, bandwidth=self.bandwidth)
+        # Combinación en streaming (descarga y FFmpeg a la vez)
+        self.stream_mux = stream_mux
+        self.streaming_muxer = StreamingMuxer(self.session, self.headers, bandwidth=self.bandwidth)
+        # Reintentos de las descargas (esperas crecientes y renovación de enlaces caducados)
+        self.retry_policy = RetryPolicy()
+        # Registro de tiempos de cada etapa (compartido por todo el proceso)
+        self.tracer = get_tracer()
+        # Extracción ligera: el navegador no carga imágenes, fuentes ni métricas
+        # y cancela los medios en cuanto se conoce su URL
+        self.block_requests = True
+        # Motores de extracción en orden de preferencia (Selenium solo como respaldo)
+        self.extractors = [
+            ApiExtractor(self.session, self.headers),
+            EmbedPageExtractor(self.session, self.headers),
+            SeleniumExtractor(self, get_shared_pool()),
+        ]
+        
+    def analyze(self, url, status_callback=None, use_cache=True):
+        """
+        Etapa de análisis: extrae la información del video y la devuelve como manifiesto.
+        Se usa primero la API de Picta por HTTP y el navegador solo como respaldo;
+        la etapa de descarga no necesita ninguno de los dos.
+        
+        Args:
+            url (str): URL del video de Picta (/medias/ o /embed/)
+            status_callback (callable, opcional): Función que recibe mensajes de estado
+            use_cache (bool, opcional): Reutilizar un manifiesto en caché si sigue siendo válido
+            
+        Returns:
+            MediaManifest: Manifiesto con título y fuentes de video, audio y subtítulos,
+            o None si no se encontraron fuentes de video
+        """
+        status = status_callback or (lambda message: None)
+        
+        with self.tracer.span("analysis", url=url) as span:
+            # Si el manifiesto ya está en caché no hace falta abrir el navegador
+            if use_cache:
+                manifest = self.manifest_cache.get(url)
+                if manifest:
+                    span.set(source="caché")
+                    status("Información del video obtenida de la caché.")
+                    return manifest
+            
+            # Convertir URL de formato /medias/ a /embed/ si es necesario
+            embed_url = to_embed_url(url)
+            if embed_url != url:
+                status(f"Convertido URL a formato embed: {embed_url}")
+            
+            # Probar los motores de extracción, del más rápido al más pesado
+            video_info = run_extractors(self.extractors, embed_url, status)
+            if not video_info:
+                return None
+            
+            # Propiedades reales de las pistas (resolución, idioma, tamaño) sin descargarlas
+            status("Leyendo las propiedades de las pistas...")
+            tracks = len(video_info['video_sources']) + len(video_info['audio_tracks'])
+            with self.tracer.span("media.probe", tracks=tracks):
+                self.media_prober.enrich(video_info)
+            
+            manifest = MediaManifest.from_video_info(url, video_info)
+            self.manifest_cache.put(manifest)
+            return manifest
+        
+    def job_workspace(self, manifest, selection):
+        """
+        Reserva el espacio de trabajo de una descarga.
+        
+        Args:
+            manifest (MediaManifest): Manifiesto del medio
+            selection (dict): Pistas elegidas ('video', 'audio', 'subtitles')
+            
+        Returns:
+            Workspace: Espacio de trabajo exclusivo del trabajo
+        """
+        selection_key = "|".join([
+            (selection.get('video') or {}).get('quality', ''),
+            (selection.get('audio') or {}).get('language', ''),
+            "+".join(subtitle.get('language', '') for subtitle in selected_subtitles(selection)),
+        ])
+        return self.workspaces.acquire(manifest.media_id, selection_key)
+    
+    def discard_workspace(self, manifest, selection):
+        """
+        Borra los datos parciales de una descarga que ya no se va a reanudar.
+        
+        Args:
+            manifest (MediaManifest): Manifiesto del medio
+            selection (dict): Pistas elegidas
+        """
+        self.job_workspace(manifest, selection).remove()
+        
+    def setup_browser(self):
+        """
+        Lanza un navegador Chrome fuera del pool para capturar solicitudes de red.
+        
+        Returns:
+            WebDriver: Instancia configurada del navegador Chrome
+        """
+        return launch_chrome()
+        
+    def extract_network_requests(self, driver, url, timeout=EXTRACTION_TIMEOUT,
+                                 is_complete=None):
+        """
+        Extrae solicitudes de red para encontrar archivos de video, audio y subtítulos.
+        En lugar de esperas fijas, lee el registro de rendimiento de forma incremental
+        y termina en cuanto se han visto las solicitudes multimedia necesarias
+        o se agota el plazo total. Si block_requests está activo, el navegador
+        no descarga recursos pesados ni los propios medios.
+        
+        Args:
+            driver (WebDriver): Instancia del navegador Chrome
+            url (str): URL del video de Picta
+            timeout (float, opcional): Plazo máximo total en segundos
+            is_complete (callable, opcional): Predicado (found, idle_for) -> bool que indica
+                si ya se tiene todo lo necesario; por defecto media_requests_complete
+            
+        Returns:
+            dict: Información del video incluyendo fuentes de video, audio y subtítulos
+        """
+        from selenium.webdriver.common.by import By
+        
+        is_complete = is_complete or media_requests_complete
+        deadline = time.monotonic() + timeout
+        
+        with self.tracer.span("page.load", url=url) as span:
+            if self.block_requests:
+                span.set(blocked=self._block_requests(driver))
+            driver.get(url)
+        
+        collector = MediaLogCollector()
+        found = collector.found
+        playing = False
+        last_new = time.monotonic()
+        with self.tracer.span("page.media_wait") as span:
+            polls = 0
+            parse_time = 0.0
+            
+            while True:
+                # Iniciar la reproducción en cuanto exista el reproductor
+                # (necesario para que se carguen todos los recursos)
+                if not playing:
+                    try:
+                        video_elements = driver.find_elements(By.CSS_SELECTOR, "video")
+                        if video_elements:
+                            driver.execute_script("arguments[0].play();", video_elements[0])
+                            playing = True
+                    except Exception as e:
+                        print(f"Error al iniciar la reproducción: {e}")
+                
+                # Procesar solo las entradas nuevas del registro de rendimiento
+                logs = driver.get_log('performance')
+                started = time.perf_counter()
+                if collector.feed(logs):
+                    last_new = time.monotonic()
+                parse_time += time.perf_counter() - started
+                polls += 1
+                # Soltar el lote ya procesado antes de esperar al siguiente
+                del logs
+                
+                now = time.monotonic()
+                if is_complete(found, now - last_new) or now >= deadline:
+                    break
+                time.sleep(LOG_POLL_INTERVAL)
+            
+            span.set(polls=polls, log_entries=collector.entries, parsed_entries=collector.parsed,
+                     parse_seconds=round(parse_time, 6),
+                     media=sum(len(items) for items in found.values()))
+        
+        # Si el reproductor pidió un manifiesto, sus fuentes son completas (todas las
+        # calidades e idiomas), no solo las que el navegador llegó a solicitar
+        video_sources, audio_tracks = [], []
+        for manifest in found.get('manifests', []):
+            try:
+                videos, audios = fetch_manifest_sources(self.session, manifest['url'], self.headers)
+                video_sources += videos
+                audio_tracks += audios
+            except Exception as e:
+                print(f"Error al leer el manifiesto {manifest['url']}: {e}")
+        if video_sources:
+            found['video_sources'] = video_sources
+            found['audio_tracks'] = audio_tracks
+        
+        if not found['video_sources']:
+            print("No se detectaron fuentes de video antes de agotar el plazo.")
+        
+        # Extraer el título del video de la página
+        try:
+            title_element = driver.find_element(By.CSS_SELECTOR, "h1.title")
+            title = title_element.text.strip()
+        except:
+            try:
+                title_element = driver.find_element(By.CSS_SELECTOR, "h1")
+                title = title_element.text.strip()
+            except:
+                title = "Video de Picta"
+        
+        # Devolver toda la información recopilada
+        return {
+            'title': title,
+            'video_sources': found['video_sources'],
+            'audio_tracks': found['audio_tracks'],
+            'subtitles': found['subtitles']
+        }
+    
+    def _block_requests(self, driver):
+        """
+        Bloquea en la pestaña actual las imágenes, fuentes, métricas y anuncios,
+        y cancela las solicitudes de medios en cuanto se envían (por CDP).
+        
+        Args:
+            driver (WebDriver): Instancia del navegador Chrome
+            
+        Returns:
+            bool: True si el bloqueo quedó activo
+        """
+        execute_cdp_cmd = getattr(driver, 'execute_cdp_cmd', None)
+        if execute_cdp_cmd is None:
+            return False
+        try:
+            execute_cdp_cmd('Network.enable', {})
+            execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_RESOURCE_PATTERNS + BLOCKED_MEDIA_PATTERNS})
+            return True
+        except Exception as e:
+            print(f"No se pudieron bloquear las solicitudes del navegador: {e}")
+            return False
+    
+    def download_file(self, url, output_path, progress_signal=None):
+        """
+        Descarga un archivo desde una URL con seguimiento de progreso.
+        Si el servidor admite rangos, el archivo se divide en segmentos que se
+        descargan en paralelo; si no, se usa una sola conexión. Los errores de red
+        transitorios se reintentan continuando desde el último byte recibido.
+        
+        Args:
+            url (str): URL del archivo a descargar
+            output_path (str): Ruta donde guardar el archivo
+            progress_signal (pyqtSignal, opcional): Señal para reportar progreso
+            
+        Returns:
+            bool: True si la descarga fue exitosa, False en caso contrario
+        """
+        progress_callback = progress_signal.emit if progress_signal else None
+        # Descarga por rangos en paralelo (o con una sola conexión si no se admiten)
+        return self._download_track(url, output_path, progress_callback)
+
+    def run_download(self, manifest, output_dir, selection, custom_filename=None,
+                     status_callback=None, progress_callback=None, cancel_event=None):
+        """
+        Etapa de descarga: descarga las pistas elegidas de un manifiesto ya analizado
+        y las combina con FFmpeg. No abre el navegador.
+        
+        Args:
+            manifest (MediaManifest): Resultado de la etapa de análisis
+            output_dir (str): Directorio donde se guardará el video
+            selection (dict): Pistas elegidas ('video', y opcionalmente 'audio' y 'subtitles')
+            custom_filename (str, opcional): Nombre personalizado para el archivo
+            status_callback (callable, opcional): Función que recibe mensajes de estado
+            progress_callback (callable, opcional): Función (descargado, total) para el progreso
+            cancel_event (threading.Event, opcional): Evento que detiene la descarga
+            
+        Returns:
+            tuple: (éxito, ruta del archivo final o mensaje de error)
+            
+        Raises:
+            DownloadCancelled: Si cancel_event se activó durante la descarga
+        """
+        status = status_callback or (lambda message: None)
+        selected_video = selection.get('video')
+        selected_audio = selection.get('audio')
+        subtitles = selected_subtitles(selection)
+        if not selected_video:
+            return False, "No se seleccionó ninguna fuente de video."
+        
+        # Crear nombre de archivo seguro (sin caracteres problemáticos)
+        if custom_filename and custom_filename.strip():
+            # Usar nombre personalizado si se proporciona
+            safe_filename = re.sub(r'[^\w\-_\. ]', '_', custom_filename.strip())
+            if not safe_filename.lower().endswith('.mp4'):
+                safe_filename += '.mp4'
+            output_file = os.path.join(output_dir, safe_filename)
+        else:
+            # Usar título del video como nombre de archivo
+            safe_title = re.sub(r'[^\w\-_\. ]', '_', manifest.title)
+            output_file = os.path.join(output_dir, f"{safe_title}.mp4")
+        
+        # Cada trabajo usa su propio espacio de trabajo; el nombre depende del medio
+        # y de las pistas, así que una descarga interrumpida se reanuda desde sus datos
+        workspace = self.job_workspace(manifest, selection)
+        try:
+            success, result = self._download_in_workspace(
+                workspace, output_file, selected_video, selected_audio, subtitles,
+                status, progress_callback, cancel_event, self._url_resolver(manifest, status))
+        finally:
+            workspace.release()
+        if success:
+            # Limpiar los temporales solo cuando el video final existe;
+            # si algo falla se conservan para reanudar en el siguiente intento
+            workspace.remove()
+            status("¡Descarga completada!")
+        return success, result
+    
+    def _download_in_workspace(self, workspace, output_file, selected_video, selected_audio,
+                               subtitles, status, progress_callback=None, cancel_event=None,
+                               resolve=None):
+        """
+        Descarga y combina las pistas dentro de un espacio de trabajo.
+        resolve(tipo, pista) devuelve un enlace nuevo de una pista cuyo enlace caducó.
+        
+        Returns:
+            tuple: (éxito, ruta del archivo final o mensaje de error)
+            
+        Raises:
+            DownloadCancelled: Si cancel_event se activó durante la descarga
+        """
+        video_temp = workspace.file("video.mp4")
+        audio_temp = workspace.file("audio.m4a") if selected_audio else None
+        # Un archivo por pista de subtítulos (el primero conserva el nombre de siempre)
+        subtitle_files = []
+        for index, subtitle in enumerate(subtitles):
+            suffix = f"_{index + 1}" if index else ""
+            subtitle_files.append((subtitle, workspace.file(f"subtitle{suffix}.vtt"),
+                                   f"subtítulos {index + 1}" if index else "subtítulos"))
+        # El archivo final se escribe aparte y se renombra al terminar (nunca queda a medias)
+        staging_file = workspace.staging_path(output_file)
+        
+        # Comprobar el espacio libre antes de empezar, según el tamaño de cada pista
+        downloads = {"video.mp4": selected_video}
+        if selected_audio:
+            downloads["audio.m4a"] = selected_audio
+        # Las fuentes DASH/HLS por segmentos no se pueden sondear (se usa la estimación
+        # del manifiesto) ni combinar en streaming
+        segmented = any(manifest_type(track['url']) for track in downloads.values())
+        streaming = self.stream_mux and not segmented
+        with self.tracer.span("probe", tracks=len(downloads)) as span:
+            sizes = {name: self._track_size(track) for name, track in downloads.items()}
+            span.set(unknown=sum(1 for size in sizes.values() if not size))
+        try:
+            workspace.check_space({} if streaming else sizes, sum(filter(None, sizes.values())),
+                                  os.path.dirname(os.path.abspath(output_file)))
+        except InsufficientSpaceError as e:
+            status(str(e))
+            return False, str(e)
+        
+        if streaming:
+            mode = self._run_streaming(staging_file, workspace.path, selected_video, selected_audio,
+                                       subtitle_files, status, progress_callback, cancel_event, resolve)
+            if mode:
+                with self.tracer.span("commit"):
+                    workspace.commit(staging_file, output_file)
+                status(f"Archivos combinados en streaming ({mode}).")
+                return True, output_file
+        
+        # Las tres pistas vienen de URLs independientes: descargarlas a la vez
+        def refresher(kind, track):
+            return (lambda: resolve(kind, track)) if resolve else None
+        
+        tracks = [("video", selected_video['url'], video_temp, refresher('video', selected_video))]
+        if audio_temp:
+            tracks.append(("audio", selected_audio['url'], audio_temp, refresher('audio', selected_audio)))
+        for subtitle, path, name in subtitle_files:
+            tracks.append((name, subtitle['url'], path, refresher('subtitle', subtitle)))
+        
+        status(f"Descargando {', '.join(track[0] for track in tracks)}...")
+        results = self.download_tracks(tracks, progress_callback, cancel_event, status)
+        
+        if not results["video"]:
+            status("Error al descargar el video.")
+            return False, "Error al descargar el video."
+        
+        if audio_temp and not results["audio"]:
+            status("Error al descargar el audio.")
+            audio_temp = None  # No combinar un archivo incompleto
+        
+        # No combinar archivos de subtítulos incompletos
+        for _, _, name in subtitle_files:
+            if not results[name]:
+                status(f"Error al descargar los {name}.")
+        subtitle_files = [item for item in subtitle_files if results[item[2]]]
+        subtitle_paths = [path for _, path, _ in subtitle_files]
+        subtitle_languages = [language_code(subtitle.get('language')) for subtitle, _, _ in subtitle_files]
+        
+        # Combinar archivos con FFmpeg; los flujos se copian salvo que el contenedor no los admita
+        status("Combinando archivos...")
+        mux_size = sum(os.path.getsize(path) for path in (video_temp, audio_temp) if path)
+        
+        def mux_progress(done, total):
+            # FFmpeg informa en microsegundos; se pasa a bytes para que la velocidad tenga sentido
+            if progress_callback and total:
+                progress_callback(min(mux_size, done * mux_size // total), mux_size)
+        
+        try:
+            with self.tracer.span("mux", subtitles=len(subtitle_paths)) as span:
+                mode = mux_tracks(staging_file, video_temp, audio_temp, subtitle_paths, status,
+                                  mux_progress, cancel_event, subtitle_languages)
+                span.set(mode=mode)
+                span.add_bytes(mux_size)
+            with self.tracer.span("commit"):
+                workspace.commit(staging_file, output_file)
+        except DownloadCancelled:
+            # Las pistas quedan descargadas: al reanudar solo se repite la combinación
+            raise
+        except FFmpegError as e:
+            status(f"Error al ejecutar FFmpeg: {e}")
+            print(f"FFmpeg stderr: {e.log}")
+            return False, f"Error al ejecutar FFmpeg: {e}"
+        except Exception as e:
+            status(f"Error al combinar archivos: {e}")
+            return False, f"Error al combinar archivos: {e}"
+        status(f"Archivos combinados ({mode}).")
+        return True, output_file
+    
+    def _track_size(self, track):
+        """
+        Tamaño de una pista para comprobar el espacio libre: la estimación del
+        manifiesto en las fuentes por segmentos y el sondeo en las demás.
+        Si el sondeo falla, el tamaño queda como desconocido (check_space no lo
+        cuenta); si el error persiste, lo trata la descarga con su política de
+        reintentos.
+        
+        Args:
+            track (dict): Pista de video o audio
+            
+        Returns:
+            int: Tamaño en bytes, o None si no se conoce
+        """
+        if manifest_type(track['url']):
+            return track.get('size')
+        try:
+            return probe_resource(self.session, track['url'], self.headers)['size']
+        except Exception as e:
+            print(f"No se pudo conocer el tamaño de {track['url']}: {e}")
+            return None
+    
+    def _run_streaming(self, output_file, work_dir, selected_video, selected_audio, subtitle_files,
+                       status, progress_callback=None, cancel_event=None, resolve=None):
+        """
+        Intenta descargar y combinar las pistas en una sola pasada.
+        
+        Returns:
+            str: Modo de combinación usado, o None si hay que usar archivos temporales
+            
+        Raises:
+            DownloadCancelled: Si cancel_event se activó durante la descarga
+        """
+        # Los subtítulos son pequeños: se descargan antes como archivos
+        subtitle_paths = []
+        subtitle_languages = []
+        for subtitle, path, name in subtitle_files:
+            refresh = (lambda subtitle=subtitle: resolve('subtitle', subtitle)) if resolve else None
+            if self._download_track(subtitle['url'], path, None, cancel_event, refresh, status, name):
+                subtitle_paths.append(path)
+                subtitle_languages.append(language_code(subtitle.get('language')))
+        
+        status("Descargando y combinando a la vez...")
+        received = [0]
+        
+        def progress(downloaded, total):
+            received[0] = downloaded
+            if progress_callback:
+                progress_callback(downloaded, total)
+        
+        try:
+            with self.tracer.span("mux.stream") as span:
+                try:
+                    mode = self.streaming_muxer.mux(output_file, work_dir, selected_video['url'],
+                                                    selected_audio['url'] if selected_audio else None,
+                                                    subtitle_paths, status, progress, cancel_event,
+                                                    subtitle_languages)
+                    span.set(mode=mode)
+                    return mode
+                finally:
+                    span.add_bytes(received[0])
+        except DownloadCancelled:
+            raise
+        except Exception as e:
+            print(f"Combinación en streaming no disponible: {getattr(e, 'log', '') or e}")
+            status(f"No se pudo combinar en streaming ({e}); se usarán archivos temporales.")
+            return None
+    
+    def download_tracks(self, tracks, progress_callback=None, cancel_event=None, status_callback=None):
+        """
+        Descarga varias pistas de un mismo trabajo en paralelo.
+        El progreso se informa como el total de bytes de todas las pistas.
+        
+        Args:
+            tracks (list): Tuplas (nombre, url, ruta de salida) y, opcionalmente, una función
+                sin argumentos que devuelve un enlace nuevo si el de la pista caducó
+            progress_callback (callable, opcional): Función (descargado, total) para el progreso combinado
+            cancel_event (threading.Event, opcional): Evento que detiene todas las pistas
+            status_callback (callable, opcional): Función que recibe los avisos de reintento
+            
+        Returns:
+            dict: Resultado (bool) de cada pista por nombre
+            
+        Raises:
+            DownloadCancelled: Si cancel_event se activó durante la descarga
+        """
+        progress = CombinedProgress(progress_callback)
+        with ThreadPoolExecutor(max_workers=max(1, len(tracks))) as executor:
+            # Cada pista se mide en su hilo, pero sus tramos siguen siendo del trabajo
+            download_track = self.tracer.bind(self._download_track)
+            futures = {
+                name: executor.submit(download_track, url, output_path, progress.track(name),
+                                      cancel_event, refresh[0] if refresh else None, status_callback, name)
+                for name, url, output_path, *refresh in tracks
+            }
+            # Esperar a que terminen todas las entradas antes de combinarlas
+            return {name: future.result() for name, future in futures.items()}
+    
+    def _download_track(self, url, output_path, progress_callback, cancel_event=None, refresh=None,
+                        status_callback=None, description=None):
+        """
+        Descarga una pista según la política de reintentos: por rangos si es un
+        archivo y segmento a segmento si es una fuente DASH/HLS.
+        Los errores definitivos no se propagan (salvo la cancelación): devuelve False.
+        """
+        adaptive = manifest_type(url) is not None
+        downloader = self.adaptive_downloader if adaptive else self.segmented_downloader
+        journal = (SegmentJournal if adaptive else DownloadJournal).load(output_path)
+        resumed = journal.completed_bytes if journal else 0
+        received = [resumed]
+        
+        def progress(downloaded, total):
+            received[0] = downloaded
+            if progress_callback:
+                progress_callback(downloaded, total)
+        
+        def attempt(current_url):
+            # El diario conserva lo ya descargado: cada intento pide solo lo que falta
+            return downloader.download(current_url, output_path, progress, cancel_event)
+        
+        description = description or os.path.basename(output_path)
+        with self.tracer.span("download.track", track=description, resumed_bytes=resumed) as span:
+            try:
+                return self.retry_policy.run(attempt, url, refresh, cancel_event, status_callback, description)
+            except DownloadCancelled:
+                raise
+            except Exception as e:
+                span.error = type(e).__name__
+                print(f"Error al descargar {url}: {e}")
+                return False
+            finally:
+                span.add_bytes(max(0, received[0] - resumed))
+    
+    def _url_resolver(self, manifest, status):
+        """
+        Crea la función que renueva los enlaces caducados de una descarga.
+        Todas las pistas comparten un único análisis nuevo; solo se repite si el
+        anterior tiene más de URL_REFRESH_INTERVAL segundos.
+        
+        Args:
+            manifest (MediaManifest): Manifiesto con los enlaces originales
+            status (callable): Función que recibe mensajes de estado
+            
+        Returns:
+            callable: Función (tipo, pista) -> URL nueva o None
+        """
+        lock = threading.Lock()
+        fresh = {'manifest': None, 'time': 0.0}
+        
+        def resolve(kind, track):
+            with lock:
+                if fresh['manifest'] is None or time.monotonic() - fresh['time'] > URL_REFRESH_INTERVAL:
+                    status("Renovando los enlaces del video...")
+                    self.manifest_cache.invalidate(manifest.url)
+                    fresh['manifest'] = self.analyze(manifest.url, status, use_cache=False)
+                    fresh['time'] = time.monotonic()
+                current = fresh['manifest']
+            new_track = current.find_track(kind, track) if current else None
+            return new_track['url'] if new_track else None
+        
+        return resolve
+
+def analyze_job(job, status_callback):
+    """
+    Etapa de análisis de un trabajo de la cola.
+    
+    Args:
+        job (Job): Trabajo a analizar
+        status_callback (callable): Función que recibe mensajes de estado
+        
+    Returns:
+        MediaManifest: Manifiesto del video, o None si no se encontraron fuentes
+    """
+    return PictaDownloader().analyze(job.url, status_callback)
+
+def download_job(job, status_callback, progress_callback, cancel_event, stream_mux=False, temp_root=None):
+    """
+    Etapa de descarga de un trabajo de la cola.
+    Si el trabajo no trae pistas elegidas se resuelven con su política de selección.
+    
+    Args:
+        job (Job): Trabajo ya analizado
+        status_callback (callable): Función que recibe mensajes de estado
+        progress_callback (callable): Función (descargado, total) para el progreso
+        cancel_event (threading.Event): Evento que detiene la descarga (pausa o cancelación)
+        stream_mux (bool, opcional): Combinar las pistas mientras se descargan
+        temp_root (str, opcional): Directorio de los archivos temporales
+        
+    Returns:
+        tuple: (éxito, ruta del archivo final o mensaje de error)
+    """
+    selection = job.selection or policy_from_dict(job.policy).resolve(job.manifest)
+    return PictaDownloader(stream_mux, temp_root).run_download(job.manifest, job.output_dir, selection, job.custom_filename,
+                                          status_callback, progress_callback, cancel_event)
+
+def discard_job(job, temp_root=None):
+    """
+    Borra los archivos temporales de un trabajo cancelado.
+    
+    Args:
+        job (Job): Trabajo cancelado
+        temp_root (str, opcional): Directorio de los archivos temporales
+    """
+    selection = job.selection or policy_from_dict(job.policy).resolve(job.manifest)
+    PictaDownloader(temp_root=temp_root).discard_workspace(job.manifest, selection)
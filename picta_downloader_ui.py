@@ -1,398 +1,114 @@
 import os
 import re
-import json
-import time
 import sys
-import requests
-import tempfile
-import subprocess
-import threading
-from urllib.parse import urlparse, unquote
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+import json
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QLineEdit, QPushButton, QProgressBar, QComboBox, 
-                            QFileDialog, QMessageBox, QTextEdit, QGroupBox)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, pyqtSlot
+                            QFileDialog, QMessageBox, QTextEdit, QGroupBox, QTableWidget,
+                            QTableWidgetItem, QHeaderView, QAbstractItemView, QInputDialog)
+from PyQt5.QtCore import Qt, QObject, QThread, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QIcon, QFont
+from picta_downloader import PictaDownloader, analyze_job, download_job, discard_job
+from workspace import WorkspaceManager
+from job_queue import JobQueue, COMPLETED, FAILED, CANCELLED, DOWNLOADING
+from progress import format_speed, format_eta
+from tracing import get_tracer
+from media_probe import describe_track
+from selection import ManualSelection
 
-class DownloaderThread(QThread):
+class AnalyzerThread(QThread):
     """
-    Hilo de descarga que maneja todo el proceso de extracción y descarga de videos.
-    Utiliza señales para comunicarse con la interfaz de usuario.
+    Hilo de análisis que extrae la información del video sin descargar nada.
+    Produce un MediaManifest reutilizable por la etapa de descarga.
     """
     # Señales para comunicación con la interfaz de usuario
-    progress_signal = pyqtSignal(int, int)      # Señal para actualizar el progreso (valor actual, total)
     status_signal = pyqtSignal(str)             # Señal para actualizar el estado textual
     finished_signal = pyqtSignal(bool, str)     # Señal para indicar finalización (éxito, mensaje)
-    video_info_signal = pyqtSignal(dict)        # Señal para enviar información del video
-    
-    def __init__(self, url, output_dir, custom_filename=None):
+    manifest_signal = pyqtSignal(object)        # Señal para enviar el manifiesto del video
+
+    def __init__(self, url, use_cache=True):
         """
-        Inicializa el hilo de descarga con los parámetros necesarios.
-        
+        Inicializa el hilo de análisis.
+
         Args:
             url (str): URL del video de Picta
-            output_dir (str): Directorio donde se guardará el video
-            custom_filename (str, opcional): Nombre personalizado para el archivo
+            use_cache (bool, opcional): Reutilizar un manifiesto en caché si existe
         """
         super().__init__()
         self.url = url
-        self.output_dir = output_dir
-        self.custom_filename = custom_filename
+        self.use_cache = use_cache
         self.downloader = PictaDownloader()
-        self.video_info = None
-        self.selected_video = None
-        self.selected_audio = None
-        self.selected_subtitle = None
-        self.output_file = None
-        
+
     def run(self):
         """
         Método principal que se ejecuta cuando se inicia el hilo.
-        Maneja todo el proceso de extracción y descarga del video.
+        Extrae la información del video y la envía a la interfaz.
         """
         try:
-            # Convertir URL de formato /medias/ a /embed/ si es necesario
-            # (El formato /embed/ es necesario para extraer correctamente la información)
-            if "/medias/" in self.url:
-                self.url = self.url.replace("/medias/", "/embed/")
-                self.status_signal.emit(f"Convertido URL a formato embed: {self.url}")
-            
-            self.status_signal.emit("Configurando navegador...")
-            driver = self.downloader.setup_browser()
-            
-            try:
-                self.status_signal.emit("Obteniendo información del video...")
-                # Extraer información del video analizando las solicitudes de red
-                self.video_info = self.downloader.extract_network_requests(driver, self.url)
-                
-                # Verificar si se encontró información válida
-                if not self.video_info or not self.video_info['video_sources']:
-                    self.status_signal.emit("No se pudo encontrar información del video.")
-                    self.finished_signal.emit(False, "No se encontraron fuentes de video.")
-                    return
-                
-                # Enviar información del video a la interfaz
-                self.video_info_signal.emit(self.video_info)
-                
-                # Esperar a que el usuario seleccione las opciones de descarga
-                while not self.selected_video:
-                    time.sleep(0.5)
-                
-                # Crear nombre de archivo seguro (sin caracteres problemáticos)
-                if self.custom_filename and self.custom_filename.strip():
-                    # Usar nombre personalizado si se proporciona
-                    safe_filename = re.sub(r'[^\w\-_\. ]', '_', self.custom_filename.strip())
-                    if not safe_filename.lower().endswith('.mp4'):
-                        safe_filename += '.mp4'
-                    self.output_file = os.path.join(self.output_dir, safe_filename)
-                else:
-                    # Usar título del video como nombre de archivo
-                    safe_title = re.sub(r'[^\w\-_\. ]', '_', self.video_info['title'])
-                    self.output_file = os.path.join(self.output_dir, f"{safe_title}.mp4")
-                
-                # Descargar archivos temporales (video, audio, subtítulos)
-                self.status_signal.emit("Descargando video...")
-                video_temp = os.path.join(self.downloader.temp_dir, "video.mp4")
-                if not self.downloader.download_file(self.selected_video['url'], video_temp, self.progress_signal):
-                    self.status_signal.emit("Error al descargar el video.")
-                    self.finished_signal.emit(False, "Error al descargar el video.")
-                    return
-                
-                # Descargar audio si está seleccionado
-                audio_temp = None
-                if self.selected_audio:
-                    self.status_signal.emit("Descargando audio...")
-                    audio_temp = os.path.join(self.downloader.temp_dir, "audio.m4a")
-                    if not self.downloader.download_file(self.selected_audio['url'], audio_temp, self.progress_signal):
-                        self.status_signal.emit("Error al descargar el audio.")
-                
-                # Descargar subtítulos si están seleccionados
-                subtitle_temp = None
-                if self.selected_subtitle:
-                    self.status_signal.emit("Descargando subtítulos...")
-                    subtitle_temp = os.path.join(self.downloader.temp_dir, "subtitle.vtt")
-                    if not self.downloader.download_file(self.selected_subtitle['url'], subtitle_temp, self.progress_signal):
-                        self.status_signal.emit("Error al descargar los subtítulos.")
-                
-                # Combinar archivos con FFmpeg para crear el video final
-                self.status_signal.emit("Combinando archivos...")
-                try:
-                    # Construir comando FFmpeg según los componentes disponibles
-                    ffmpeg_cmd = ['ffmpeg', '-i', video_temp]
-                    
-                    if audio_temp:
-                        ffmpeg_cmd.extend(['-i', audio_temp])
-                    
-                    ffmpeg_cmd.extend(['-c:v', 'copy'])  # Copiar video sin recodificar
-                    
-                    if audio_temp:
-                        # Mapear video del primer input y audio del segundo
-                        ffmpeg_cmd.extend(['-c:a', 'aac', '-map', '0:v', '-map', '1:a'])
-                    else:
-                        # Si no hay audio separado, copiar el audio del video
-                        ffmpeg_cmd.extend(['-c:a', 'copy'])
-                    
-                    if subtitle_temp:
-                        # Añadir subtítulos si están disponibles
-                        ffmpeg_cmd.extend(['-i', subtitle_temp, '-c:s', 'mov_text', '-map', '2'])
-                    
-                    # Especificar archivo de salida y sobrescribir si existe
-                    ffmpeg_cmd.extend(['-y', self.output_file])
-                    
-                    # Imprimir comando para depuración
-                    print(f"Executing command: {' '.join(ffmpeg_cmd)}")
-                    
-                    # Ejecutar FFmpeg
-                    result = subprocess.run(ffmpeg_cmd, check=True, capture_output=True, text=True)
-                    
-                    if result.stderr:
-                        print(f"FFmpeg stderr: {result.stderr}")
-                    
-                    self.status_signal.emit("¡Descarga completada!")
-                    self.finished_signal.emit(True, self.output_file)
-                    
-                except subprocess.CalledProcessError as e:
-                    self.status_signal.emit(f"Error al ejecutar FFmpeg: {e}")
-                    print(f"FFmpeg stderr: {e.stderr}")
-                    self.finished_signal.emit(False, f"Error al ejecutar FFmpeg: {e}")
-                except Exception as e:
-                    self.status_signal.emit(f"Error al combinar archivos: {e}")
-                    self.finished_signal.emit(False, f"Error al combinar archivos: {e}")
-                finally:
-                    # Limpiar archivos temporales
-                    if os.path.exists(video_temp):
-                        os.remove(video_temp)
-                    if audio_temp and os.path.exists(audio_temp):
-                        os.remove(audio_temp)
-                    if subtitle_temp and os.path.exists(subtitle_temp):
-                        os.remove(subtitle_temp)
-            
-            finally:
-                # Cerrar el navegador
-                driver.quit()
-                
+            manifest = self.downloader.analyze(self.url, self.status_signal.emit, self.use_cache)
+
+            # Verificar si se encontró información válida
+            if not manifest or not manifest.has_video:
+                self.status_signal.emit("No se pudo encontrar información del video.")
+                self.finished_signal.emit(False, "No se encontraron fuentes de video.")
+                return
+
+            # Enviar el manifiesto a la interfaz
+            self.manifest_signal.emit(manifest)
+            self.finished_signal.emit(True, manifest.title)
+
         except Exception as e:
             self.status_signal.emit(f"Error: {e}")
             self.finished_signal.emit(False, f"Error: {e}")
 
-class PictaDownloader:
+class QueueBridge(QObject):
     """
-    Clase principal que maneja la extracción de información y descarga de archivos.
-    Utiliza Selenium para extraer información y requests para descargar archivos.
+    Puente entre la cola de trabajos y la interfaz.
+    La cola notifica desde sus hilos; la señal entrega los cambios en el hilo de Qt.
     """
-    def __init__(self):
-        """Inicializa el descargador con la configuración necesaria."""
-        self.session = requests.Session()
-        self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        }
-        self.base_url = "https://www.picta.cu"
-        self.temp_dir = tempfile.mkdtemp()  # Directorio temporal para archivos intermedios
-        
-    def setup_browser(self):
-        """
-        Configura el navegador Chrome para capturar solicitudes de red.
-        
-        Returns:
-            WebDriver: Instancia configurada del navegador Chrome
-        """
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")  # Ejecutar en modo sin cabeza (sin interfaz gráfica)
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        
-        # Habilitar registro de red (crucial para capturar las URLs de los archivos)
-        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
-        
-        # Instalar y configurar el driver de Chrome
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        return driver
-        
-    def extract_network_requests(self, driver, url):
-        """
-        Extrae solicitudes de red para encontrar archivos de video, audio y subtítulos.
-        
-        Args:
-            driver (WebDriver): Instancia del navegador Chrome
-            url (str): URL del video de Picta
-            
-        Returns:
-            dict: Información del video incluyendo fuentes de video, audio y subtítulos
-        """
-        driver.get(url)
-        
-        # Esperar a que se cargue el reproductor de video
-        try:
-            WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "video"))
-            )
-        except Exception as e:
-            print(f"Error al esperar el reproductor de video: {e}")
-        
-        # Dar tiempo para que se inicien las solicitudes de red
-        time.sleep(5)
-        
-        # Hacer clic en el reproductor para iniciar la reproducción
-        # (necesario para que se carguen todos los recursos)
-        try:
-            video_element = driver.find_element(By.CSS_SELECTOR, "video")
-            driver.execute_script("arguments[0].play();", video_element)
-            time.sleep(3)  # Esperar a que comience la reproducción
-        except Exception as e:
-            print(f"Error al iniciar la reproducción: {e}")
-        
-        # Extraer el título del video de la página
-        try:
-            title_element = driver.find_element(By.CSS_SELECTOR, "h1.title")
-            title = title_element.text.strip()
-        except:
-            try:
-                title_element = driver.find_element(By.CSS_SELECTOR, "h1")
-                title = title_element.text.strip()
-            except:
-                title = "Video de Picta"
-        
-        # Analizar los registros de rendimiento para encontrar solicitudes de red
-        logs = driver.get_log('performance')
-        
-        video_sources = []
-        audio_tracks = []
-        subtitle_tracks = []
-        
-        # Procesar cada entrada de log para identificar recursos multimedia
-        for log in logs:
-            try:
-                log_entry = json.loads(log["message"])["message"]
-                if "Network.responseReceived" in log_entry["method"]:
-                    request_url = log_entry["params"]["response"]["url"]
-                    
-                    # Buscar archivos de video por patrones en la URL
-                    if "video%2F" in request_url and request_url.endswith(".mp4"):
-                        quality = "Unknown"
-                        if "480p" in request_url:
-                            quality = "480p"
-                        elif "720p" in request_url:
-                            quality = "720p"
-                        elif "1080p" in request_url:
-                            quality = "1080p"
-                        
-                        video_sources.append({
-                            'url': request_url,
-                            'quality': quality,
-                            'type': 'video/mp4'
-                        })
-                    
-                    # Buscar archivos de audio por patrones en la URL
-                    if "audio%2F" in request_url and request_url.endswith(".mp4"):
-                        language = "Desconocido"
-                        if "eng" in request_url:
-                            language = "Inglés"
-                        elif "spa" in request_url or "es" in request_url:
-                            language = "Español"
-                        
-                        bitrate = "Unknown"
-                        if "128k" in request_url:
-                            bitrate = "128k"
-                        elif "192k" in request_url:
-                            bitrate = "192k"
-                        
-                        audio_tracks.append({
-                            'url': request_url,
-                            'language': f"{language} ({bitrate})"
-                        })
-                    
-                    # Buscar archivos de subtítulos por extensión
-                    if request_url.endswith(".vtt") or request_url.endswith(".srt"):
-                        language = "Desconocido"
-                        if "eng" in request_url:
-                            language = "Inglés"
-                        elif "spa" in request_url or "es" in request_url:
-                            language = "Español"
-                        
-                        subtitle_tracks.append({
-                            'url': request_url,
-                            'language': language
-                        })
-            except Exception as e:
-                continue
-        
-        # Eliminar duplicados en las listas de recursos
-        video_sources = [dict(t) for t in {tuple(d.items()) for d in video_sources}]
-        audio_tracks = [dict(t) for t in {tuple(d.items()) for d in audio_tracks}]
-        subtitle_tracks = [dict(t) for t in {tuple(d.items()) for d in subtitle_tracks}]
-        
-        # Devolver toda la información recopilada
-        return {
-            'title': title,
-            'video_sources': video_sources,
-            'audio_tracks': audio_tracks,
-            'subtitles': subtitle_tracks
-        }
-    
-    def download_file(self, url, output_path, progress_signal=None):
-        """
-        Descarga un archivo desde una URL con seguimiento de progreso.
-        
-        Args:
-            url (str): URL del archivo a descargar
-            output_path (str): Ruta donde guardar el archivo
-            progress_signal (pyqtSignal, opcional): Señal para reportar progreso
-            
-        Returns:
-            bool: True si la descarga fue exitosa, False en caso contrario
-        """
-        try:
-            response = self.session.get(url, headers=self.headers, stream=True)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
-            block_size = 1024  # 1 KB
-            downloaded = 0
-            
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=block_size):
-                    if chunk:  # filtrar chunks de keep-alive
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        
-                        # Enviar señal de progreso si está disponible
-                        if progress_signal and total_size > 0:
-                            progress_signal.emit(downloaded, total_size)
-            
-            return True
-        except Exception as e:
-            print(f"Error al descargar {url}: {e}")
-            return False
+    job_signal = pyqtSignal(dict)               # Señal con la copia actualizada de un trabajo
+    progress_signal = pyqtSignal(list, dict)    # Señal con el progreso de las descargas y el total
 
 class PictaDownloaderUI(QMainWindow):
     """
     Interfaz gráfica principal de la aplicación.
     Permite al usuario interactuar con el descargador de videos.
+    Es un cliente más de la cola de trabajos: añade trabajos y muestra su estado.
     """
-    def __init__(self):
-        """Inicializa la ventana principal y configura la interfaz."""
+    # Columnas de la tabla de la cola
+    QUEUE_COLUMNS = ["Título", "Estado", "Progreso", "Prioridad"]
+    PROGRESS_MESSAGE_TIMEOUT = 2000     # Milisegundos que se muestra la velocidad total sin muestras nuevas
+    
+    def __init__(self, job_queue):
+        """
+        Inicializa la ventana principal y configura la interfaz.
+        
+        Args:
+            job_queue (JobQueue): Cola de trabajos compartida
+        """
         super().__init__()
         self.setWindowTitle("Picta Downloader")
-        self.setMinimumSize(700, 500)
+        self.setMinimumSize(700, 650)
+        
+        # Variables de estado
+        self.analyzer_thread = None
+        self.manifest = None
+        self.job_queue = job_queue
+        self.current_job_id = None      # Último trabajo añadido desde el formulario
+        self.job_rows = {}              # Fila de la tabla de cada trabajo
+        self.job_states = {}            # Último estado conocido de cada trabajo
         
         # Configuración de la interfaz
         self.init_ui()
         
-        # Variables de estado
-        self.downloader_thread = None
-        self.video_info = None
+        # Recibir los cambios de la cola en el hilo de la interfaz
+        self.queue_bridge = QueueBridge()
+        self.queue_bridge.job_signal.connect(self.update_job)
+        self.job_queue.subscribe(self.queue_bridge.job_signal.emit)
+        self.queue_bridge.progress_signal.connect(self.update_jobs_progress)
+        self.job_queue.subscribe_progress(self.queue_bridge.progress_signal.emit)
+        for job in self.job_queue.jobs():
+            self.update_job(job)
         
     def init_ui(self):
         """Configura todos los elementos de la interfaz de usuario."""
@@ -414,7 +130,7 @@ class PictaDownloaderUI(QMainWindow):
         
         # Botón para analizar la URL
         self.analyze_button = QPushButton("Analizar")
-        self.analyze_button.clicked.connect(self.analyze_url)
+        self.analyze_button.clicked.connect(lambda: self.analyze_url())
         url_layout.addWidget(self.analyze_button)
         
         # Botón para recargar la información (útil si hay problemas)
@@ -491,16 +207,48 @@ class PictaDownloaderUI(QMainWindow):
         self.progress_bar.setValue(0)
         main_layout.addWidget(self.progress_bar)
         
+        # Grupo de la cola de trabajos
+        queue_group = QGroupBox("Cola de Descargas")
+        queue_layout = QVBoxLayout()
+        
+        self.queue_table = QTableWidget(0, len(self.QUEUE_COLUMNS))
+        self.queue_table.setHorizontalHeaderLabels(self.QUEUE_COLUMNS)
+        self.queue_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.queue_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.queue_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.queue_table.verticalHeader().setVisible(False)
+        queue_layout.addWidget(self.queue_table)
+        
+        # Botones para gestionar los trabajos de la cola
+        queue_buttons = QHBoxLayout()
+        for text, handler in (("Añadir URLs...", self.add_urls),
+                              ("Pausar", lambda: self.apply_to_selected_jobs(self.job_queue.pause)),
+                              ("Reanudar", lambda: self.apply_to_selected_jobs(self.job_queue.resume)),
+                              ("Cancelar", lambda: self.apply_to_selected_jobs(self.job_queue.cancel)),
+                              ("Subir prioridad", self.raise_priority),
+                              ("Limpiar terminados", self.clear_finished_jobs),
+                              ("Exportar tiempos...", self.export_trace)):
+            button = QPushButton(text)
+            button.clicked.connect(lambda checked=False, h=handler: h())
+            queue_buttons.addWidget(button)
+        queue_layout.addLayout(queue_buttons)
+        
+        queue_group.setLayout(queue_layout)
+        main_layout.addWidget(queue_group)
+        
         # Área de texto para mostrar mensajes de estado
         self.status_text = QTextEdit()
         self.status_text.setReadOnly(True)
         self.status_text.setMaximumHeight(100)
         main_layout.addWidget(self.status_text)
         
-    def analyze_url(self):
+    def analyze_url(self, use_cache=True):
         """
         Analiza la URL ingresada para extraer información del video.
-        Inicia un hilo de descarga para el análisis.
+        Inicia un hilo de análisis que no descarga nada.
+        
+        Args:
+            use_cache (bool, opcional): Reutilizar un manifiesto en caché si existe
         """
         url = self.url_input.text().strip()
         if not url:
@@ -516,28 +264,30 @@ class PictaDownloaderUI(QMainWindow):
         self.analyze_button.setEnabled(False)
         self.status_text.append("Analizando URL...")
         
-        # Iniciar hilo de descarga para análisis (sin descargar, solo extraer info)
-        self.downloader_thread = DownloaderThread(url, self.output_dir_input.text())
-        self.downloader_thread.status_signal.connect(self.update_status)
-        self.downloader_thread.video_info_signal.connect(self.update_video_info)
-        self.downloader_thread.finished_signal.connect(self.analysis_finished)
-        self.downloader_thread.start()
+        # Iniciar hilo de análisis (sin descargar, solo extraer info)
+        self.analyzer_thread = AnalyzerThread(url, use_cache)
+        self.analyzer_thread.status_signal.connect(self.update_status)
+        self.analyzer_thread.manifest_signal.connect(self.update_video_info)
+        self.analyzer_thread.finished_signal.connect(self.analysis_finished)
+        self.analyzer_thread.start()
     
     def reload_url(self):
         """
         Recarga la información del video desde la URL actual.
         Útil si la carga inicial falló o si se quiere actualizar la información.
+        Ignora la caché de manifiestos para forzar una nueva extracción.
         """
-        self.analyze_url()  # Reutilizamos el método de análisis
+        self.analyze_url(use_cache=False)  # Reutilizamos el método de análisis
     
-    def update_video_info(self, video_info):
+    def update_video_info(self, manifest):
         """
         Actualiza la interfaz con la información del video extraída.
         
         Args:
-            video_info (dict): Información del video incluyendo título y fuentes
+            manifest (MediaManifest): Manifiesto con el título y las fuentes del video
         """
-        self.video_info = video_info
+        self.manifest = manifest
+        video_info = manifest.video_info
         
         # Actualizar título mostrado
         self.title_label.setText(f"Título: {video_info['title']}")
@@ -549,19 +299,21 @@ class PictaDownloaderUI(QMainWindow):
         # Actualizar opciones de calidad de video en el combo box
         self.video_quality_combo.clear()
         for source in video_info['video_sources']:
-            self.video_quality_combo.addItem(source['quality'], source)
+            self.video_quality_combo.addItem(self._track_label(source['quality'], source), source)
         
         # Actualizar opciones de audio en el combo box
         self.audio_track_combo.clear()
         self.audio_track_combo.addItem("Ninguno", None)
         for track in video_info['audio_tracks']:
-            self.audio_track_combo.addItem(track['language'], track)
+            self.audio_track_combo.addItem(self._track_label(track['language'], track), track)
         
         # Actualizar opciones de subtítulos en el combo box
         self.subtitle_combo.clear()
-        self.subtitle_combo.addItem("Ninguno", None)
+        self.subtitle_combo.addItem("Ninguno", [])
+        if len(video_info['subtitles']) > 1:
+            self.subtitle_combo.addItem("Todos", list(video_info['subtitles']))
         for subtitle in video_info['subtitles']:
-            self.subtitle_combo.addItem(subtitle['language'], subtitle)
+            self.subtitle_combo.addItem(subtitle['language'], [subtitle])
         
         # Habilitar opciones y botón de descarga
         self.options_group.setEnabled(True)
@@ -583,15 +335,20 @@ class PictaDownloaderUI(QMainWindow):
     def start_download(self):
         """
         Inicia el proceso de descarga con las opciones seleccionadas.
-        Crea un nuevo hilo de descarga con la configuración actual.
+        Añade a la cola un trabajo que reutiliza el manifiesto ya analizado.
         """
-        if not self.video_info:
+        if not self.manifest:
+            return
+        
+        # El manifiesto solo es válido para la URL que se analizó
+        url = self.url_input.text().strip()
+        if not self.manifest.matches_url(url):
+            QMessageBox.warning(self, "Error", "La URL cambió. Por favor, analízala de nuevo.")
             return
         
         # Obtener opciones seleccionadas de los combo boxes
         video_index = self.video_quality_combo.currentIndex()
         audio_index = self.audio_track_combo.currentIndex()
-        subtitle_index = self.subtitle_combo.currentIndex()
         
         if video_index < 0:
             QMessageBox.warning(self, "Error", "Por favor, selecciona una calidad de video.")
@@ -600,28 +357,178 @@ class PictaDownloaderUI(QMainWindow):
         # Obtener nombre de archivo personalizado si se proporcionó
         custom_filename = self.custom_filename_input.text().strip()
         
-        # Crear un nuevo hilo de descarga con las opciones seleccionadas
-        url = self.url_input.text().strip()
-        self.downloader_thread = DownloaderThread(url, self.output_dir
+        # La elección manual es una política más: se resuelve con el manifiesto ya analizado
+        policy = ManualSelection(
+            self.video_quality_combo.currentData(),
+            self.audio_track_combo.currentData() if audio_index > 0 else None,
+            self.subtitle_combo.currentData() or [],
+        )
+        job = self.job_queue.add(
+            url,
+            self.output_dir_input.text(),
+            custom_filename=custom_filename,
+            manifest=self.manifest,
+            policy=policy,
+        )
+        self.current_job_id = job.id
+        self.progress_bar.setValue(0)
+        self.update_status(f"Añadido a la cola: {self.manifest.title}")
+    
+    def add_urls(self):
+        """
+        Añade varias URLs a la cola (una por línea), por ejemplo los capítulos de una serie.
+        Se analizan y descargan sin intervención con la selección por defecto.
+        """
+        text, accepted = QInputDialog.getMultiLineText(self, "Añadir URLs", "Una URL de Picta por línea:")
+        if not accepted:
+            return
+        urls = [line.strip() for line in text.splitlines() if line.strip()]
+        valid = [url for url in urls if url.startswith("https://www.picta.cu/medias/")
+                 or url.startswith("https://www.picta.cu/embed/")]
+        if len(valid) != len(urls):
+            QMessageBox.warning(self, "Error", "Se ignoraron las URLs que no son de picta.cu/medias/ o picta.cu/embed/")
+        self.job_queue.add_many(valid, self.output_dir_input.text())
+        self.update_status(f"Añadidas {len(valid)} URLs a la cola.")
+    
+    def selected_job_ids(self):
+        """
+        Devuelve los trabajos seleccionados en la tabla de la cola.
         
-        # Configurar opciones en el hilo de descarga
-        self.downloader_thread.selected_video = self.video_quality_combo.currentData()
-        self.downloader_thread.selected_audio = self.audio_track_combo.currentData() if audio_index > 0 else None
-        self.downloader_thread.selected_subtitle = self.subtitle_combo.currentData() if subtitle_index > 0 else None
+        Returns:
+            list: Identificadores de los trabajos seleccionados
+        """
+        rows = {index.row() for index in self.queue_table.selectionModel().selectedRows()}
+        return [job_id for job_id, row in self.job_rows.items() if row in rows]
+    
+    def apply_to_selected_jobs(self, action):
+        """
+        Aplica una acción de la cola (pausar, reanudar, cancelar) a los trabajos seleccionados.
         
-        # Conectar señales para actualizar la interfaz durante la descarga
-        self.downloader_thread.status_signal.connect(self.update_status)
-        self.downloader_thread.progress_signal.connect(self.update_progress)
-        self.downloader_thread.finished_signal.connect(self.download_finished)
+        Args:
+            action (callable): Método de la cola que recibe el identificador del trabajo
+        """
+        for job_id in self.selected_job_ids():
+            action(job_id)
+    
+    def raise_priority(self):
+        """Sube en uno la prioridad de los trabajos seleccionados."""
+        for job_id in self.selected_job_ids():
+            job = self.job_queue.get(job_id)
+            if job:
+                self.job_queue.set_priority(job_id, job['priority'] + 1)
+    
+    def clear_finished_jobs(self):
+        """Quita de la cola y de la tabla los trabajos terminados."""
+        self.job_queue.clear_finished()
+        self.queue_table.setRowCount(0)
+        self.job_rows = {}
+        for job in self.job_queue.jobs():
+            self.update_job(job)
+    
+    def update_job(self, job):
+        """
+        Actualiza la tabla de la cola con el estado de un trabajo.
         
-        # Deshabilitar controles durante la descarga para evitar operaciones simultáneas
-        self.download_button.setEnabled(False)
-        self.options_group.setEnabled(False)
-        self.analyze_button.setEnabled(False)
-        self.reload_button.setEnabled(False)
+        Args:
+            job (dict): Copia del trabajo enviada por la cola
+        """
+        row = self.job_rows.get(job['id'])
+        if row is None:
+            row = self.queue_table.rowCount()
+            self.queue_table.insertRow(row)
+            self.job_rows[job['id']] = row
+        
+        for column, value in enumerate((job['title'], job['state'], self._progress_text(job),
+                                        str(job['priority']))):
+            self.queue_table.setItem(row, column, QTableWidgetItem(value))
+        self.queue_table.item(row, 0).setToolTip(job['message'] or job['url'])
+        
+        # Registrar los cambios de estado y mensajes en el área de estado
+        previous = self.job_states.get(job['id'])
+        if previous != (job['state'], job['message']) and job['message']:
+            self.update_status(f"[{job['title']}] {job['message']}")
+        if previous and previous[0] != job['state'] and job['state'] in (COMPLETED, FAILED):
+            self.update_status(f"[{job['title']}] Tiempos: {self._timing_text(job['id'])}")
+        self.job_states[job['id']] = (job['state'], job['message'])
+        
+        # La barra de progreso sigue al último trabajo añadido desde el formulario
+        if job['id'] == self.current_job_id:
+            self.update_progress(job['downloaded'], job['total'])
+            if previous and previous[0] != job['state'] and job['state'] in (COMPLETED, FAILED):
+                self.download_finished(job['state'] == COMPLETED, job['output_file'] or job['message'])
+    
+    def update_jobs_progress(self, jobs, overall):
+        """
+        Actualiza la columna de progreso con una muestra de la cola.
+        Llega como mucho una vez por intervalo con todos los trabajos que avanzaron,
+        así que solo se tocan las celdas de progreso y la barra.
         
-        # Iniciar descarga
-        self.downloader_thread.start()
+        Args:
+            jobs (list): Copias de los trabajos cuyo progreso cambió
+            overall (dict): Progreso agregado de todas las descargas
+        """
+        for job in jobs:
+            row = self.job_rows.get(job['id'])
+            if row is None:
+                continue
+            self.queue_table.setItem(row, 2, QTableWidgetItem(self._progress_text(job)))
+            if job['id'] == self.current_job_id:
+                self.update_progress(job['downloaded'], job['total'])
+        # El mensaje caduca solo cuando dejan de llegar muestras (no queda nada descargando)
+        if overall['speed']:
+            self.statusBar().showMessage(
+                f"Total: {format_speed(overall['speed'])} · quedan {format_eta(overall['eta'])}",
+                self.PROGRESS_MESSAGE_TIMEOUT)
+    
+    @staticmethod
+    def _track_label(name, track):
+        """Texto de una pista en los combo box: nombre y, si se sondearon, sus propiedades."""
+        details = describe_track(track)
+        return f"{name} · {details}" if details else name
+    
+    @staticmethod
+    def _progress_text(job):
+        """Texto de la columna de progreso: porcentaje y, si descarga, velocidad y tiempo restante."""
+        percent = int(job['downloaded'] / job['total'] * 100) if job['total'] > 0 else 0
+        if job['state'] == DOWNLOADING and job.get('speed'):
+            return f"{percent}% · {format_speed(job['speed'])} · {format_eta(job.get('eta'))}"
+        return f"{percent}%"
+    
+    @staticmethod
+    def _timing_text(job_id):
+        """Resumen legible del tiempo de cada etapa de un trabajo."""
+        parts = []
+        for name, stage in get_tracer().job_summary(job_id).items():
+            text = f"{name} {stage['seconds']:.1f} s"
+            if stage['bytes'] and stage['seconds']:
+                text += f" ({format_speed(stage['bytes'] / stage['seconds'])})"
+            parts.append(text)
+        return ", ".join(parts) or "sin datos"
+    
+    def export_trace(self):
+        """
+        Guarda los tiempos registrados: traza de Chrome (.json), métricas de
+        Prometheus (.prom) o tramos en JSON Lines (.jsonl), según la extensión.
+        """
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Exportar tiempos", "picta_trace.json",
+            "Traza de Chrome (*.json);;Métricas de Prometheus (*.prom);;JSON Lines (*.jsonl)")
+        if not path:
+            return
+        tracer = get_tracer()
+        try:
+            if path.endswith('.prom'):
+                tracer.write_prometheus(path)
+            elif path.endswith('.jsonl'):
+                with open(path, 'w', encoding='utf-8') as f:
+                    for span in tracer.spans():
+                        f.write(json.dumps(span, ensure_ascii=False) + "\n")
+            else:
+                tracer.write_chrome_trace(path)
+        except OSError as e:
+            QMessageBox.warning(self, "Error", f"No se pudieron guardar los tiempos: {e}")
+            return
+        self.update_status(f"Tiempos guardados en {path}")
     
     def update_status(self, status):
         """
@@ -648,18 +555,12 @@ class PictaDownloaderUI(QMainWindow):
     
     def download_finished(self, success, message):
         """
-        Maneja la finalización del proceso de descarga.
+        Maneja la finalización del trabajo añadido desde el formulario.
         
         Args:
             success (bool): Si la descarga fue exitosa
             message (str): Mensaje de resultado o ruta del archivo descargado
         """
-        # Habilitar controles nuevamente
-        self.download_button.setEnabled(True)
-        self.options_group.setEnabled(True)
-        self.analyze_button.setEnabled(True)
-        self.reload_button.setEnabled(True)
-        
         if success:
             QMessageBox.information(self, "Éxito", f"Descarga completada: {message}")
             self.progress_bar.setValue(100)
@@ -681,6 +582,17 @@ if __name__ == "__main__":
     Inicializa la aplicación Qt y muestra la ventana principal.
     """
     app = QApplication(sys.argv)
-    window = PictaDownloaderUI()
+    
+    # Borrar los temporales que dejaron ejecuciones anteriores interrumpidas
+    WorkspaceManager().cleanup_orphans()
+    
+    # La cola es independiente de la ventana; la ventana es uno de sus clientes
+    job_queue = JobQueue(analyze_job, download_job, discard_fn=discard_job)
+    window = PictaDownloaderUI(job_queue)
+    job_queue.start()
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    exit_code = app.exec_()
+    
+    # Pausar las descargas en curso para reanudarlas en el próximo arranque
+    job_queue.shutdown()
+    sys.exit(exit_code)
\ No newline at end of file
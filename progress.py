@@ -0,0 +1,231 @@
+import time
+import threading
+
+
+class CombinedProgress:
+    """
+    Progreso combinado de varias pistas que se descargan a la vez.
+    Cada pista informa (descargado, total) por su cuenta y el callback
+    recibe la suma de bytes de todas, en lugar de una barra que se
+    reinicia con cada pista.
+    """
+    def __init__(self, callback=None):
+        """
+        Inicializa el progreso combinado.
+
+        Args:
+            callback (callable, opcional): Función (descargado, total) con los bytes de todas las pistas
+        """
+        self.callback = callback
+        self._tracks = {}
+        self._lock = threading.Lock()
+
+    def track(self, name):
+        """
+        Devuelve el callback de progreso de una pista.
+
+        Args:
+            name (str): Nombre de la pista (por ejemplo "video" o "audio")
+
+        Returns:
+            callable: Función (descargado, total) para la pista
+        """
+        with self._lock:
+            self._tracks.setdefault(name, (0, 0))
+
+        def update(downloaded, total):
+            with self._lock:
+                self._tracks[name] = (downloaded, total)
+                combined = self.totals()
+                if self.callback and combined[1] > 0:
+                    self.callback(*combined)
+        return update
+
+    def totals(self):
+        """
+        Devuelve los bytes descargados y totales sumando todas las pistas.
+
+        Returns:
+            tuple: (descargado, total)
+        """
+        downloaded = sum(done for done, _ in self._tracks.values())
+        total = sum(size for _, size in self._tracks.values())
+        return downloaded, total
+
+
+# Parámetros del agregador de progreso
+DEFAULT_INTERVAL = 0.1       # Segundos entre muestras (10 Hz)
+SPEED_SMOOTHING = 0.3        # Peso de la última muestra en la media móvil de la velocidad
+MIN_SPEED = 1.0              # Por debajo (bytes/s) la velocidad se considera 0
+
+
+def format_speed(speed):
+    """
+    Formatea una velocidad en bytes por segundo.
+
+    Args:
+        speed (float): Velocidad en bytes por segundo
+
+    Returns:
+        str: Velocidad legible (por ejemplo "3.2 MB/s")
+    """
+    if speed >= 1048576:
+        return f"{speed / 1048576:.1f} MB/s"
+    return f"{speed / 1024:.0f} KB/s"
+
+
+def format_size(size):
+    """
+    Formatea un tamaño en bytes.
+
+    Args:
+        size (int): Tamaño en bytes
+
+    Returns:
+        str: Tamaño legible (por ejemplo "182.4 MB" o "1.2 GB")
+    """
+    if size >= 1073741824:
+        return f"{size / 1073741824:.1f} GB"
+    if size >= 1048576:
+        return f"{size / 1048576:.1f} MB"
+    return f"{size / 1024:.0f} KB"
+
+
+def format_eta(eta):
+    """
+    Formatea un tiempo restante en segundos.
+
+    Args:
+        eta (float): Segundos restantes, o None si no se conoce
+
+    Returns:
+        str: Tiempo legible ("1:05:20", "3:07" o "--:--")
+    """
+    if eta is None:
+        return "--:--"
+    minutes, seconds = divmod(int(eta), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class ProgressAggregator:
+    """
+    Agregador de progreso entre los hilos de descarga y sus consumidores.
+    Los hilos solo anotan su último valor (update es barato y nunca llama a
+    nadie); un hilo propio toma muestras a frecuencia fija, calcula la
+    velocidad suavizada y el tiempo restante de cada clave (por ejemplo, cada
+    trabajo) y del total, y entrega solo el estado más reciente. Así la
+    interfaz recibe como mucho una actualización por intervalo, sin importar
+    cuántos bloques, pistas o trabajos haya a la vez.
+    """
+    def __init__(self, callback, interval=DEFAULT_INTERVAL, smoothing=SPEED_SMOOTHING):
+        """
+        Inicializa el agregador.
+
+        Args:
+            callback (callable): Función (muestras, total) que recibe en cada intervalo
+                las claves que cambiaron ({clave: dict}) y el agregado de todas (dict).
+                Cada dict tiene downloaded, total, speed (bytes/s) y eta (s o None)
+            interval (float, opcional): Segundos entre muestras
+            smoothing (float, opcional): Peso de la última muestra en la velocidad (0-1)
+        """
+        self.callback = callback
+        self.interval = interval
+        self.smoothing = smoothing
+        self._latest = {}
+        self._state = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def update(self, key, downloaded, total):
+        """
+        Anota el último valor de una clave (se puede llamar desde cualquier hilo).
+
+        Args:
+            key (str): Clave (por ejemplo, el id del trabajo)
+            downloaded (int): Unidades completadas
+            total (int): Unidades totales
+        """
+        with self._lock:
+            self._latest[key] = (downloaded, total)
+
+    def remove(self, key):
+        """
+        Deja de seguir una clave.
+
+        Args:
+            key (str): Clave
+
+        Returns:
+            tuple: Último valor (descargado, total), o None si no había ninguno
+        """
+        with self._lock:
+            self._state.pop(key, None)
+            return self._latest.pop(key, None)
+
+    def start(self):
+        """Arranca el hilo de muestreo."""
+        if self._thread is None:
+            # Tras un stop() el evento sigue activo y el hilo nuevo saldría enseguida
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Detiene el hilo de muestreo."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def sample(self, now=None):
+        """
+        Toma una muestra de todas las claves.
+
+        Args:
+            now (float, opcional): Instante de la muestra (time.monotonic())
+
+        Returns:
+            tuple: (muestras de las claves que cambiaron, agregado), o None si nada cambió
+        """
+        now = time.monotonic() if now is None else now
+        changed = {}
+        overall = {'downloaded': 0, 'total': 0, 'speed': 0.0, 'eta': None}
+        # Con el candado: remove() no puede quitar una clave a mitad de la muestra
+        with self._lock:
+            for key, (downloaded, total) in self._latest.items():
+                state = self._state.get(key)
+                if state is None or downloaded < state['downloaded'] or total != state['total']:
+                    # Clave nueva o cambio de fase (por ejemplo, de la descarga a la combinación)
+                    state = {'downloaded': downloaded, 'total': total, 'speed': 0.0, 'eta': None, 'time': now}
+                    self._state[key] = state
+                    changed[key] = state
+                elif now > state['time']:
+                    rate = (downloaded - state['downloaded']) / (now - state['time'])
+                    speed = self.smoothing * rate + (1 - self.smoothing) * state['speed']
+                    speed = speed if speed >= MIN_SPEED else 0.0
+                    if downloaded != state['downloaded'] or speed != state['speed']:
+                        changed[key] = state
+                    state.update(downloaded=downloaded, speed=speed, time=now,
+                                 eta=(total - downloaded) / speed if speed and total else None)
+                overall['downloaded'] += downloaded
+                overall['total'] += total
+                overall['speed'] += state['speed']
+        if not changed:
+            return None
+        if overall['speed'] and overall['total']:
+            overall['eta'] = (overall['total'] - overall['downloaded']) / overall['speed']
+        samples = {key: {name: state[name] for name in ('downloaded', 'total', 'speed', 'eta')}
+                   for key, state in changed.items()}
+        return samples, overall
+
+    def _run(self):
+        """Bucle del hilo de muestreo."""
+        while not self._stop.wait(self.interval):
+            result = self.sample()
+            if result:
+                try:
+                    self.callback(*result)
+                except Exception as e:
+                    print(f"Error al publicar el progreso: {e}")
@@ -0,0 +1,164 @@
+import time
+import random
+import http.client
+
+import requests
+
+from segmented_download import DownloadCancelled, IncompleteRangeError, ResourceChangedError
+from workspace import InsufficientSpaceError
+from tracing import get_tracer
+
+# Decisiones ante un error
+RETRY = "reintentar"              # Error transitorio: esperar y repetir (se reanuda desde el último byte)
+REFRESH = "renovar"               # El enlace firmado caducó: pedir uno nuevo al extractor y repetir
+FATAL = "definitivo"              # Repetir no sirve de nada
+
+DEFAULT_ATTEMPTS = 6              # Intentos totales por pista
+DEFAULT_BASE_DELAY = 1.0          # Espera antes del primer reintento (segundos)
+DEFAULT_MAX_DELAY = 60.0          # Espera máxima entre intentos
+DEFAULT_JITTER = 0.5              # Fracción de la espera que se elige al azar
+MAX_REFRESHES = 2                 # Renovaciones de enlace por pista
+
+# Códigos HTTP transitorios (sobrecarga, límites de peticiones, fallos de pasarela del CDN)
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504, 520, 521, 522, 523, 524})
+# Códigos con los que el CDN rechaza un enlace firmado caducado
+EXPIRED_STATUSES = frozenset({401, 403, 410})
+
+# Errores de red que no dejan el archivo en mal estado
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ContentDecodingError,
+    http.client.IncompleteRead,
+    http.client.RemoteDisconnected,
+    ConnectionError,
+    TimeoutError,
+    IncompleteRangeError,
+    ResourceChangedError,
+)
+
+
+class RetryPolicy:
+    """
+    Política de reintentos de las descargas de medios.
+    Los errores transitorios se repiten con espera exponencial y una parte
+    aleatoria (para que varias conexiones no vuelvan a la vez); los enlaces
+    caducados se renuevan con el extractor. Como el motor segmentado guarda
+    lo descargado en su diario, cada intento continúa desde el último byte.
+    """
+    def __init__(self, attempts=DEFAULT_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 jitter=DEFAULT_JITTER, max_refreshes=MAX_REFRESHES, retry_statuses=RETRY_STATUSES,
+                 expired_statuses=EXPIRED_STATUSES):
+        """
+        Inicializa la política.
+
+        Args:
+            attempts (int, opcional): Intentos totales (1 = sin reintentos)
+            base_delay (float, opcional): Espera antes del primer reintento
+            max_delay (float, opcional): Espera máxima entre intentos
+            jitter (float, opcional): Fracción de la espera que se elige al azar (0-1)
+            max_refreshes (int, opcional): Veces que se puede renovar el enlace
+            retry_statuses (set, opcional): Códigos HTTP que se reintentan
+            expired_statuses (set, opcional): Códigos HTTP que indican un enlace caducado
+        """
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.max_refreshes = max_refreshes
+        self.retry_statuses = retry_statuses
+        self.expired_statuses = expired_statuses
+
+    def classify(self, error):
+        """
+        Decide qué hacer ante un error de descarga.
+
+        Args:
+            error (Exception): Error producido
+
+        Returns:
+            str: RETRY, REFRESH o FATAL
+        """
+        if isinstance(error, (DownloadCancelled, InsufficientSpaceError)):
+            return FATAL
+        if isinstance(error, requests.exceptions.HTTPError):
+            status = error.response.status_code if error.response is not None else None
+            if status in self.expired_statuses:
+                return REFRESH
+            return RETRY if status in self.retry_statuses else FATAL
+        if isinstance(error, TRANSIENT_ERRORS):
+            return RETRY
+        return FATAL
+
+    def delay(self, attempt, error=None):
+        """
+        Calcula la espera antes de un reintento.
+
+        Args:
+            attempt (int): Número de reintento (empieza en 1)
+            error (Exception, opcional): Error que lo provocó (se respeta Retry-After)
+
+        Returns:
+            float: Segundos de espera
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        delay -= random.uniform(0, delay * self.jitter)
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+        if retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.max_delay))
+        return delay
+
+    def run(self, operation, url, refresh=None, cancel_event=None, status_callback=None, description=""):
+        """
+        Ejecuta una descarga aplicando la política.
+
+        Args:
+            operation (callable): Función (url) que hace la descarga
+            url (str): URL inicial
+            refresh (callable, opcional): Función sin argumentos que devuelve un enlace
+                nuevo del mismo recurso (o None si no se consiguió)
+            cancel_event (threading.Event, opcional): Evento que interrumpe las esperas
+            status_callback (callable, opcional): Función que recibe mensajes de estado
+            description (str, opcional): Nombre del recurso en los mensajes
+
+        Returns:
+            El resultado de operation
+
+        Raises:
+            DownloadCancelled: Si cancel_event se activó
+            Exception: El último error si se agotaron los intentos o no se puede reintentar
+        """
+        status = status_callback or (lambda message: None)
+        description = description or url
+        refreshes = 0
+        attempt = 1
+        while True:
+            try:
+                return operation(url)
+            except Exception as error:
+                decision = self.classify(error)
+                if decision == REFRESH and (refresh is None or refreshes >= self.max_refreshes):
+                    decision = FATAL
+                if decision == FATAL or attempt >= self.attempts:
+                    raise
+                attempt += 1
+                get_tracer().event("retry", resource=description, decision=decision, attempt=attempt,
+                                   error=type(error).__name__)
+
+                if decision == REFRESH:
+                    refreshes += 1
+                    status(f"El enlace de {description} caducó; obteniendo uno nuevo...")
+                    new_url = refresh()
+                    if not new_url:
+                        raise
+                    url = new_url
+                    continue
+
+                wait = self.delay(attempt - 1, error)
+                status(f"Error de red en {description}; reintento {attempt}/{self.attempts} en {wait:.0f} s...")
+                if cancel_event is None:
+                    time.sleep(wait)
+                elif cancel_event.wait(wait):
+                    raise DownloadCancelled(url) from None
@@ -0,0 +1,441 @@
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from download_journal import DownloadJournal
+from workspace import preallocate
+
+# Parámetros por defecto de la descarga segmentada
+DEFAULT_CONNECTIONS = 4                  # Conexiones simultáneas por archivo
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024       # No se divide en trozos menores de 4 MB
+CHUNK_SIZE = 256 * 1024                  # Tamaño de lectura inicial
+MIN_CHUNK_SIZE = 64 * 1024               # Lectura mínima (conexiones lentas: cancelación ágil)
+MAX_CHUNK_SIZE = 4 * 1024 * 1024         # Lectura máxima (conexiones rápidas: pocas iteraciones)
+TARGET_READ_TIME = 0.1                   # Segundos que debería tardar cada lectura
+PROGRESS_INTERVAL = 0.1                  # Segundos mínimos entre avisos de progreso
+PROBE_TIMEOUT = 10                       # Segundos para la petición de sondeo
+READ_TIMEOUT = 30                        # Segundos sin datos antes de abortar una conexión
+CHECKPOINT_BYTES = 8 * 1024 * 1024       # Guardar el diario cada 8 MB escritos por conexión
+CHECKPOINT_INTERVAL = 2.0                # ...o cada 2 segundos, lo que ocurra antes
+
+
+class ResourceChangedError(IOError):
+    """El recurso remoto cambió desde que empezó la descarga (If-Range no coincide)."""
+
+
+class IncompleteRangeError(IOError):
+    """La conexión se cerró antes de recibir todo el rango (lo recibido queda en el diario)."""
+
+
+class DownloadCancelled(Exception):
+    """La descarga se detuvo a petición del usuario (pausa o cancelación)."""
+
+
+def probe_resource(session, url, headers=None):
+    """
+    Sondea un recurso para saber su tamaño y si admite peticiones por rangos.
+    Usa HEAD y, si no basta, un GET de un solo byte (Range: bytes=0-0).
+
+    Args:
+        session (requests.Session): Sesión HTTP
+        url (str): URL del recurso
+        headers (dict, opcional): Cabeceras HTTP
+
+    Returns:
+        dict: size (int o None), accept_ranges (bool), etag y last_modified (str o None)
+    """
+    headers = headers or {}
+    info = {'size': None, 'accept_ranges': False, 'etag': None, 'last_modified': None}
+
+    try:
+        response = session.head(url, headers=headers, allow_redirects=True, timeout=PROBE_TIMEOUT)
+        if response.status_code < 400:
+            length = response.headers.get('Content-Length')
+            info['size'] = int(length) if length and length.isdigit() else None
+            info['accept_ranges'] = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+            info['etag'] = response.headers.get('ETag')
+            info['last_modified'] = response.headers.get('Last-Modified')
+    except Exception as e:
+        print(f"Error al sondear {url} con HEAD: {e}")
+
+    if info['size'] is not None and info['accept_ranges']:
+        return info
+
+    # Algunos servidores no anuncian Accept-Ranges en HEAD pero sí responden 206
+    try:
+        range_headers = dict(headers, Range='bytes=0-0')
+        with session.get(url, headers=range_headers, stream=True, timeout=PROBE_TIMEOUT) as response:
+            if response.status_code == 206:
+                match = re.match(r'bytes\s+\d+-\d+/(\d+)', response.headers.get('Content-Range', ''))
+                if match:
+                    info['size'] = int(match.group(1))
+                    info['accept_ranges'] = True
+                info['etag'] = info['etag'] or response.headers.get('ETag')
+                info['last_modified'] = info['last_modified'] or response.headers.get('Last-Modified')
+    except Exception as e:
+        print(f"Error al sondear {url} por rangos: {e}")
+
+    return info
+
+
+def split_ranges(size, connections, min_segment_size=MIN_SEGMENT_SIZE, offset=0):
+    """
+    Divide un archivo (o un tramo de él) en rangos de bytes contiguos.
+
+    Args:
+        size (int): Tamaño en bytes del tramo a dividir
+        connections (int): Número máximo de rangos
+        min_segment_size (int, opcional): Tamaño mínimo de cada rango
+        offset (int, opcional): Posición del primer byte del tramo
+
+    Returns:
+        list: Tuplas (inicio, fin) con el fin inclusivo, como en la cabecera Range
+    """
+    count = max(1, min(connections, size // max(1, min_segment_size)))
+    segment = size // count
+    ranges = []
+    start = offset
+    for index in range(count):
+        end = offset + size - 1 if index == count - 1 else start + segment - 1
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+
+def plan_ranges(missing, connections, min_segment_size=MIN_SEGMENT_SIZE):
+    """
+    Reparte los tramos que faltan en rangos para las conexiones disponibles.
+    Los tramos grandes se dividen en proporción a su tamaño.
+
+    Args:
+        missing (list): Tramos (inicio, fin) pendientes, con el fin inclusivo
+        connections (int): Número de conexiones simultáneas
+        min_segment_size (int, opcional): Tamaño mínimo de cada rango
+
+    Returns:
+        list: Tuplas (inicio, fin) a descargar
+    """
+    total = sum(end - start + 1 for start, end in missing)
+    ranges = []
+    for start, end in missing:
+        length = end - start + 1
+        share = max(1, round(connections * length / total)) if total else 1
+        ranges.extend(split_ranges(length, share, min_segment_size, offset=start))
+    return ranges
+
+
+class _PositionalFile:
+    """
+    Archivo preasignado en el que varios hilos escriben en posiciones concretas.
+    Usa os.pwrite cuando está disponible; en Windows serializa lseek + write.
+    """
+    def __init__(self, path, size, resume=False):
+        flags = os.O_RDWR | getattr(os, 'O_BINARY', 0)
+        self._fd = os.open(path, flags if resume else flags | os.O_CREAT | os.O_TRUNC)
+        if not resume:
+            try:
+                preallocate(self._fd, size)  # Reservar el archivo completo en disco
+            except OSError:
+                os.close(self._fd)
+                raise
+        self._lock = threading.Lock()
+
+    def write_at(self, data, offset):
+        view = memoryview(data)
+        while view:
+            if hasattr(os, 'pwrite'):
+                written = os.pwrite(self._fd, view, offset)
+            else:
+                with self._lock:
+                    os.lseek(self._fd, offset, os.SEEK_SET)
+                    written = os.write(self._fd, view)
+            view = view[written:]
+            offset += written
+
+    def sync(self):
+        os.fsync(self._fd)
+
+    def close(self):
+        os.close(self._fd)
+
+
+class SegmentedDownloader:
+    """
+    Motor de descarga que divide un archivo en rangos de bytes y los descarga
+    en paralelo sobre conexiones reutilizadas, escribiendo cada rango en su
+    posición dentro de un archivo preasignado. Los rangos completados se
+    registran en un diario junto al archivo, de modo que una descarga
+    interrumpida se reanuda pidiendo solo lo que falta. Si el servidor no
+    admite rangos, descarga el archivo con una sola conexión.
+    """
+    def __init__(self, session, headers=None, connections=DEFAULT_CONNECTIONS,
+                 min_segment_size=MIN_SEGMENT_SIZE, bandwidth=None):
+        """
+        Inicializa el motor.
+
+        Args:
+            session (requests.Session): Sesión HTTP (con pool de conexiones suficiente)
+            headers (dict, opcional): Cabeceras HTTP
+            connections (int, opcional): Conexiones simultáneas por archivo
+            min_segment_size (int, opcional): Tamaño mínimo de cada rango
+            bandwidth (JobBandwidth, opcional): Limitador de velocidad del trabajo
+        """
+        self.session = session
+        self.headers = headers or {}
+        self.connections = connections
+        self.min_segment_size = min_segment_size
+        self.bandwidth = bandwidth
+
+    def download(self, url, output_path, progress_callback=None, cancel_event=None):
+        """
+        Descarga un archivo completo, reanudando una descarga anterior si es posible.
+
+        Args:
+            url (str): URL del archivo
+            output_path (str): Ruta donde guardar el archivo
+            progress_callback (callable, opcional): Función (descargado, total) para el progreso
+            cancel_event (threading.Event, opcional): Evento que detiene la descarga al activarse;
+                los datos ya escritos se conservan en el diario para reanudar
+
+        Returns:
+            bool: True si la descarga fue exitosa
+
+        Raises:
+            DownloadCancelled: Si cancel_event se activó antes de terminar
+            Exception: Si falla alguna conexión o la respuesta no es la esperada
+        """
+        info = probe_resource(self.session, url, self.headers)
+        size = info['size']
+        if not info['accept_ranges'] or not size:
+            DownloadJournal.discard(output_path)
+            return self._download_single(url, output_path, progress_callback, cancel_event)
+
+        journal = DownloadJournal.load(output_path)
+        if journal and not journal.matches(info):
+            print(f"El recurso cambió desde la última descarga, se empieza de cero: {url}")
+            journal = None
+
+        try:
+            return self._download_ranges(url, output_path, info, journal, progress_callback, cancel_event)
+        except ResourceChangedError:
+            # El servidor indicó que el recurso cambió a mitad de la reanudación: el tamaño
+            # y los validadores sondeados ya no valen, así que se vuelve a sondear
+            print(f"El recurso cambió durante la reanudación, se empieza de cero: {url}")
+            DownloadJournal.discard(output_path)
+            info = probe_resource(self.session, url, self.headers)
+            if not info['accept_ranges'] or not info['size']:
+                return self._download_single(url, output_path, progress_callback, cancel_event)
+            return self._download_ranges(url, output_path, info, None, progress_callback, cancel_event)
+
+    def _download_ranges(self, url, output_path, info, journal, progress_callback, cancel_event):
+        """Descarga los rangos que faltan según el diario (o todo el archivo si no hay diario)."""
+        resume = journal is not None
+        if not resume:
+            journal = DownloadJournal(output_path, info['size'], info['etag'], info['last_modified'])
+
+        missing = journal.missing_ranges()
+        progress = _ProgressCounter(info['size'], progress_callback, journal.completed_bytes)
+        if not missing:
+            progress.add(0)
+            return True
+
+        if resume:
+            print(f"Reanudando descarga: {journal.completed_bytes} de {info['size']} bytes ya en disco")
+        ranges = plan_ranges(missing, self.connections, self.min_segment_size)
+        cancel = _StopFlag(cancel_event)
+        output = _PositionalFile(output_path, info['size'], resume=resume)
+        journal.save()
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.connections, len(ranges))) as executor:
+                futures = [
+                    executor.submit(self._download_range, url, output, start, end,
+                                    progress, cancel, journal)
+                    for start, end in ranges
+                ]
+                try:
+                    for future in futures:
+                        future.result()
+                except Exception:
+                    # Detener el resto de conexiones si una falla
+                    cancel.set()
+                    raise
+        finally:
+            # Guardar lo conseguido aunque la descarga falle, para poder reanudarla
+            output.sync()
+            output.close()
+            journal.save()
+        if cancel.is_set():
+            raise DownloadCancelled(url)
+        return True
+
+    def _download_range(self, url, output, start, end, progress, cancel, journal):
+        """Descarga un rango de bytes, lo escribe en su posición y lo anota en el diario."""
+        headers = dict(self.headers, Range=f'bytes={start}-{end}')
+        if journal.validator:
+            headers['If-Range'] = journal.validator
+
+        offset = start
+        checkpoint = start
+        last_save = time.monotonic()
+        try:
+            with self.session.get(url, headers=headers, stream=True,
+                                  timeout=(PROBE_TIMEOUT, READ_TIMEOUT)) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    if 'If-Range' in headers:
+                        raise ResourceChangedError(f"El recurso cambió (HTTP {response.status_code})")
+                    raise IOError(f"El servidor ignoró el rango {start}-{end} (HTTP {response.status_code})")
+
+                for chunk in ChunkReader(response, limit=end + 1 - start,
+                                         throttle=self._throttle(url, cancel)):
+                    if cancel.is_set():
+                        return
+                    output.write_at(chunk, offset)
+                    offset += len(chunk)
+                    progress.add(len(chunk))
+
+                    # Anotar periódicamente lo escrito para poder reanudar
+                    now = time.monotonic()
+                    if offset - checkpoint >= CHECKPOINT_BYTES or now - last_save >= CHECKPOINT_INTERVAL:
+                        output.sync()
+                        journal.mark(checkpoint, offset)
+                        journal.save()
+                        checkpoint = offset
+                        last_save = now
+        finally:
+            journal.mark(checkpoint, offset)
+
+        if offset != end + 1:
+            raise IncompleteRangeError(f"Rango incompleto {start}-{end}: recibidos {offset - start} bytes")
+
+    def _download_single(self, url, output_path, progress_callback, cancel_event=None):
+        """Descarga el archivo con una única conexión (sin rangos)."""
+        with self.session.get(url, headers=self.headers, stream=True,
+                              timeout=(PROBE_TIMEOUT, READ_TIMEOUT)) as response:
+            response.raise_for_status()
+
+            total_size = int(response.headers.get('content-length', 0))
+            progress = _ProgressCounter(total_size, progress_callback)
+
+            with open(output_path, 'wb', buffering=0) as f:
+                for chunk in ChunkReader(response, throttle=self._throttle(url, cancel_event)):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise DownloadCancelled(url)
+                    f.write(chunk)
+                    progress.add(len(chunk))
+            progress.flush()
+        return True
+
+    def _throttle(self, url, cancel):
+        """Limitador de velocidad de una conexión, o None si no hay límites."""
+        return self.bandwidth.throttle(url, cancel) if self.bandwidth is not None else None
+
+
+class _StopFlag:
+    """
+    Indicador de parada de una descarga por rangos.
+    Se activa internamente si falla una conexión, o desde fuera con el
+    evento de cancelación del trabajo (sin afectar a otras descargas).
+    """
+    def __init__(self, external=None):
+        self._internal = threading.Event()
+        self._external = external
+
+    def set(self):
+        self._internal.set()
+
+    def is_set(self):
+        return self._internal.is_set() or (self._external is not None and self._external.is_set())
+
+
+class ChunkReader:
+    """
+    Lee el cuerpo de una respuesta en un búfer reutilizable.
+    Cada iteración devuelve una vista (memoryview) del mismo búfer, válida
+    hasta la siguiente, así que quien consume los bloques no los acumula. El
+    tamaño de lectura se adapta a la velocidad: crece en conexiones rápidas
+    (menos iteraciones de Python por GB) y se reduce en las lentas (para que
+    la cancelación y el progreso sigan siendo ágiles). Con un limitador de
+    velocidad, cada lectura se paga en sus cubos y no pasa de lo que el
+    límite permite en una fracción de segundo.
+    """
+    def __init__(self, response, limit=None, buffer=None, throttle=None):
+        """
+        Inicializa el lector.
+
+        Args:
+            response (requests.Response): Respuesta abierta con stream=True
+            limit (int, opcional): Bytes máximos a leer (por ejemplo, el tamaño del rango)
+            buffer (bytearray, opcional): Búfer a reutilizar (por defecto uno de MAX_CHUNK_SIZE)
+            throttle (Throttle, opcional): Limitador de velocidad de la conexión
+        """
+        self.response = response
+        self.throttle = throttle
+        self.remaining = limit
+        self.view = memoryview(buffer if buffer is not None else bytearray(MAX_CHUNK_SIZE))
+        self.size = min(CHUNK_SIZE, len(self.view))
+        # Se lee con la interfaz pública de urllib3; sin compresión no hace
+        # falta que urllib3 descomprima nada
+        self._decode = bool(response.headers.get('Content-Encoding'))
+        response.raw.decode_content = self._decode
+        self._readinto = response.raw.readinto
+
+    def __iter__(self):
+        while self.remaining is None or self.remaining > 0:
+            size = self.size if self.remaining is None else min(self.size, self.remaining)
+            if self.throttle is not None:
+                size = min(size, self.throttle.chunk_limit() or size)
+            started = time.perf_counter()
+            count = self._readinto(self.view[:size])
+            if not count:
+                break
+            if self.remaining is not None:
+                self.remaining -= count
+            elapsed = time.perf_counter() - started
+            if self.throttle is not None:
+                self.throttle.consume(count)
+            yield self.view[:count]
+            self._adapt(count, size, elapsed)
+        if not self._decode and (self.remaining is None or self.remaining <= 0):
+            # El cuerpo se leyó entero: devolver la conexión al pool para reutilizarla
+            self.response.raw.release_conn()
+
+    def _adapt(self, count, requested, elapsed):
+        """Ajusta el tamaño de la próxima lectura según lo que tardó la última."""
+        if count == requested and elapsed < TARGET_READ_TIME / 2:
+            self.size = min(self.size * 2, MAX_CHUNK_SIZE, len(self.view))
+        elif elapsed > TARGET_READ_TIME * 2:
+            self.size = max(self.size // 2, MIN_CHUNK_SIZE)
+
+
+class _ProgressCounter:
+    """
+    Contador de bytes compartido entre hilos que informa el progreso agregado.
+    Los avisos se limitan a uno cada PROGRESS_INTERVAL (y siempre el final).
+    """
+    def __init__(self, total, callback, initial=0):
+        self.total = total
+        self.callback = callback
+        self.downloaded = initial
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, count):
+        with self._lock:
+            self.downloaded += count
+            now = time.monotonic()
+            if now - self._last_report >= PROGRESS_INTERVAL or self.downloaded >= self.total:
+                self._last_report = now
+                self._report()
+
+    def flush(self):
+        """Informa el valor actual aunque no haya pasado el intervalo."""
+        with self._lock:
+            self._report()
+
+    def _report(self):
+        # Informar dentro del lock para que el progreso nunca retroceda
+        if self.callback and self.total > 0:
+            self.callback(self.downloaded, self.total)
@@ -0,0 +1,253 @@
+import re
+
+from media_manifest import language_code
+
+# Tipos de política (se guardan con el trabajo)
+POLICY_AUTO = "auto"          # Reglas declarativas (calidad máxima, idioma, tamaño...)
+POLICY_MANUAL = "manual"      # Pistas elegidas a mano en la interfaz
+
+# Qué subtítulos incluir
+SUBTITLES_NONE = "ninguno"
+SUBTITLES_ALL = "todos"
+
+
+class SelectionError(ValueError):
+    """Ninguna combinación de pistas cumple la política."""
+
+
+def selected_subtitles(selection):
+    """
+    Devuelve las pistas de subtítulos de una selección.
+    Las selecciones antiguas tienen una sola, en 'subtitle'.
+
+    Args:
+        selection (dict): Pistas elegidas
+
+    Returns:
+        list: Pistas de subtítulos (puede estar vacía)
+    """
+    if selection.get('subtitles') is not None:
+        return list(selection['subtitles'])
+    return [selection['subtitle']] if selection.get('subtitle') else []
+
+
+def make_selection(video, audio=None, subtitles=()):
+    """
+    Construye el diccionario de una selección.
+
+    Args:
+        video (dict): Fuente de video
+        audio (dict, opcional): Pista de audio
+        subtitles (list, opcional): Pistas de subtítulos
+
+    Returns:
+        dict: 'video', 'audio', 'subtitles' y 'subtitle' (el primero, para quien solo admite uno)
+    """
+    subtitles = list(subtitles)
+    return {'video': video, 'audio': audio, 'subtitles': subtitles,
+            'subtitle': subtitles[0] if subtitles else None}
+
+
+def video_height(source):
+    """Altura de una fuente de video (sondeada o deducida de su calidad), o 0 si no se conoce."""
+    if source.get('height'):
+        return source['height']
+    match = re.match(r'(\d+)p', source.get('quality', ''))
+    return int(match.group(1)) if match else 0
+
+
+def audio_bitrate(track):
+    """Tasa de bits de una pista de audio (sondeada o indicada en su nombre), o 0 si no se conoce."""
+    if track.get('bitrate'):
+        return track['bitrate']
+    match = re.search(r'(\d+)k', track.get('language', ''))
+    return int(match.group(1)) * 1000 if match else 0
+
+
+class SelectionPolicy:
+    """
+    Política declarativa que elige las pistas de un manifiesto sin intervención:
+    el mejor video hasta una altura máxima, el audio en los idiomas preferidos,
+    los subtítulos pedidos y, si se indica, un tamaño total máximo (con los
+    tamaños que obtiene el sondeo del análisis).
+    """
+    kind = POLICY_AUTO
+
+    def __init__(self, max_height=None, audio_languages=None, audio=True, subtitles=SUBTITLES_NONE,
+                 max_size_mb=None):
+        """
+        Inicializa la política.
+
+        Args:
+            max_height (int, opcional): Altura máxima del video (por ejemplo 720)
+            audio_languages (list, opcional): Idiomas de audio preferidos, en orden
+                ('spa', 'es', 'Español'...); si ninguno está, se usa la primera pista
+            audio (bool, opcional): Incluir una pista de audio
+            subtitles (str o list, opcional): SUBTITLES_NONE, SUBTITLES_ALL o lista de idiomas
+            max_size_mb (float, opcional): Tamaño máximo de video más audio en MB
+        """
+        self.max_height = max_height
+        self.audio_languages = list(audio_languages or [])
+        self.audio = audio
+        self.subtitles = subtitles
+        self.max_size_mb = max_size_mb
+
+    def resolve(self, manifest):
+        """
+        Elige las pistas de un manifiesto.
+
+        Args:
+            manifest (MediaManifest): Manifiesto analizado
+
+        Returns:
+            dict: Selección (make_selection)
+
+        Raises:
+            SelectionError: Si ninguna fuente de video cumple la política
+        """
+        audio = self._pick_audio(manifest.audio_tracks) if self.audio else None
+        videos = sorted(manifest.video_sources, key=video_height, reverse=True)
+        if self.max_height:
+            allowed = [source for source in videos if 0 < video_height(source) <= self.max_height]
+            # Si ninguna calidad se conoce, no hay nada con qué comparar
+            videos = allowed or [source for source in videos if not video_height(source)]
+        if not videos:
+            raise SelectionError(f"No hay ninguna calidad de video de {self.max_height}p o menos.")
+
+        if self.max_size_mb:
+            limit = self.max_size_mb * 1048576
+            # Con tamaños desconocidos no se puede comprobar el límite: se admiten
+            audio_size = (audio or {}).get('size') or 0
+            fitting = [source for source in videos if (source.get('size') or 0) + audio_size <= limit]
+            if not fitting:
+                raise SelectionError(f"Ninguna calidad de video cabe en {self.max_size_mb:g} MB.")
+            videos = fitting
+
+        return make_selection(videos[0], audio, self._pick_subtitles(manifest.subtitles))
+
+    def _pick_audio(self, tracks):
+        """Pista del primer idioma preferido disponible (la de mayor tasa de bits), o la primera."""
+        if not tracks:
+            return None
+        for language in self.audio_languages:
+            code = language_code(language)
+            matches = [track for track in tracks if language_code(track.get('language')) == code]
+            if matches:
+                return max(matches, key=audio_bitrate)
+        return tracks[0]
+
+    def _pick_subtitles(self, subtitles):
+        if self.subtitles == SUBTITLES_ALL:
+            return list(subtitles)
+        if not self.subtitles or self.subtitles == SUBTITLES_NONE:
+            return []
+        # 'es' y 'spa' son el mismo idioma: cada pista una sola vez, en el orden pedido
+        codes = list(dict.fromkeys(language_code(language) for language in self.subtitles))
+        return [subtitle for code in codes for subtitle in subtitles
+                if language_code(subtitle.get('language')) == code]
+
+    def to_dict(self):
+        """
+        Serializa la política a un diccionario compatible con JSON.
+
+        Returns:
+            dict: Política serializada
+        """
+        return {'type': self.kind, 'max_height': self.max_height, 'audio_languages': self.audio_languages,
+                'audio': self.audio, 'subtitles': self.subtitles, 'max_size_mb': self.max_size_mb}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Reconstruye una política serializada con to_dict().
+
+        Args:
+            data (dict): Política serializada
+
+        Returns:
+            SelectionPolicy: Política reconstruida
+        """
+        return cls(data.get('max_height'), data.get('audio_languages'), data.get('audio', True),
+                   data.get('subtitles', SUBTITLES_NONE), data.get('max_size_mb'))
+
+
+class ManualSelection:
+    """
+    Las pistas elegidas a mano en la interfaz, como una política más.
+    Si el manifiesto se renueva (enlaces caducados), se buscan en él las
+    pistas equivalentes.
+    """
+    kind = POLICY_MANUAL
+
+    def __init__(self, video, audio=None, subtitles=()):
+        """
+        Inicializa la política.
+
+        Args:
+            video (dict): Fuente de video elegida
+            audio (dict, opcional): Pista de audio elegida
+            subtitles (list, opcional): Pistas de subtítulos elegidas
+        """
+        self.selection = make_selection(video, audio, subtitles)
+
+    def resolve(self, manifest):
+        """
+        Devuelve las pistas elegidas, tomadas del manifiesto indicado.
+
+        Args:
+            manifest (MediaManifest): Manifiesto analizado
+
+        Returns:
+            dict: Selección (make_selection)
+
+        Raises:
+            SelectionError: Si la fuente de video elegida ya no está en el manifiesto
+        """
+        def find(kind, track):
+            return (manifest.find_track(kind, track) or track) if track else None
+
+        video = self.selection['video'] and manifest.find_track('video', self.selection['video'])
+        if not video:
+            raise SelectionError("La calidad de video elegida ya no está disponible.")
+        return make_selection(video, find('audio', self.selection['audio']),
+                              [find('subtitle', subtitle) for subtitle in self.selection['subtitles']])
+
+    def to_dict(self):
+        """
+        Serializa la política a un diccionario compatible con JSON.
+
+        Returns:
+            dict: Política serializada
+        """
+        return {'type': self.kind, 'selection': self.selection}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Reconstruye una política serializada con to_dict().
+
+        Args:
+            data (dict): Política serializada
+
+        Returns:
+            ManualSelection: Política reconstruida
+        """
+        selection = data.get('selection') or {}
+        return cls(selection.get('video'), selection.get('audio'), selected_subtitles(selection))
+
+
+def policy_from_dict(data):
+    """
+    Reconstruye cualquier política serializada.
+
+    Args:
+        data (dict): Política serializada, o None para la política por defecto
+
+    Returns:
+        SelectionPolicy o ManualSelection: Política reconstruida
+    """
+    if not data:
+        return SelectionPolicy()
+    if data.get('type') == POLICY_MANUAL:
+        return ManualSelection.from_dict(data)
+    return SelectionPolicy.from_dict(data)
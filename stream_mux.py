@@ -0,0 +1,244 @@
+import os
+import re
+import time
+import errno
+import threading
+import subprocess
+
+from mp4_boxes import (HEAD_SIZE, LAYOUT_STREAMABLE, LAYOUT_MOOV_LAST, scan_top_level,
+                       detect_layout, faststart_pieces)
+from segmented_download import DownloadCancelled, ChunkReader, PROBE_TIMEOUT, READ_TIMEOUT
+from ffmpeg_mux import build_mux_command, FFmpegRunner, FFmpegError
+from progress import CombinedProgress
+
+FIFO_OPEN_INTERVAL = 0.1   # Segundos entre intentos de abrir una FIFO hasta que FFmpeg la lea
+
+
+class StreamingUnavailable(Exception):
+    """Las pistas no se pueden combinar en streaming; hay que usar archivos temporales."""
+
+
+class StreamingMuxer:
+    """
+    Combina las pistas con FFmpeg a medida que se descargan, sin archivos temporales.
+    Cada pista se lee de forma secuencial y se envía a FFmpeg por una FIFO
+    (o por la entrada estándar donde no hay FIFOs), así los datos se escriben
+    en disco una sola vez, ya en el archivo final. Los MP4 con el moov al
+    final se reordenan al vuelo para poder leerse de una tubería.
+    """
+    def __init__(self, session, headers=None, bandwidth=None):
+        """
+        Inicializa el combinador.
+
+        Args:
+            session (requests.Session): Sesión HTTP compartida
+            headers (dict, opcional): Cabeceras HTTP para las peticiones
+            bandwidth (JobBandwidth, opcional): Limitador de velocidad del trabajo
+        """
+        self.session = session
+        self.headers = headers or {}
+        self.bandwidth = bandwidth
+
+    def fetch(self, url, start, end):
+        """
+        Descarga un rango de bytes.
+
+        Args:
+            url (str): URL del recurso
+            start (int): Primer byte
+            end (int): Último byte (inclusivo)
+
+        Returns:
+            bytes: Contenido del rango
+        """
+        response = self.session.get(url, headers=dict(self.headers, Range=f"bytes={start}-{end}"),
+                                    timeout=(PROBE_TIMEOUT, READ_TIMEOUT))
+        if response.status_code != 206:
+            raise StreamingUnavailable(f"El servidor no admite rangos ({response.status_code})")
+        return response.content
+
+    def plan(self, url):
+        """
+        Decide cómo leer una pista de forma secuencial.
+
+        Args:
+            url (str): URL de la pista (MP4)
+
+        Returns:
+            tuple: (piezas, tamaño, disposición); las piezas son ('data', bytes) o
+            ('range', inicio, fin) en el orden en que se envían a FFmpeg
+
+        Raises:
+            StreamingUnavailable: Si la pista no se puede leer de forma secuencial
+        """
+        response = self.session.get(url, headers=dict(self.headers, Range=f"bytes=0-{HEAD_SIZE - 1}"),
+                                    timeout=(PROBE_TIMEOUT, READ_TIMEOUT))
+        match = re.match(r'bytes\s+\d+-\d+/(\d+)', response.headers.get('Content-Range', ''))
+        if response.status_code != 206 or not match:
+            raise StreamingUnavailable(f"El servidor no admite rangos en {url}")
+        size = int(match.group(1))
+        head = response.content
+
+        boxes = scan_top_level(lambda start, end: self.fetch(url, start, end), size, head)
+        layout = detect_layout(boxes)
+        if layout == LAYOUT_STREAMABLE:
+            # Los bytes iniciales ya leídos se reutilizan
+            pieces = [('data', head)]
+            if size > len(head):
+                pieces.append(('range', len(head), size - 1))
+        elif layout == LAYOUT_MOOV_LAST:
+            pieces = faststart_pieces(lambda start, end: self.fetch(url, start, end), size, boxes)
+            if pieces is None:
+                raise StreamingUnavailable(f"No se puede reordenar el MP4 {url}")
+        else:
+            raise StreamingUnavailable(f"{url} no es un MP4 reconocible")
+        return pieces, size, layout
+
+    def mux(self, output_file, work_dir, video_url, audio_url=None, subtitle_path=None,
+            status_callback=None, progress_callback=None, cancel_event=None, subtitle_languages=None):
+        """
+        Descarga las pistas y las combina en el archivo final en una sola pasada.
+        Los flujos se copian sin recodificar.
+
+        Args:
+            output_file (str): Ruta del archivo final
+            work_dir (str): Directorio donde crear las FIFO
+            video_url (str): URL del video
+            audio_url (str, opcional): URL del audio separado
+            subtitle_path (str o list, opcional): Archivo o archivos de subtítulos ya descargados
+            status_callback (callable, opcional): Función que recibe mensajes de estado
+            progress_callback (callable, opcional): Función (descargado, total) para el progreso
+            cancel_event (threading.Event, opcional): Evento que detiene la descarga
+            subtitle_languages (list, opcional): Código ISO 639-2 de cada archivo de subtítulos
+
+        Returns:
+            str: Modo de combinación usado
+
+        Raises:
+            StreamingUnavailable: Si alguna pista no se puede leer de forma secuencial
+            FFmpegError: Si FFmpeg o una de las descargas falló
+            DownloadCancelled: Si cancel_event se activó
+        """
+        status = status_callback or (lambda message: None)
+        tracks = [("video", video_url)] + ([("audio", audio_url)] if audio_url else [])
+        use_fifos = hasattr(os, 'mkfifo')
+        if len(tracks) > 1 and not use_fifos:
+            # Sin FIFOs solo hay una tubería: la entrada estándar de FFmpeg
+            raise StreamingUnavailable("Este sistema no admite FIFOs")
+
+        plans = []
+        for name, url in tracks:
+            pieces, size, layout = self.plan(url)
+            status(f"Pista de {name}: {layout}")
+            plans.append((name, url, pieces, size))
+
+        inputs = []
+        for name, _, _, _ in plans:
+            if use_fifos:
+                path = os.path.join(work_dir, f"{name}.fifo")
+                if os.path.exists(path):
+                    os.remove(path)
+                os.mkfifo(path)
+                inputs.append(path)
+            else:
+                inputs.append('pipe:0')
+
+        cmd, mode = build_mux_command(output_file, inputs[0], inputs[1] if len(inputs) > 1 else None,
+                                      subtitle_path, subtitle_languages=subtitle_languages)
+        # El progreso lo dan las descargas; FFmpeg puede esperar datos de la red sin estar colgado
+        runner = FFmpegRunner(cmd, cancel_event=cancel_event,
+                              stdin=subprocess.DEVNULL if use_fifos else subprocess.PIPE).start()
+
+        stop = threading.Event()
+        errors = []
+        progress = CombinedProgress(progress_callback)
+        writers = []
+        for (name, url, pieces, size), path in zip(plans, inputs):
+            writer = threading.Thread(target=self._feed, daemon=True,
+                                      args=(url, pieces, size, path, runner, progress.track(name), stop, errors))
+            writer.start()
+            writers.append(writer)
+
+        try:
+            runner.wait()
+        except (FFmpegError, DownloadCancelled):
+            self._remove(output_file)
+            if errors:
+                raise FFmpegError(f"Error al descargar en streaming: {errors[0]}", runner.log) from None
+            raise
+        finally:
+            stop.set()
+            for writer in writers:
+                writer.join()
+            if use_fifos:
+                for path in inputs:
+                    self._remove(path)
+        return mode
+
+    def _feed(self, url, pieces, size, path, runner, progress_callback, stop, errors):
+        """Descarga las piezas de una pista en orden y las escribe en la tubería de FFmpeg."""
+        written = 0
+        target = None
+        try:
+            target = runner.process.stdin if path == 'pipe:0' else self._open_fifo(path, runner.process, stop)
+            if target is None:
+                return
+            for piece in pieces:
+                if piece[0] == 'data':
+                    target.write(piece[1])
+                    written += len(piece[1])
+                    progress_callback(written, size)
+                    continue
+                _, start, end = piece
+                with self.session.get(url, headers=dict(self.headers, Range=f"bytes={start}-{end}"),
+                                      stream=True, timeout=(PROBE_TIMEOUT, READ_TIMEOUT)) as response:
+                    if response.status_code != 206:
+                        raise IOError(f"Respuesta inesperada {response.status_code} para {url}")
+                    throttle = self.bandwidth.throttle(url, stop) if self.bandwidth is not None else None
+                    for chunk in ChunkReader(response, limit=end + 1 - start, throttle=throttle):
+                        if stop.is_set():
+                            return
+                        target.write(chunk)
+                        written += len(chunk)
+                        progress_callback(written, size)
+        except BrokenPipeError:
+            # FFmpeg cerró la tubería; su código de salida dirá si fue un error
+            pass
+        except Exception as e:
+            if not stop.is_set():
+                # Sin esta pista FFmpeg produciría un archivo incompleto: detenerlo
+                errors.append(e)
+                runner.cancel()
+        finally:
+            if target is not None:
+                try:
+                    target.close()
+                except OSError:
+                    pass
+
+    def _open_fifo(self, path, process, stop):
+        """
+        Abre una FIFO para escritura sin bloquearse si FFmpeg termina antes de leerla.
+
+        Returns:
+            file: Archivo abierto, o None si FFmpeg ya terminó o se pidió parar
+        """
+        while True:
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as e:
+                if e.errno != errno.ENXIO:
+                    raise
+                if process.poll() is not None or stop.is_set():
+                    return None
+                time.sleep(FIFO_OPEN_INTERVAL)
+                continue
+            os.set_blocking(fd, True)
+            return os.fdopen(fd, 'wb')
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
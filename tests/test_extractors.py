@@ -0,0 +1,233 @@
+"""
+Pruebas de los motores de extracción sin navegador contra respuestas grabadas
+de Picta (tests/fixtures): la API de publicaciones, el manifiesto DASH, una
+lista HLS maestra y páginas /embed/. La red se sustituye por una sesión que
+responde con esos archivos.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import json
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractors import (ApiExtractor, EmbedPageExtractor, Extractor, run_extractors, parse_mpd_sources,
+                        parse_hls_sources, DASH_MIME_TYPE, HLS_MIME_TYPE)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+EMBED_URL = "https://www.picta.cu/embed/concierto-en-la-habana_48213"
+API_URL = "https://api.picta.cu/v2/publicacion/"
+MPD_URL = "https://cdn.picta.cu/videos/48213/manifest.mpd"
+HLS_URL = "https://cdn.picta.cu/videos/51002/master.m3u8?token=a1b2c3"
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+class RecordedResponse:
+    """Respuesta de requests con el cuerpo de un archivo grabado."""
+    def __init__(self, url, text, status_code=200):
+        self.url = url
+        self.text = text
+        self.status_code = status_code
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} para {self.url}", response=self)
+
+
+class RecordedSession:
+    """
+    Sesión que responde con archivos grabados según la URL (y el slug pedido a
+    la API) y anota las peticiones recibidas.
+    """
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, timeout=None, **kwargs):
+        key = url
+        if params and 'slug_url' in params:
+            key = f"{url}?slug_url={params['slug_url']}"
+        self.requests.append(key)
+        if key not in self.routes:
+            return RecordedResponse(url, "", 404)
+        return RecordedResponse(url, fixture(self.routes[key]))
+
+
+def api_route(slug="concierto-en-la-habana_48213"):
+    return f"{API_URL}?slug_url={slug}"
+
+
+class TestParseMpdSources:
+    def test_single_file_and_segmented_representations(self):
+        videos, audios = parse_mpd_sources(fixture("manifest.mpd"), MPD_URL)
+
+        assert [source['quality'] for source in videos] == ["480p", "720p", "1080p"]
+        assert videos[0] == {'url': "https://cdn.picta.cu/videos/48213/video%2F48213_480p.mp4",
+                             'quality': "480p", 'type': "video/mp4"}
+        # La representación por segmentos apunta al manifiesto con su id y lleva lo que se sabe de ella
+        segmented = videos[2]
+        assert segmented['url'] == f"{MPD_URL}#video-1080"
+        assert segmented['type'] == DASH_MIME_TYPE
+        assert segmented['bitrate'] == 4800000
+        assert segmented['duration'] == 200
+        assert segmented['size'] == 4800000 * 200 // 8
+
+    def test_audio_language_and_bitrate(self):
+        _, audios = parse_mpd_sources(fixture("manifest.mpd"), MPD_URL)
+
+        assert audios == [{'url': "https://cdn.picta.cu/videos/48213/audio%2F48213_spa_128k.mp4",
+                           'language': "Español (128k)"}]
+
+
+class TestParseHlsSources:
+    def test_master_playlist_variants_and_audio(self):
+        videos, audios = parse_hls_sources(fixture("master.m3u8"), HLS_URL)
+
+        assert videos == [
+            {'url': "https://cdn.picta.cu/videos/51002/480p/index.m3u8", 'quality': "480p",
+             'type': HLS_MIME_TYPE, 'bitrate': 1000000},
+            {'url': "https://cdn.picta.cu/videos/51002/720p/index.m3u8", 'quality': "720p",
+             'type': HLS_MIME_TYPE, 'bitrate': 2600000},
+        ]
+        # Los subtítulos HLS (WebVTT troceado) no se ofrecen
+        assert [track['url'] for track in audios] == ["https://cdn.picta.cu/videos/51002/audio/spa/index.m3u8",
+                                                      "https://cdn.picta.cu/videos/51002/audio/eng/index.m3u8"]
+        assert [track['language'] for track in audios] == ["Español (Unknown)", "Inglés (Unknown)"]
+
+    def test_media_playlist_is_its_own_source(self):
+        text = "#EXTM3U\n#EXT-X-TARGETDURATION:4\n#EXTINF:4.0,\nseg-1.ts\n#EXT-X-ENDLIST\n"
+        videos, audios = parse_hls_sources(text, "https://cdn.picta.cu/videos/7/720p/index.m3u8")
+
+        assert videos == [{'url': "https://cdn.picta.cu/videos/7/720p/index.m3u8", 'quality': "720p",
+                           'type': HLS_MIME_TYPE}]
+        assert audios == []
+
+
+class TestApiExtractor:
+    def test_publication_with_dash_manifest(self):
+        session = RecordedSession({api_route(): "api_publicacion.json", MPD_URL: "manifest.mpd"})
+
+        info = ApiExtractor(session).extract(EMBED_URL)
+
+        assert info['title'] == "Concierto en La Habana"
+        assert [source['quality'] for source in info['video_sources']] == ["480p", "720p", "1080p"]
+        assert [track['language'] for track in info['audio_tracks']] == ["Español (128k)"]
+        assert info['subtitles'] == [{'url': "https://cdn.picta.cu/subtitulos/48213/es.vtt",
+                                      'language': "Español"}]
+        assert session.requests == [api_route(), MPD_URL]
+
+    def test_unknown_publication(self):
+        session = RecordedSession({api_route(): "api_publicacion_vacia.json"})
+
+        assert ApiExtractor(session).extract(EMBED_URL) is None
+
+    def test_url_without_slug(self):
+        session = RecordedSession({})
+
+        assert ApiExtractor(session).extract("https://www.picta.cu/") is None
+        assert session.requests == []
+
+
+class TestEmbedPageExtractor:
+    def test_video_sources_and_tracks(self):
+        session = RecordedSession({EMBED_URL: "embed.html"})
+
+        info = EmbedPageExtractor(session).extract(EMBED_URL)
+
+        assert info['title'] == "Concierto en La Habana"
+        assert info['video_sources'] == [
+            {'url': "https://www.picta.cu/cdn/video%2F48213_720p.mp4", 'quality': "720p", 'type': "video/mp4"},
+            {'url': "https://cdn.picta.cu/videos/48213/video%2F48213_480p.mp4", 'quality': "480p",
+             'type': "video/mp4"},
+        ]
+        assert info['audio_tracks'] == []
+        assert info['subtitles'] == [
+            {'url': "https://www.picta.cu/cdn/subs%2F48213_es.vtt", 'language': "Español"},
+            {'url': "https://www.picta.cu/cdn/subs%2F48213_en.vtt", 'language': "Inglés"},
+        ]
+
+    def test_manifest_referenced_in_script(self):
+        session = RecordedSession({EMBED_URL: "embed_manifest.html", HLS_URL: "master.m3u8"})
+
+        info = EmbedPageExtractor(session).extract(EMBED_URL)
+
+        assert info['title'] == "Documental: Viñales"
+        assert [source['quality'] for source in info['video_sources']] == ["480p", "720p"]
+        assert len(info['audio_tracks']) == 2
+        # Sin <track>, los subtítulos salen del JSON de la página
+        assert info['subtitles'] == [{'url': "https://cdn.picta.cu/subtitulos/51002/es.vtt",
+                                      'language': "Español"}]
+
+    def test_page_without_media(self):
+        session = RecordedSession({EMBED_URL: "embed_sin_medios.html"})
+
+        info = EmbedPageExtractor(session).extract(EMBED_URL)
+
+        assert info['video_sources'] == []
+        assert info['subtitles'] == []
+
+
+class FailingExtractor(Extractor):
+    name = "fallo"
+
+    def extract(self, url):
+        raise requests.exceptions.ConnectionError("sin conexión")
+
+
+class TestRunExtractors:
+    def test_falls_back_when_the_api_has_no_media(self):
+        session = RecordedSession({api_route(): "api_publicacion_vacia.json", EMBED_URL: "embed.html"})
+        messages = []
+
+        info = run_extractors([ApiExtractor(session), EmbedPageExtractor(session)], EMBED_URL, messages.append)
+
+        assert info['title'] == "Concierto en La Habana"
+        assert len(info['video_sources']) == 2
+        assert messages == ["Obteniendo información del video (api)...",
+                            "Obteniendo información del video (embed)..."]
+
+    def test_falls_back_when_the_page_has_no_media(self):
+        session = RecordedSession({EMBED_URL: "embed_sin_medios.html", api_route(): "api_publicacion.json",
+                                   MPD_URL: "manifest.mpd"})
+
+        info = run_extractors([EmbedPageExtractor(session), ApiExtractor(session)], EMBED_URL)
+
+        assert len(info['video_sources']) == 3
+
+    def test_falls_back_after_an_error(self):
+        session = RecordedSession({EMBED_URL: "embed.html"})
+
+        info = run_extractors([FailingExtractor(), EmbedPageExtractor(session)], EMBED_URL)
+
+        assert len(info['video_sources']) == 2
+
+    def test_no_backend_finds_media(self):
+        session = RecordedSession({api_route(): "api_publicacion_vacia.json", EMBED_URL: "embed_sin_medios.html"})
+
+        assert run_extractors([ApiExtractor(session), EmbedPageExtractor(session)], EMBED_URL) is None
+
+
+    def test_later_backends_are_prepared_after_a_miss(self):
+        session = RecordedSession({api_route(): "api_publicacion_vacia.json", EMBED_URL: "embed.html"})
+        prepared = []
+
+        class FallbackExtractor(FailingExtractor):
+            name = "respaldo"
+
+            def prepare(self):
+                prepared.append(self.name)
+
+        run_extractors([ApiExtractor(session), EmbedPageExtractor(session), FallbackExtractor()], EMBED_URL)
+
+        # Solo el fallo de la API avisa al respaldo; la página sí encontró el video
+        assert prepared == ["respaldo"]
@@ -0,0 +1,38 @@
+"""
+Pruebas de la clasificación de las URLs del registro de red del navegador.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from network_log import classify_media_url
+
+
+class TestClassifyMediaUrl:
+    def test_audio_language_after_a_title_with_language_words(self):
+        url = "https://www.picta.cu/cdn/audio%2Fconcierto-en-la-habana_spa_128k.mp4"
+
+        kind, track = classify_media_url(url)
+
+        assert kind == 'audio_tracks'
+        assert track['language'] == "Español (128k)"
+
+    def test_subtitle_language_after_a_title_with_language_words(self):
+        assert classify_media_url("https://www.picta.cu/cdn/sub/concierto-en-la-habana_es.vtt")[1]['language'] == "Español"
+        assert classify_media_url("https://www.picta.cu/cdn/sub/clases-de-espanol-es-para-todos_en.vtt")[1]['language'] == "Inglés"
+
+    def test_language_with_region(self):
+        assert classify_media_url("https://www.picta.cu/cdn/subs%2F48213_es-ES.vtt")[1]['language'] == "Español"
+
+    def test_title_words_are_not_a_language(self):
+        assert classify_media_url("https://www.picta.cu/cdn/sub/noticias-de-hoy-en-cuba.vtt")[1]['language'] == "Desconocido"
+        kind, track = classify_media_url("https://www.picta.cu/cdn/audio%2Fmusica-en-vivo_48213_192k.mp4")
+        assert track['language'] == "Desconocido (192k)"
+
+    def test_video_quality(self):
+        assert classify_media_url("https://www.picta.cu/cdn/video%2F48213_720p.mp4") == (
+            'video_sources', {'url': "https://www.picta.cu/cdn/video%2F48213_720p.mp4", 'quality': "720p",
+                              'type': "video/mp4"})
@@ -0,0 +1,29 @@
+"""
+Pruebas del agregador de progreso.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from progress import ProgressAggregator
+
+
+class TestProgressAggregator:
+    def test_samples_again_after_a_restart(self):
+        published = threading.Event()
+        aggregator = ProgressAggregator(lambda samples, overall: published.set(), interval=0.01)
+        aggregator.start()
+        aggregator.stop()
+
+        aggregator.start()
+        try:
+            aggregator.update("pista", 100, 1000)
+            assert published.wait(1.0)
+            assert aggregator._thread.is_alive()
+        finally:
+            aggregator.stop()
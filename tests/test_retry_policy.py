@@ -0,0 +1,188 @@
+"""
+Pruebas de la política de reintentos con operaciones simuladas: clasificación
+de los errores, renovación de enlaces caducados y esperas (Retry-After).
+
+    python -m pytest tests
+"""
+import os
+import sys
+import http.client
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retry_policy import RetryPolicy, RETRY, REFRESH, FATAL, MAX_REFRESHES
+from segmented_download import DownloadCancelled, IncompleteRangeError
+from workspace import InsufficientSpaceError
+
+URL = "https://cdn.picta.cu/videos/48213/video%2F48213_720p.mp4?token=viejo"
+
+
+def http_error(status, retry_after=None):
+    response = requests.Response()
+    response.status_code = status
+    response.url = URL
+    if retry_after is not None:
+        response.headers['Retry-After'] = retry_after
+    return requests.exceptions.HTTPError(f"{status}", response=response)
+
+
+class FakeOperation:
+    """Descarga simulada: lanza los errores indicados en orden y después devuelve la URL."""
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.urls = []
+
+    def __call__(self, url):
+        self.urls.append(url)
+        if self.errors:
+            raise self.errors.pop(0)
+        return url
+
+
+class RecordingEvent:
+    """Evento de cancelación que anota las esperas sin dormir."""
+    def __init__(self, cancelled=False):
+        self.waits = []
+        self.cancelled = cancelled
+
+    def wait(self, timeout):
+        self.waits.append(timeout)
+        return self.cancelled
+
+
+def policy(**kwargs):
+    kwargs.setdefault('jitter', 0)
+    return RetryPolicy(**kwargs)
+
+
+class TestClassify:
+    @pytest.mark.parametrize("status", [408, 429, 500, 502, 503, 504, 522])
+    def test_transient_statuses(self, status):
+        assert policy().classify(http_error(status)) == RETRY
+
+    @pytest.mark.parametrize("status", [401, 403, 410])
+    def test_expired_link_statuses(self, status):
+        assert policy().classify(http_error(status)) == REFRESH
+
+    @pytest.mark.parametrize("status", [400, 404, 416])
+    def test_permanent_statuses(self, status):
+        assert policy().classify(http_error(status)) == FATAL
+
+    def test_http_error_without_response(self):
+        assert policy().classify(requests.exceptions.HTTPError("sin respuesta")) == FATAL
+
+    @pytest.mark.parametrize("error", [
+        requests.exceptions.ConnectionError("conexión reiniciada"),
+        requests.exceptions.ReadTimeout("plazo agotado"),
+        requests.exceptions.ChunkedEncodingError("fragmento incompleto"),
+        http.client.IncompleteRead(b""),
+        ConnectionResetError(),
+        TimeoutError(),
+        IncompleteRangeError("rango incompleto"),
+    ])
+    def test_transient_errors(self, error):
+        assert policy().classify(error) == RETRY
+
+    @pytest.mark.parametrize("error", [
+        DownloadCancelled(URL),
+        InsufficientSpaceError("sin espacio"),
+        ValueError("respuesta inesperada"),
+    ])
+    def test_fatal_errors(self, error):
+        assert policy().classify(error) == FATAL
+
+
+class TestRun:
+    def test_transient_errors_are_retried(self):
+        operation = FakeOperation(http_error(503), requests.exceptions.ConnectionError())
+        event = RecordingEvent()
+
+        assert policy(base_delay=1.0).run(operation, URL, cancel_event=event) == URL
+        assert operation.urls == [URL, URL, URL]
+        assert event.waits == [1.0, 2.0]
+
+    def test_attempts_are_limited(self):
+        operation = FakeOperation(*[http_error(503)] * 5)
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            policy(attempts=3).run(operation, URL, cancel_event=RecordingEvent())
+        assert len(operation.urls) == 3
+
+    def test_fatal_errors_are_not_retried(self):
+        operation = FakeOperation(http_error(404))
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            policy().run(operation, URL, cancel_event=RecordingEvent())
+        assert operation.urls == [URL]
+
+    def test_expired_link_is_refreshed_without_waiting(self):
+        operation = FakeOperation(http_error(403))
+        event = RecordingEvent()
+
+        result = policy().run(operation, URL, refresh=lambda: URL + "&renovado", cancel_event=event)
+
+        assert result == URL + "&renovado"
+        assert operation.urls == [URL, URL + "&renovado"]
+        assert event.waits == []
+
+    def test_refresh_budget(self):
+        operation = FakeOperation(*[http_error(403)] * (MAX_REFRESHES + 1))
+        refreshed = []
+
+        def refresh():
+            refreshed.append(True)
+            return f"{URL}&renovado={len(refreshed)}"
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            policy().run(operation, URL, refresh=refresh, cancel_event=RecordingEvent())
+        assert len(refreshed) == MAX_REFRESHES
+        assert len(operation.urls) == MAX_REFRESHES + 1
+
+    def test_expired_link_without_refresher(self):
+        operation = FakeOperation(http_error(410))
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            policy().run(operation, URL, cancel_event=RecordingEvent())
+        assert operation.urls == [URL]
+
+    def test_failed_refresh_raises_the_original_error(self):
+        operation = FakeOperation(http_error(401))
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            policy().run(operation, URL, refresh=lambda: None, cancel_event=RecordingEvent())
+
+    def test_cancelled_during_the_wait(self):
+        operation = FakeOperation(http_error(503))
+
+        with pytest.raises(DownloadCancelled):
+            policy().run(operation, URL, cancel_event=RecordingEvent(cancelled=True))
+        assert operation.urls == [URL]
+
+
+class TestRetryAfter:
+    def test_retry_after_extends_the_wait(self):
+        assert policy(base_delay=1.0).delay(1, http_error(429, "7")) == 7.0
+
+    def test_retry_after_is_capped(self):
+        assert policy(max_delay=30.0).delay(1, http_error(503, "3600")) == 30.0
+
+    def test_shorter_retry_after_keeps_the_backoff(self):
+        assert policy(base_delay=1.0).delay(4, http_error(503, "2")) == 8.0
+
+    def test_unparseable_retry_after_is_ignored(self):
+        assert policy(base_delay=1.0).delay(1, http_error(503, "Wed, 21 Oct 2026 07:28:00 GMT")) == 1.0
+
+    def test_run_waits_for_retry_after(self):
+        event = RecordingEvent()
+
+        policy(base_delay=1.0).run(FakeOperation(http_error(429, "5")), URL, cancel_event=event)
+
+        assert event.waits == [5.0]
+
+    def test_jitter_only_shortens_the_wait(self):
+        delays = [RetryPolicy(base_delay=4.0, jitter=0.5).delay(1) for _ in range(50)]
+
+        assert all(2.0 <= delay <= 4.0 for delay in delays)
@@ -0,0 +1,175 @@
+"""
+Pruebas de las políticas de selección de pistas con las que se resuelven los
+trabajos desatendidos.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_manifest import MediaManifest
+from selection import (SelectionPolicy, ManualSelection, SelectionError, SUBTITLES_ALL, policy_from_dict)
+
+URL = "https://www.picta.cu/medias/concierto-en-la-habana_48213"
+MB = 1048576
+
+
+def video(quality, size=None, height=None, url=None):
+    source = {'url': url or f"https://cdn.picta.cu/48213_{quality}.mp4", 'quality': quality, 'type': "video/mp4"}
+    if size is not None:
+        source['size'] = size
+    if height is not None:
+        source['height'] = height
+    return source
+
+
+def audio(language, url=None, size=None):
+    track = {'url': url or f"https://cdn.picta.cu/48213_{language}.mp4", 'language': language}
+    if size is not None:
+        track['size'] = size
+    return track
+
+
+def subtitle(language, url=None):
+    return {'url': url or f"https://cdn.picta.cu/48213_{language}.vtt", 'language': language}
+
+
+def manifest(videos, audios=(), subtitles=()):
+    return MediaManifest(URL, "Concierto en La Habana", list(videos), list(audios), list(subtitles))
+
+
+class TestMaxHeight:
+    def test_best_quality_without_limit(self):
+        selection = SelectionPolicy().resolve(manifest([video("480p"), video("1080p"), video("720p")]))
+
+        assert selection['video']['quality'] == "1080p"
+
+    def test_best_quality_up_to_the_limit(self):
+        selection = SelectionPolicy(max_height=720).resolve(
+            manifest([video("480p"), video("1080p"), video("720p")]))
+
+        assert selection['video']['quality'] == "720p"
+
+    def test_probed_height_wins_over_the_label(self):
+        selection = SelectionPolicy(max_height=720).resolve(
+            manifest([video("720p", height=1080), video("480p")]))
+
+        assert selection['video']['quality'] == "480p"
+
+    def test_unknown_heights_are_skipped_when_some_are_known(self):
+        selection = SelectionPolicy(max_height=720).resolve(manifest([video("Unknown"), video("480p")]))
+
+        assert selection['video']['quality'] == "480p"
+
+    def test_unknown_heights_are_accepted_when_none_is_known(self):
+        selection = SelectionPolicy(max_height=720).resolve(manifest([video("Unknown")]))
+
+        assert selection['video']['quality'] == "Unknown"
+
+    def test_nothing_under_the_limit(self):
+        with pytest.raises(SelectionError):
+            SelectionPolicy(max_height=360).resolve(manifest([video("480p"), video("720p")]))
+
+
+class TestAudioLanguages:
+    TRACKS = [audio("Inglés (128k)"), audio("Español (128k)"), audio("Español (192k)")]
+
+    def test_first_available_language_in_order(self):
+        selection = SelectionPolicy(audio_languages=['fra', 'spa', 'eng']).resolve(
+            manifest([video("720p")], self.TRACKS))
+
+        assert selection['audio']['language'] == "Español (192k)"
+
+    def test_language_names_and_codes_are_equivalent(self):
+        policy = SelectionPolicy(audio_languages=['Inglés'])
+
+        assert policy.resolve(manifest([video("720p")], self.TRACKS))['audio']['language'] == "Inglés (128k)"
+
+    def test_first_track_when_no_language_matches(self):
+        selection = SelectionPolicy(audio_languages=['fra']).resolve(manifest([video("720p")], self.TRACKS))
+
+        assert selection['audio']['language'] == "Inglés (128k)"
+
+    def test_without_audio(self):
+        assert SelectionPolicy(audio=False).resolve(manifest([video("720p")], self.TRACKS))['audio'] is None
+
+
+class TestMaxSize:
+    def test_largest_video_that_fits_with_the_audio(self):
+        selection = SelectionPolicy(max_size_mb=100).resolve(
+            manifest([video("1080p", 150 * MB), video("720p", 90 * MB), video("480p", 40 * MB)],
+                     [audio("Español (128k)", size=20 * MB)]))
+
+        assert selection['video']['quality'] == "480p"
+
+    def test_unknown_sizes_are_accepted(self):
+        selection = SelectionPolicy(max_size_mb=100).resolve(
+            manifest([video("1080p", 150 * MB), video("720p"), video("480p", 40 * MB)]))
+
+        assert selection['video']['quality'] == "720p"
+
+    def test_unknown_audio_size_counts_as_zero(self):
+        selection = SelectionPolicy(max_size_mb=100).resolve(
+            manifest([video("720p", 95 * MB)], [audio("Español (128k)")]))
+
+        assert selection['video']['quality'] == "720p"
+
+    def test_nothing_fits(self):
+        with pytest.raises(SelectionError):
+            SelectionPolicy(max_size_mb=10).resolve(manifest([video("720p", 90 * MB), video("480p", 40 * MB)]))
+
+
+class TestSubtitles:
+    SUBTITLES = [subtitle("Inglés"), subtitle("Español")]
+
+    def test_requested_languages_in_order(self):
+        selection = SelectionPolicy(subtitles=['es', 'en']).resolve(manifest([video("720p")], (), self.SUBTITLES))
+
+        assert [track['language'] for track in selection['subtitles']] == ["Español", "Inglés"]
+        assert selection['subtitle']['language'] == "Español"
+
+    def test_equivalent_codes_pick_a_track_once(self):
+        selection = SelectionPolicy(subtitles=['es', 'spa', 'Español']).resolve(
+            manifest([video("720p")], (), self.SUBTITLES))
+
+        assert selection['subtitles'] == [self.SUBTITLES[1]]
+
+    def test_all_subtitles(self):
+        selection = SelectionPolicy(subtitles=SUBTITLES_ALL).resolve(manifest([video("720p")], (), self.SUBTITLES))
+
+        assert selection['subtitles'] == self.SUBTITLES
+
+
+class TestManualSelection:
+    def test_tracks_are_taken_from_a_renewed_manifest(self):
+        old = manifest([video("480p"), video("720p")], [audio("Español (128k)")], [subtitle("Español")])
+        policy = ManualSelection(old.video_sources[1], old.audio_tracks[0], old.subtitles)
+        renewed = manifest([video("480p", url="https://cdn.picta.cu/nuevo_480p.mp4"),
+                            video("720p", url="https://cdn.picta.cu/nuevo_720p.mp4")],
+                           [audio("Español (128k)", url="https://cdn.picta.cu/nuevo_spa.mp4")],
+                           [subtitle("Español", url="https://cdn.picta.cu/nuevo_es.vtt")])
+
+        selection = policy_from_dict(policy.to_dict()).resolve(renewed)
+
+        assert selection['video']['url'] == "https://cdn.picta.cu/nuevo_720p.mp4"
+        assert selection['audio']['url'] == "https://cdn.picta.cu/nuevo_spa.mp4"
+        assert [track['url'] for track in selection['subtitles']] == ["https://cdn.picta.cu/nuevo_es.vtt"]
+
+    def test_missing_quality_in_the_renewed_manifest(self):
+        old = manifest([video("480p"), video("1080p")])
+        renewed = manifest([video("480p"), video("720p")])
+
+        with pytest.raises(SelectionError):
+            ManualSelection(old.video_sources[1]).resolve(renewed)
+
+    def test_tracks_missing_from_the_renewed_manifest_are_kept(self):
+        old = manifest([video("720p")], [audio("Español (128k)"), audio("Inglés (128k)")])
+        renewed = manifest([video("720p")], [audio("Español (192k)"), audio("Francés (128k)")])
+
+        selection = ManualSelection(old.video_sources[0], old.audio_tracks[1]).resolve(renewed)
+
+        assert selection['audio'] == old.audio_tracks[1]
@@ -0,0 +1,376 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_MAX_SPANS = 10000        # Tramos que se conservan en memoria (los más recientes)
+TRACE_FILE_ENV = 'PICTA_TRACE_FILE'
+
+# Trabajo al que pertenecen los tramos del hilo (o del contexto) actual
+_current_job = contextvars.ContextVar('picta_job', default=None)
+
+_shared_tracer = None
+_shared_tracer_lock = threading.Lock()
+
+
+class Span:
+    """
+    Tramo de tiempo de una etapa (análisis, descarga de una pista, FFmpeg...).
+    Se crea con Tracer.span() y se cierra al salir del bloque with.
+    """
+    __slots__ = ('name', 'job', 'start', 'duration', 'thread', 'thread_name', 'attrs', 'bytes', 'error',
+                 '_started')
+
+    def __init__(self, name, job, attrs):
+        self.name = name
+        self.job = job
+        self.attrs = attrs
+        self.bytes = 0
+        self.error = None
+        self.duration = None
+        thread = threading.current_thread()
+        self.thread = thread.ident
+        self.thread_name = thread.name
+        self.start = time.time()
+        self._started = time.perf_counter()
+
+    def set(self, **attrs):
+        """Añade atributos al tramo (modo de combinación, número de pistas...)."""
+        self.attrs.update(attrs)
+
+    def add_bytes(self, count):
+        """Suma bytes transferidos por la etapa (para calcular su rendimiento)."""
+        self.bytes += count
+
+    def to_dict(self):
+        """
+        Serializa el tramo.
+
+        Returns:
+            dict: name, job, start (epoch), duration (s), thread, attrs, bytes, throughput
+            (bytes/s o None) y error
+        """
+        throughput = self.bytes / self.duration if self.bytes and self.duration else None
+        return {
+            'name': self.name,
+            'job': self.job,
+            'start': round(self.start, 6),
+            'duration': round(self.duration, 6) if self.duration is not None else None,
+            'thread': self.thread_name,
+            'attrs': self.attrs,
+            'bytes': self.bytes,
+            'throughput': round(throughput) if throughput else None,
+            'error': self.error,
+        }
+
+
+class Tracer:
+    """
+    Registro de tiempos de todas las etapas de los trabajos.
+    Cada tramo lleva el trabajo al que pertenece (tomado del contexto que fija
+    JobQueue), su duración, los bytes transferidos y atributos libres. Los
+    tramos cerrados se guardan en memoria y se envían a los destinos
+    registrados (por ejemplo, un archivo JSON Lines); además se acumulan
+    totales por etapa para exportarlos como métricas de Prometheus o como
+    traza de Chrome (chrome://tracing, Perfetto).
+    """
+    def __init__(self, max_spans=DEFAULT_MAX_SPANS):
+        """
+        Inicializa el registro.
+
+        Args:
+            max_spans (int, opcional): Tramos que se conservan en memoria
+        """
+        self._spans = deque(maxlen=max_spans)
+        self._events = deque(maxlen=max_spans)
+        self._totals = {}
+        self._sinks = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def job(self, job_id):
+        """
+        Asocia al trabajo los tramos que se abran dentro del bloque.
+
+        Args:
+            job_id (str): Identificador del trabajo
+        """
+        token = _current_job.set(job_id)
+        try:
+            yield
+        finally:
+            _current_job.reset(token)
+
+    @staticmethod
+    def bind(function):
+        """
+        Envuelve una función para que, ejecutada en otro hilo, conserve el trabajo actual.
+
+        Args:
+            function (callable): Función a envolver
+
+        Returns:
+            callable: Función que se ejecuta asociada al trabajo actual (se puede llamar
+            a la vez desde varios hilos)
+        """
+        job = _current_job.get()
+
+        def bound(*args, **kwargs):
+            token = _current_job.set(job)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _current_job.reset(token)
+        return bound
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Mide un bloque de código.
+
+        Args:
+            name (str): Etapa ("analysis", "download.track", "mux"...)
+            **attrs: Atributos del tramo
+
+        Yields:
+            Span: Tramo abierto (admite set() y add_bytes())
+        """
+        span = Span(name, _current_job.get(), attrs)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration = time.perf_counter() - span._started
+            self._record(span)
+
+    def event(self, name, **attrs):
+        """
+        Registra un suceso puntual (un reintento, una renovación de enlace...).
+
+        Args:
+            name (str): Nombre del suceso
+            **attrs: Atributos del suceso
+        """
+        record = {'name': name, 'job': _current_job.get(), 'time': round(time.time(), 6),
+                  'thread': threading.current_thread().name, 'attrs': attrs}
+        with self._lock:
+            self._events.append(record)
+            totals = self._totals.setdefault(name, _new_totals())
+            totals['count'] += 1
+        self._emit(dict(record, type='event'))
+
+    def add_sink(self, sink):
+        """
+        Registra un destino que recibe cada tramo y suceso al cerrarse.
+
+        Args:
+            sink (callable): Función (dict); los tramos llevan type='span' y los sucesos type='event'
+        """
+        self._sinks.append(sink)
+
+    def open_jsonl(self, path):
+        """
+        Escribe a partir de ahora cada tramo y suceso como una línea JSON en un archivo.
+
+        Args:
+            path (str): Ruta del archivo (se añade al final)
+
+        Returns:
+            JsonLinesSink: Destino creado (close() lo cierra)
+        """
+        sink = JsonLinesSink(path)
+        self.add_sink(sink)
+        return sink
+
+    def spans(self, job=None):
+        """
+        Devuelve los tramos cerrados que se conservan en memoria.
+
+        Args:
+            job (str, opcional): Solo los de este trabajo
+
+        Returns:
+            list: Tramos serializados (Span.to_dict()), en orden de cierre
+        """
+        with self._lock:
+            spans = list(self._spans)
+        return [span.to_dict() for span in spans if job is None or span.job == job]
+
+    def job_summary(self, job):
+        """
+        Resume el tiempo y los bytes de cada etapa de un trabajo.
+
+        Args:
+            job (str): Identificador del trabajo
+
+        Returns:
+            dict: {etapa: {'seconds', 'bytes', 'count'}} en orden de aparición
+        """
+        summary = {}
+        for span in self.spans(job):
+            stage = summary.setdefault(span['name'], {'seconds': 0.0, 'bytes': 0, 'count': 0})
+            stage['seconds'] += span['duration']
+            stage['bytes'] += span['bytes']
+            stage['count'] += 1
+        return summary
+
+    def to_prometheus(self, prefix="picta"):
+        """
+        Exporta los totales por etapa en el formato de texto de Prometheus.
+
+        Args:
+            prefix (str, opcional): Prefijo de las métricas
+
+        Returns:
+            str: Métricas (seconds_total, count_total, bytes_total y errors_total por etapa)
+        """
+        with self._lock:
+            totals = {name: dict(values) for name, values in self._totals.items()}
+        metrics = (
+            ('stage_seconds_total', 'counter', "Tiempo total en cada etapa", 'seconds'),
+            ('stage_count_total', 'counter', "Veces que se ejecutó cada etapa o suceso", 'count'),
+            ('stage_bytes_total', 'counter', "Bytes transferidos en cada etapa", 'bytes'),
+            ('stage_errors_total', 'counter', "Etapas que terminaron con error", 'errors'),
+        )
+        lines = []
+        for metric, kind, description, key in metrics:
+            lines.append(f"# HELP {prefix}_{metric} {description}")
+            lines.append(f"# TYPE {prefix}_{metric} {kind}")
+            for name in sorted(totals):
+                lines.append(f'{prefix}_{metric}{{stage="{_label(name)}"}} {_number(totals[name][key])}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, prefix="picta"):
+        """
+        Escribe las métricas en un archivo (para el recolector de archivos de texto de node_exporter).
+
+        Args:
+            path (str): Ruta del archivo
+            prefix (str, opcional): Prefijo de las métricas
+        """
+        _write_atomic(path, self.to_prometheus(prefix))
+
+    def to_chrome_trace(self):
+        """
+        Exporta los tramos en memoria en el formato Trace Event de Chrome.
+
+        Returns:
+            dict: Traza lista para json.dump (se abre en chrome://tracing o ui.perfetto.dev)
+        """
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self._spans)
+            events = list(self._events)
+        trace = []
+        threads = {}
+        for span in spans:
+            threads[span.thread] = span.thread_name
+            args = dict(span.attrs, job=span.job, bytes=span.bytes)
+            if span.error:
+                args['error'] = span.error
+            trace.append({'name': span.name, 'cat': span.job or 'app', 'ph': 'X', 'pid': pid,
+                          'tid': span.thread, 'ts': int(span.start * 1e6), 'dur': int(span.duration * 1e6),
+                          'args': args})
+        for event in events:
+            trace.append({'name': event['name'], 'cat': event['job'] or 'app', 'ph': 'i', 's': 't',
+                          'pid': pid, 'tid': next((tid for tid, name in threads.items()
+                                                   if name == event['thread']), 0),
+                          'ts': int(event['time'] * 1e6), 'args': dict(event['attrs'], job=event['job'])})
+        for tid, name in threads.items():
+            trace.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path):
+        """
+        Escribe la traza de Chrome en un archivo.
+
+        Args:
+            path (str): Ruta del archivo (.json)
+        """
+        _write_atomic(path, json.dumps(self.to_chrome_trace(), ensure_ascii=False))
+
+    def _record(self, span):
+        """Guarda un tramo cerrado, actualiza los totales y lo envía a los destinos."""
+        with self._lock:
+            self._spans.append(span)
+            totals = self._totals.setdefault(span.name, _new_totals())
+            totals['seconds'] += span.duration
+            totals['count'] += 1
+            totals['bytes'] += span.bytes
+            totals['errors'] += 1 if span.error else 0
+        if self._sinks:
+            self._emit(dict(span.to_dict(), type='span'))
+
+    def _emit(self, record):
+        for sink in list(self._sinks):
+            try:
+                sink(record)
+            except Exception as e:
+                print(f"Error al escribir la traza: {e}")
+
+
+class JsonLinesSink:
+    """Destino que añade cada registro como una línea JSON a un archivo."""
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def _new_totals():
+    return {'seconds': 0.0, 'count': 0, 'bytes': 0, 'errors': 0}
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return f"{value:.6f}" if isinstance(value, float) else str(value)
+
+
+def _write_atomic(path, text):
+    """Escribe un archivo completo de golpe (nunca queda a medias para quien lo lee)."""
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+def get_tracer():
+    """
+    Devuelve el registro de tiempos compartido por todo el proceso, creándolo si no existe.
+    Si la variable de entorno PICTA_TRACE_FILE está definida, los tramos se
+    escriben además en ese archivo JSON Lines.
+
+    Returns:
+        Tracer: Registro compartido
+    """
+    global _shared_tracer
+    with _shared_tracer_lock:
+        if _shared_tracer is None:
+            _shared_tracer = Tracer()
+            path = os.environ.get(TRACE_FILE_ENV)
+            if path:
+                try:
+                    _shared_tracer.open_jsonl(path)
+                except OSError as e:
+                    print(f"No se pudo abrir el archivo de trazas {path}: {e}")
+        return _shared_tracer
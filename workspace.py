@@ -0,0 +1,345 @@
+import os
+import json
+import errno
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+
+from download_journal import DownloadJournal, SegmentJournal, JOURNAL_SUFFIX, SEGMENTS_SUFFIX
+
+LOCK_FILE = '.lock'                      # Marca de un espacio de trabajo en uso (con el PID)
+SPACE_MARGIN = 64 * 1024 * 1024          # Espacio libre que se deja siempre en el disco
+ORPHAN_MAX_AGE = 7 * 24 * 3600           # Segundos que se conservan los datos reanudables huérfanos
+LOCK_WRITE_GRACE = 10.0                  # Segundos que una marca recién creada puede estar aún vacía
+TEMP_ROOT_ENV = 'PICTA_TEMP_DIR'         # Variable de entorno con el directorio temporal
+
+# Espacios de trabajo en uso dentro de este proceso (todas las instancias comparten el registro)
+_active = set()
+_active_lock = threading.Lock()
+
+
+class InsufficientSpaceError(OSError):
+    """No hay espacio libre suficiente para la descarga."""
+
+
+def default_temp_root():
+    """
+    Devuelve el directorio raíz de los espacios de trabajo.
+    Se puede cambiar con la variable de entorno PICTA_TEMP_DIR (por ejemplo,
+    a un disco en RAM o al mismo sistema de archivos que los videos).
+
+    Returns:
+        str: Ruta del directorio raíz
+    """
+    return os.environ.get(TEMP_ROOT_ENV) or os.path.join(tempfile.gettempdir(), "picta_downloader")
+
+
+def preallocate(fd, size):
+    """
+    Reserva en disco el tamaño completo de un archivo abierto.
+    Usa posix_fallocate donde existe (evita la fragmentación y detecta la falta
+    de espacio al principio); en otros sistemas solo fija el tamaño.
+
+    Args:
+        fd (int): Descriptor del archivo
+        size (int): Tamaño en bytes
+    """
+    os.ftruncate(fd, size)
+    if size and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError as e:
+            # Algunos sistemas de archivos no lo admiten; el archivo ya tiene su tamaño
+            if e.errno == errno.ENOSPC:
+                raise InsufficientSpaceError(e.errno, "No hay espacio en disco para preasignar el archivo")
+
+
+def _pid_alive(pid):
+    """Comprueba si un proceso sigue en ejecución."""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _same_filesystem(path_a, path_b):
+    """Indica si dos rutas existentes están en el mismo sistema de archivos."""
+    try:
+        return os.stat(path_a).st_dev == os.stat(path_b).st_dev
+    except OSError:
+        return False
+
+
+class Workspace:
+    """
+    Directorio temporal exclusivo de un trabajo.
+    Mientras está en uso tiene un archivo .lock con el PID del proceso, para
+    que ni otros trabajos ni la limpieza de huérfanos lo toquen. Al liberarlo
+    los datos se conservan (para reanudar) salvo que se elimine.
+    """
+    def __init__(self, manager, path):
+        self.manager = manager
+        self.path = path
+
+    def file(self, name):
+        """
+        Devuelve la ruta de un archivo dentro del espacio de trabajo.
+
+        Args:
+            name (str): Nombre del archivo
+
+        Returns:
+            str: Ruta completa
+        """
+        return os.path.join(self.path, name)
+
+    def staging_path(self, output_file):
+        """
+        Devuelve dónde escribir el archivo final antes de moverlo a su destino.
+        Si el espacio de trabajo está en el mismo disco que el destino se escribe
+        dentro de él; si no, junto al destino con otro nombre. En ambos casos el
+        paso final es un renombrado atómico.
+
+        Args:
+            output_file (str): Ruta final del video
+
+        Returns:
+            str: Ruta temporal del archivo final
+        """
+        output_dir = os.path.dirname(os.path.abspath(output_file))
+        if _same_filesystem(self.path, output_dir):
+            return self.file("output.mp4")
+        root, extension = os.path.splitext(output_file)
+        return f"{root}.part{extension}"
+
+    def check_space(self, downloads, output_size, output_dir):
+        """
+        Comprueba que hay espacio para descargar las pistas y escribir el archivo final.
+        Los bytes ya descargados (según los diarios) no se vuelven a contar.
+
+        Args:
+            downloads (dict): Tamaño (Content-Length) de cada archivo que se descargará
+                en el espacio de trabajo, por nombre
+            output_size (int): Tamaño estimado del archivo final
+            output_dir (str): Directorio donde se escribirá el archivo final
+
+        Raises:
+            InsufficientSpaceError: Si falta espacio en alguno de los discos
+        """
+        remaining = 0
+        for name, size in downloads.items():
+            if size:
+                remaining += max(0, size - self._downloaded_bytes(self.file(name), size))
+
+        # Los temporales y el archivo final coexisten hasta que termina la combinación
+        needs = {self.path: remaining}
+        if _same_filesystem(self.path, output_dir):
+            needs[self.path] += output_size
+        else:
+            needs[output_dir] = output_size
+
+        for path, required in needs.items():
+            free = shutil.disk_usage(path).free
+            if required + self.manager.margin > free:
+                raise InsufficientSpaceError(
+                    f"Espacio insuficiente en {path}: se necesitan {required / 1048576:.0f} MB "
+                    f"y hay {max(0, free - self.manager.margin) / 1048576:.0f} MB disponibles")
+
+    def commit(self, source, destination):
+        """
+        Mueve un archivo terminado a su destino de forma atómica.
+        Si están en el mismo sistema de archivos es un simple rename; si no,
+        se copia junto al destino con otro nombre y luego se renombra, así
+        nunca aparece un archivo final a medio escribir.
+
+        Args:
+            source (str): Archivo dentro del espacio de trabajo
+            destination (str): Ruta final
+        """
+        try:
+            os.replace(source, destination)
+            return
+        except OSError:
+            if _same_filesystem(source, os.path.dirname(os.path.abspath(destination))):
+                raise
+        partial = destination + '.part'
+        shutil.copyfile(source, partial)
+        os.replace(partial, destination)
+        os.remove(source)
+
+    def release(self):
+        """Deja de usar el espacio de trabajo sin borrar sus datos (para reanudar)."""
+        self.manager._release(self.path)
+
+    def remove(self):
+        """Libera el espacio de trabajo y borra su contenido."""
+        self.release()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    @staticmethod
+    def _downloaded_bytes(path, size):
+        """Bytes ya descargados de un archivo según su diario (por rangos o por segmentos)."""
+        journal = DownloadJournal.load(path)
+        if journal:
+            return journal.completed_bytes if journal.size == size else 0
+        journal = SegmentJournal.load(path)
+        return min(journal.completed_bytes, size) if journal else 0
+
+
+class WorkspaceManager:
+    """
+    Reparte directorios temporales exclusivos entre los trabajos.
+    El nombre de cada directorio depende del medio y de las pistas elegidas,
+    así que al reanudar un trabajo se encuentra su descarga parcial; si otro
+    trabajo (de este u otro proceso) lo está usando, se crea uno nuevo.
+    """
+    def __init__(self, root=None, margin=SPACE_MARGIN):
+        """
+        Inicializa el gestor.
+
+        Args:
+            root (str, opcional): Directorio raíz (por defecto default_temp_root())
+            margin (int, opcional): Espacio libre que se deja siempre en el disco
+        """
+        self.root = root or default_temp_root()
+        self.margin = margin
+
+    def acquire(self, media_id, selection_key=""):
+        """
+        Reserva el espacio de trabajo de un trabajo.
+
+        Args:
+            media_id (str): Identificador del medio
+            selection_key (str, opcional): Descripción de las pistas elegidas
+
+        Returns:
+            Workspace: Espacio de trabajo reservado
+        """
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha1(selection_key.encode('utf-8')).hexdigest()[:8]
+        base = f"{''.join(c if c.isalnum() or c in '-_' else '_' for c in media_id or 'video')}-{digest}"
+
+        attempt = 0
+        while True:
+            name = base if attempt == 0 else f"{base}-{attempt}"
+            path = os.path.join(self.root, name)
+            with _active_lock:
+                if path not in _active:
+                    os.makedirs(path, exist_ok=True)
+                    if self._try_lock(path):
+                        _active.add(path)
+                        return Workspace(self, path)
+            attempt += 1
+
+    def cleanup_orphans(self, max_age=ORPHAN_MAX_AGE):
+        """
+        Borra los espacios de trabajo abandonados (por ejemplo, tras un cierre forzoso).
+        Se conservan los que están en uso y, durante max_age, los que tienen una
+        descarga parcial que se puede reanudar.
+
+        Args:
+            max_age (float, opcional): Segundos que se conservan los datos reanudables
+
+        Returns:
+            list: Rutas eliminadas
+        """
+        removed = []
+        if not os.path.isdir(self.root):
+            return removed
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path):
+                continue
+            with _active_lock:
+                if path in _active or self._locked_elsewhere(path):
+                    continue
+                try:
+                    entries = os.listdir(path)
+                    age = now - max(os.path.getmtime(os.path.join(path, entry)) for entry in entries) \
+                        if entries else now - os.path.getmtime(path)
+                except OSError:
+                    continue
+                resumable = any(entry.endswith((JOURNAL_SUFFIX, SEGMENTS_SUFFIX)) for entry in entries)
+                if resumable and age < max_age:
+                    # Los FIFO y temporales sueltos no sirven para reanudar
+                    for entry in entries:
+                        if entry.endswith(('.fifo', '.tmp', '.part')) or entry == LOCK_FILE:
+                            try:
+                                os.remove(os.path.join(path, entry))
+                            except OSError:
+                                pass
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(path)
+        if removed:
+            print(f"Eliminados {len(removed)} espacios de trabajo huérfanos")
+        return removed
+
+    def _release(self, path):
+        """Quita la marca de uso de un espacio de trabajo."""
+        with _active_lock:
+            _active.discard(path)
+            try:
+                os.remove(os.path.join(path, LOCK_FILE))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _try_lock(path):
+        """
+        Marca un espacio de trabajo como en uso por este proceso.
+        La marca se crea de forma atómica (O_EXCL), así que si dos procesos lo
+        intentan a la vez solo uno lo consigue. Una marca que dejó un proceso
+        que ya terminó se retira y se vuelve a intentar.
+
+        Returns:
+            bool: True si la marca es de este proceso
+        """
+        lock_path = os.path.join(path, LOCK_FILE)
+        for _ in range(2):
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if WorkspaceManager._locked_elsewhere(path):
+                    return False
+                try:
+                    os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'pid': os.getpid(), 'created_at': time.time()}, f)
+            return True
+        return False
+
+    @staticmethod
+    def _locked_elsewhere(path):
+        """Indica si otro proceso vivo está usando el espacio de trabajo."""
+        lock_path = os.path.join(path, LOCK_FILE)
+        try:
+            with open(lock_path, 'r', encoding='utf-8') as f:
+                pid = int(json.load(f)['pid'])
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError, TypeError):
+            # Otro proceso puede haber creado la marca y no haber escrito aún su PID
+            try:
+                return time.time() - os.path.getmtime(lock_path) < LOCK_WRITE_GRACE
+            except OSError:
+                return False
+        return pid != os.getpid() and _pid_alive(pid)